@@ -62,6 +62,7 @@ ssl._create_default_https_context = ssl._create_unverified_context
 import json
 import time
 import uuid
+import atexit
 import subprocess
 import tempfile
 import shutil
@@ -69,6 +70,7 @@ import re
 import mimetypes
 from datetime import datetime
 from functools import wraps
+from urllib.parse import quote
 
 # Setup logging first (before other imports)
 from core.logging_config import (
@@ -102,8 +104,18 @@ from core.download_manager import (
     DownloadManager, DownloadItem, DownloadType, DownloadStatus
 )
 from core.stems_extractor import (
-    StemsExtractor, ExtractionItem, ExtractionStatus
+    StemsExtractor, ExtractionItem
 )
+from core.extraction_scheduler import get_extraction_scheduler, shutdown_extraction_scheduler
+from core.analysis_pipeline import shutdown_analysis_pipeline
+from core.file_delivery import file_etag, send_media_file, versioned_url
+from core.stream_zip import stored_zip
+from core.waveform_peaks import ensure_peaks_file, is_peaks_file_current, peaks_path, read_peaks_header
+from core.stem_renditions import (
+    RENDITIONS, ORIGINAL, choose_rendition, enabled_renditions, find_rendition,
+    get_rendition_transcoder, shutdown_rendition_transcoder
+)
+from core.db import get_connection, close_all_pools
 from core.config import (
     get_setting, update_setting, get_ffmpeg_path, get_ffprobe_path,
     ensure_ffmpeg_available, ensure_valid_downloads_directory,
@@ -112,7 +124,7 @@ from core.config import (
 from core.auth_db import (
     init_db, authenticate_user, get_user_by_id, get_user_by_username,
     create_user, update_user, change_password, delete_user, get_all_users,
-    add_user, reset_user_password
+    add_user, reset_user_password, get_user_cache
 )
 from core.auth_models import User
 
@@ -122,14 +134,16 @@ from core.downloads_db import (
     add_or_update as db_add_download,
     delete_from as db_delete_download,
     list_for as db_list_downloads,
+    list_downloads_page as db_list_downloads_page,
     find_global_download as db_find_global_download,
     add_user_access as db_add_user_access,
     get_user_download_id_by_video_id as db_get_user_download_id,
     # Extraction functions from same table
     find_global_extraction as db_find_global_extraction,
     find_any_global_extraction as db_find_any_global_extraction,
+    get_extraction_statuses as db_get_extraction_statuses,
     find_or_reserve_extraction as db_find_or_reserve_extraction,
-    mark_extraction_complete as db_mark_extraction_complete,
+    complete_extraction as db_complete_extraction,
     add_user_extraction_access as db_add_user_extraction_access,
     list_extractions_for as db_list_extractions,
     set_extraction_in_progress as db_set_extraction_in_progress,
@@ -270,8 +284,10 @@ login_manager.login_message_category = 'error'
 
 @login_manager.user_loader
 def load_user(user_id):
-    user_data = get_user_by_id(user_id)
-    return User(user_data) if user_data else None
+    def load_from_db(uid):
+        user_data = get_user_by_id(uid)
+        return User(user_data) if user_data else None
+    return get_user_cache().get_or_load(user_id, load_from_db)
 
 socketio = SocketIO(
     app,
@@ -339,6 +355,9 @@ class UserSessionManager:
                 )
             )
             dm.on_download_error = lambda item_id, error, rk=room_key: self._emit_error_with_room(item_id, error, rk)
+            dm.on_analysis_stage = (
+                lambda item_id, video_id, stage, result=None, error=None, rk=room_key: self._emit_analysis_stage_with_room(item_id, video_id, stage, result, error, rk)
+            )
             self.download_managers[key] = dm
         return self.download_managers[key]
 
@@ -371,7 +390,9 @@ class UserSessionManager:
     def get_stems_extractor(self) -> StemsExtractor:
         key = self._key()
         if key not in self.stems_extractors:
-            se = StemsExtractor()
+            # Jobs from every session run on the shared extraction scheduler;
+            # the per-user extractor only routes progress to this user's room
+            se = StemsExtractor(owner_key=key)
             # Capture the room key for background callbacks
             room_key = key
             user_id = current_user.id if current_user and current_user.is_authenticated else None
@@ -558,6 +579,16 @@ class UserSessionManager:
 
     def _emit_error_with_room(self, item_id, error, room_key=None):
         socketio.emit('download_error', {'download_id': item_id, 'error_message': error}, room=room_key or self._key())
+
+    def _emit_analysis_stage_with_room(self, item_id, video_id, stage, result=None, error=None, room_key=None):
+        socketio.emit('download_analysis_stage', {
+            'download_id': item_id,
+            'video_id': video_id,
+            'stage': stage,
+            'status': 'failed' if error else 'completed',
+            'result': result,
+            'error_message': error
+        }, room=room_key or self._key())
     
     def _emit_extraction_error_with_room(self, item_id, error, room_key=None):
         logger.error(f"Extraction error: item_id={item_id}, error={error}")
@@ -585,39 +616,28 @@ class UserSessionManager:
 
         # IMPORTANT: Persist to database FIRST, before emitting socket events
         # This prevents race condition where user clicks "Open Mixer" before DB is updated
+        download_id = None
         if user_id and video_id and item:
             with log_with_context(logger, user_id=user_id, video_id=video_id):
                 logger.debug("Processing extraction completion context")
             with log_with_context(processing_logger, video_id=item.video_id):
                 processing_logger.debug(f"Extraction details: status={item.status.value}, model={item.model_name}")
             print(f"[CALLBACK DEBUG] Stems paths: {item.output_paths}")
-            print(f"[CALLBACK DEBUG] Zip path: {item.zip_path}")
             
             # Now we have direct access to the extraction item data
             if item and item.video_id:
                 print(f"[CALLBACK DEBUG] Persisting extraction to database...")
                 try:
-                    # Mark the global download as extracted
-                    db_mark_extraction_complete(item.video_id, {
+                    # Mark the global download as extracted and grant the user access in one transaction
+                    completed = db_complete_extraction(item.video_id, user_id, {
                         "model_name": item.model_name,
-                        "stems_paths": item.output_paths or {},
-                        "zip_path": item.zip_path or ""
+                        "stems_paths": item.output_paths or {}
                     })
-                    print(f"[CALLBACK DEBUG] Global download marked as extracted")
-                    
-                    # Ensure transaction is committed by using a fresh connection
-                    
-                    # Give user access to the extraction
-                    global_download = db_find_global_extraction(item.video_id, item.model_name)
-                    if global_download:
-                        db_add_user_extraction_access(user_id, global_download)
-                        print(f"[CALLBACK DEBUG] User access granted to extraction")
-                        
-                        # Verify the database update was successful
-                        user_extractions = db_list_extractions(user_id)
-                        print(f"[CALLBACK DEBUG] User now has {len(user_extractions)} extractions in database")
+                    if completed:
+                        download_id = completed['download_id']
+                        print(f"[CALLBACK DEBUG] Extraction persisted, user access granted (download_id={download_id})")
                     else:
-                        print(f"[CALLBACK DEBUG] ERROR: Could not find global extraction after marking complete")
+                        print(f"[CALLBACK DEBUG] ERROR: No global download found for video_id='{item.video_id}'")
                 except Exception as e:
                     print(f"[CALLBACK DEBUG] ERROR: Failed to persist extraction to database: {e}")
                     import traceback
@@ -627,8 +647,7 @@ class UserSessionManager:
 
         # NOW emit socket events (after database is updated)
         # Get user's download_id for this video to update the correct DOM element
-        download_id = None
-        if user_id and video_id:
+        if download_id is None and user_id and video_id:
             try:
                 download_id = db_get_user_download_id(user_id, video_id)
                 logger.debug(f"Found download_id {download_id} for user {user_id}, video {video_id}")
@@ -687,8 +706,19 @@ class UserSessionManager:
 
     def _emit_error(self, item_id, error):
         self._emit_error_with_room(item_id, error, self._key())
+
+    # ---------- shutdown ----------
+    def shutdown(self, timeout=5.0):
+        """Stop download workers, the shared extraction scheduler and analysis pipeline."""
+        for dm in list(self.download_managers.values()):
+            dm.shutdown(timeout)
+        shutdown_extraction_scheduler(timeout)
+        shutdown_analysis_pipeline()
+        shutdown_rendition_transcoder()
+        close_all_pools()
 # Instantiate global manager
 user_session_manager = UserSessionManager()
+atexit.register(user_session_manager.shutdown)
 
 # ------------------------------------------------------------------
 # WebSocket helpers
@@ -902,58 +932,36 @@ def mixer():
     else:
         # Try to get from database for historical extractions
         try:
-            from core.downloads_db import list_extractions_for
-            db_extractions = list_extractions_for(current_user.id)
+            from core.downloads_db import resolve_extraction
 
             print(f"[MIXER DEBUG] Looking for extraction_id: {extraction_id}")
-            print(f"[MIXER DEBUG] Found {len(db_extractions)} db extractions")
-
-            # Find the extraction by ID - try multiple formats
-            for db_extraction in db_extractions:
-                db_id = f"download_{db_extraction['id']}"
-                video_id = db_extraction.get('video_id', '')
-                file_path = db_extraction.get('file_path', '')
-                filename = os.path.basename(file_path).replace('.mp3', '') if file_path else ''
-
-                print(f"[MIXER DEBUG] Checking db_id={db_id}, video_id={video_id}, filename={filename}")
-                print(f"[MIXER DEBUG] BPM: {db_extraction.get('detected_bpm')}, Key: {db_extraction.get('detected_key')}")
-
-                # Match by multiple criteria:
-                # 1. download_{id} format
-                # 2. video_id
-                # 3. filename (from extraction_id like "filename_timestamp")
-                matches = (
-                    db_id == extraction_id or
-                    video_id == extraction_id or
-                    (filename and extraction_id.startswith(filename))
-                )
+            db_extraction = resolve_extraction(current_user.id, extraction_id, include_analysis=True)
 
-                if matches:
-                    # Parse stems_paths from JSON string to dict for output_paths
-                    output_paths = {}
-                    stems_paths_json = db_extraction.get('stems_paths')
-                    if stems_paths_json:
-                        try:
-                            import json
-                            output_paths = json.loads(stems_paths_json)
-                        except (json.JSONDecodeError, TypeError):
-                            pass
-
-                    extraction_info = {
-                        'extraction_id': extraction_id,
-                        'status': 'completed',
-                        'output_paths': output_paths,
-                        'audio_path': db_extraction['file_path'],
-                        'title': db_extraction.get('title'),
-                        'extraction_model': get_model_display_name(db_extraction.get('extraction_model', 'htdemucs')),
-                        'detected_bpm': db_extraction.get('detected_bpm'),
-                        'detected_key': db_extraction.get('detected_key'),
-                        'analysis_confidence': db_extraction.get('analysis_confidence'),
-                        'chords_data': db_extraction.get('chords_data'),
-                        'beat_offset': db_extraction.get('beat_offset', 0.0)
-                    }
-                    print(f"[MIXER DEBUG] Found match! BPM: {extraction_info['detected_bpm']}, Key: {extraction_info['detected_key']}, Chords: {bool(extraction_info.get('chords_data'))}, Stems: {list(output_paths.keys())}")
-                    break
+            if db_extraction and db_extraction.get('extracted'):
+                # Parse stems_paths from JSON string to dict for output_paths
+                output_paths = {}
+                stems_paths_json = db_extraction.get('stems_paths')
+                if stems_paths_json:
+                    try:
+                        import json
+                        output_paths = json.loads(stems_paths_json)
+                    except (json.JSONDecodeError, TypeError):
+                        pass
+
+                extraction_info = {
+                    'extraction_id': extraction_id,
+                    'status': 'completed',
+                    'output_paths': output_paths,
+                    'audio_path': db_extraction['file_path'],
+                    'title': db_extraction.get('title'),
+                    'extraction_model': get_model_display_name(db_extraction.get('extraction_model', 'htdemucs')),
+                    'detected_bpm': db_extraction.get('detected_bpm'),
+                    'detected_key': db_extraction.get('detected_key'),
+                    'analysis_confidence': db_extraction.get('analysis_confidence'),
+                    'chords_data': db_extraction.get('chords_data'),
+                    'beat_offset': db_extraction.get('beat_offset', 0.0)
+                }
+                print(f"[MIXER DEBUG] Found match! BPM: {extraction_info['detected_bpm']}, Key: {extraction_info['detected_key']}, Chords: {bool(extraction_info.get('chords_data'))}, Stems: {list(output_paths.keys())}")
         except Exception as e:
             print(f"[MIXER] Error loading historical extraction data: {e}")
     
@@ -993,6 +1001,16 @@ def get_all_downloads():
     Returns:
         - live downloads from the current user manager
         - historical downloads from DB (completed only)
+
+    Query parameters (all optional; without them the whole history is returned):
+        limit: Page size of the history, newest first.
+        cursor: X-Next-Cursor header of the previous page.
+        type: Only 'audio' or 'video' downloads.
+        extracted: 'true' or 'false' to filter on extraction.
+    The next cursor and (on the first page) the total count are sent in the
+    X-Next-Cursor and X-Total-Count headers so the body stays a plain list.
+    X-Total-Count counts the history only: live-session items lead the first
+    page on top of it, and their videos are left out of the history pages.
     """
     try:
         dm = user_session_manager.get_download_manager()
@@ -1024,11 +1042,36 @@ def get_all_downloads():
                 live_video_ids.add(item.video_id)
         
         # Get historical downloads from database (excluding those in live session)
-        history_raw = db_list_downloads(current_user.id)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor') or None
+        media_type = request.args.get('type') or None
+        extracted_arg = request.args.get('extracted')
+        extracted = None if extracted_arg is None else extracted_arg.lower() in ('1', 'true', 'yes')
+        paged = bool(limit or cursor or media_type or extracted is not None)
+        next_cursor = total_count = None
+
+        if paged:
+            try:
+                history_raw, next_cursor, total_count = db_list_downloads_page(
+                    current_user.id, limit or get_setting('library_page_size', 100),
+                    cursor, media_type, extracted, exclude_video_ids=live_video_ids
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            # Live items lead the first page only
+            if cursor:
+                live = []
+            elif media_type:
+                live = [item for item in live if item['type'] == media_type]
+        else:
+            history_raw = db_list_downloads(current_user.id)
         history = []
 
         # Get stems extractor to check for ongoing extractions
         se = user_session_manager.get_stems_extractor()
+        all_extractions = se.get_all_extractions()
+        all_active = all_extractions.get('active', [])
+        all_queued = all_extractions.get('queued', [])
 
         for db_item in history_raw:
             # Skip if this video is already in the live session
@@ -1044,10 +1087,6 @@ def get_all_downloads():
             progress = 100.0
             extraction_id = None
 
-            # Check all extraction statuses for a match with this video_id
-            all_active = se.get_all_extractions().get('active', [])
-            all_queued = se.get_all_extractions().get('queued', [])
-
             # Debug: Log extraction check
             if all_active or all_queued:
                 logger.debug(f"Checking extractions for video_id={db_item['video_id']}: {len(all_active)} active, {len(all_queued)} queued")
@@ -1088,7 +1127,13 @@ def get_all_downloads():
                 'extraction_model': db_item.get('extraction_model')
             })
 
-        return jsonify(live + history)
+        response = jsonify(live + history)
+        if paged:
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            if total_count is not None:
+                response.headers['X-Total-Count'] = str(total_count)
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1171,12 +1216,13 @@ def check_video_extraction_status(video_id):
             else:
                 response_data['stems_available'] = False
 
-            # Add ZIP path if available
+            # Add ZIP path if available (archives built by older versions)
             zip_path = global_extraction.get('stems_zip_path')
             if zip_path:
                 response_data['zip_path'] = zip_path
 
-            # Add extraction ID for creating ZIP on-the-fly if needed
+            # Stems ZIP streamed on request
+            response_data['zip_url'] = f"/api/extractions/{quote(video_id, safe='')}/stems.zip"
             response_data['extraction_id'] = global_extraction.get('id')
 
         return jsonify(response_data)
@@ -1200,18 +1246,12 @@ def batch_check_extraction_status():
         if len(video_ids) > 100:
             video_ids = video_ids[:100]
 
-        # Get all user extractions once (instead of per video)
-        user_extractions = db_list_extractions(current_user.id)
-        user_extracted_videos = {
-            ext['video_id']: ext
-            for ext in user_extractions
-            if ext.get('extracted') == 1
-        }
+        # Global extraction state and user access of every video in one query
+        extraction_statuses = db_get_extraction_statuses(current_user.id, video_ids)
 
         results = {}
         for video_id in video_ids:
-            # Check if global extraction exists
-            global_extraction = db_find_any_global_extraction(video_id)
+            global_extraction = extraction_statuses.get(video_id)
 
             if not global_extraction:
                 results[video_id] = {
@@ -1221,8 +1261,7 @@ def batch_check_extraction_status():
                 }
                 continue
 
-            # Check if user has access
-            user_has_access = video_id in user_extracted_videos
+            user_has_access = global_extraction['user_has_access']
 
             response_data = {
                 'exists': True,
@@ -1245,6 +1284,7 @@ def batch_check_extraction_status():
 
                 if global_extraction.get('stems_zip_path'):
                     response_data['zip_path'] = global_extraction.get('stems_zip_path')
+                response_data['zip_url'] = f"/api/extractions/{quote(video_id, safe='')}/stems.zip"
                 response_data['extraction_id'] = global_extraction.get('id')
 
             results[video_id] = response_data
@@ -1374,12 +1414,9 @@ def retry_download(download_id):
         if download.cancel_event:
             download.cancel_event.clear()
         
-        # Move from failed to queued
+        # Move from failed back to the download queue so the worker picks it up
         dm.failed_downloads.pop(download_id, None)
-        dm.queued_downloads[download_id] = download
-        
-        # Re-add to the download queue so the worker picks it up
-        dm.download_queue.put(download)
+        dm.add_download(download)
         
         return jsonify({'success': True, 'download_id': download_id})
         
@@ -1414,19 +1451,15 @@ def delete_download(download_id):
                 # Handle both live downloads (download_id format) and database downloads (id format)
                 if download_id.isdigit():
                     # This is a database ID, find the video_id from database first
-                    import sqlite3
-                    from pathlib import Path
-                    DB_PATH = Path("stemtubes.db")
-                    conn = sqlite3.connect(DB_PATH)
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT video_id FROM user_downloads WHERE user_id = ? AND id = ?', 
-                                  (current_user.id, download_id))
-                    result = cursor.fetchone()
+                    with get_connection() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute('SELECT video_id FROM user_downloads WHERE user_id = ? AND id = ?', 
+                                      (current_user.id, download_id))
+                        result = cursor.fetchone()
                     if result:
                         video_id = result[0]
                         db_delete_download(current_user.id, video_id)
                         db_removed = True
-                    conn.close()
                 else:
                     # This is a download_id format, extract video_id
                     video_id = download_id.split('_')[0]
@@ -1474,15 +1507,10 @@ def clear_all_downloads():
         # Clear database for current user
         if current_user and current_user.is_authenticated:
             # Clear downloads from database
-            import sqlite3
-            from pathlib import Path
-            DB_PATH = Path("stemtubes.db")
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM user_downloads WHERE user_id = ?', (current_user.id,))
-            db_deleted_count = cursor.rowcount
-            conn.commit()
-            conn.close()
+            with get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM user_downloads WHERE user_id = ?', (current_user.id,))
+                db_deleted_count = cursor.rowcount
         else:
             db_deleted_count = 0
         
@@ -1541,7 +1569,6 @@ def get_all_extractions():
                     'progress': item.progress,
                     'error_message': item.error_message,
                     'output_paths': item.output_paths,
-                    'zip_path': item.zip_path,
                     'created_at': item.extraction_id.split('_')[1] if '_' in item.extraction_id else str(int(time.time())),
                     'detected_bpm': getattr(item, 'detected_bpm', None),
                     'detected_key': getattr(item, 'detected_key', None),
@@ -1611,29 +1638,11 @@ def get_all_extractions():
 @api_login_required
 def get_extraction_status(extraction_id):
     # For mixer usage: Always get from database since mixer only loads completed extractions
-    from core.downloads_db import get_download_by_id, list_extractions_for
+    from core.downloads_db import resolve_extraction
 
     try:
-        # Try direct ID lookup first (download_123 format)
-        download_id = extraction_id
-        if extraction_id.startswith('download_'):
-            download_id = extraction_id.replace('download_', '')
-            download_data = get_download_by_id(current_user.id, download_id)
-        else:
-            # Search by multiple criteria for filename-based extraction_id
-            download_data = None
-            db_extractions = list_extractions_for(current_user.id)
-
-            for db_extraction in db_extractions:
-                video_id = db_extraction.get('video_id', '')
-                file_path = db_extraction.get('file_path', '')
-                filename = os.path.basename(file_path).replace('.mp3', '') if file_path else ''
-
-                # Match by video_id or filename
-                if video_id == extraction_id or (filename and extraction_id.startswith(filename)):
-                    download_data = db_extraction
-                    print(f"[API] Found extraction by {'video_id' if video_id == extraction_id else 'filename'}: {extraction_id}")
-                    break
+        # Accepts download_123, video_id or filename based ids
+        download_data = resolve_extraction(current_user.id, extraction_id, include_analysis=True)
 
         if download_data and download_data.get('extracted'):
             response_data = {
@@ -1675,8 +1684,7 @@ def get_extraction_status(extraction_id):
             'status': item.status.value,
             'progress': item.progress,
             'error_message': item.error_message,
-            'output_paths': item.output_paths,
-            'zip_path': item.zip_path
+            'output_paths': item.output_paths
         }
         return jsonify(response_data)
     
@@ -1854,24 +1862,20 @@ def retry_extraction(extraction_id):
         
         if extraction.status.value not in ['failed', 'cancelled']:
             return jsonify({'error': 'Can only retry failed or cancelled extractions'}), 400
-        
-        # Handle the case where a cancelled extraction might still be in active_extractions
-        if extraction_id in se.active_extractions and extraction.status.value == 'cancelled':
-            # Move it to failed_extractions first
-            del se.active_extractions[extraction_id]
-            se.failed_extractions[extraction_id] = extraction
+
+        # A cancelled run stops at its next progress hook; re-queuing the same
+        # item before then would run it twice into the same output directory
+        if extraction_id in get_extraction_scheduler().running_items(se.owner_key):
+            return jsonify({'error': 'Extraction is still stopping, try again in a moment'}), 409
         
         # Reset extraction status and re-add to queue
-        extraction.status = ExtractionStatus.QUEUED
         extraction.progress = 0.0
         extraction.error_message = ""
         extraction.output_paths = {}
-        extraction.zip_path = None
         
-        # Move from failed to queued
+        # Move from failed back to the shared queue
         se.failed_extractions.pop(extraction_id, None)
-        se.queued_extractions[extraction_id] = extraction
-        se.extraction_queue.put(extraction)
+        se.add_extraction(extraction)
         
         return jsonify({'success': True, 'extraction_id': extraction_id})
         
@@ -1914,50 +1918,46 @@ def delete_extraction(extraction_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/extractions/<extraction_id>/create-zip', methods=['POST'])
+@app.route('/api/extractions/<extraction_id>/stems.zip', methods=['GET'])
 @api_login_required
-def create_zip_for_extraction(extraction_id):
+def download_stems_zip(extraction_id):
+    """Stream a ZIP of the stems of an extraction.
+
+    The MP3s are stored as-is (DEFLATE gains nothing on them) and the
+    archive is generated while the client downloads it, so nothing is
+    written to disk.
+    """
     try:
-        se = user_session_manager.get_stems_extractor()
-        extraction = se.get_extraction_status(extraction_id)
-        
-        if not extraction and extraction_id:
-            # Extraction not found in user records - filesystem scanning disabled for security
-            return jsonify({'error': 'Extraction not found in your records', 'success': False}), 404
-        
-        if not extraction:
-            return jsonify({'error': 'Extraction not found', 'success': False}), 404
-        
-        if extraction.status.value != 'completed':
-            return jsonify({'error': 'Extraction not completed', 'success': False}), 400
-        
-        if not extraction.output_paths:
-            return jsonify({'error': 'No stem files found', 'success': False}), 404
-        
-        # Create ZIP file
-        try:
-            import zipfile
-            
-            # Create ZIP file path
-            base_name = os.path.splitext(os.path.basename(extraction.audio_path))[0]
-            zip_path = os.path.join(extraction.output_dir, f"{base_name}_stems.zip")
-            
-            # Create ZIP file
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for stem_name, file_path in extraction.output_paths.items():
-                    if os.path.exists(file_path):
-                        zipf.write(file_path, os.path.basename(file_path))
-            
-            # Update extraction with zip path
-            extraction.zip_path = zip_path
-            
-            return jsonify({'success': True, 'zip_path': zip_path})
-            
-        except Exception as zip_error:
-            return jsonify({'error': f'Error creating ZIP: {str(zip_error)}', 'success': False}), 500
-        
+        stems_paths, error = _resolve_extraction_stems(extraction_id)
+        if error:
+            return error
+
+        files = [(os.path.basename(path), path) for path in stems_paths.values()
+                 if os.path.isfile(path) and _in_downloads_directory(path)]
+        if not files:
+            return jsonify({'error': 'No stem files found'}), 404
+
+        size, chunks = stored_zip(files)
+
+        # Name the archive after the song folder (…/<song>/audio/stems/vocals.mp3)
+        folder = os.path.dirname(os.path.abspath(files[0][1]))
+        while os.path.basename(folder) in ('stems', 'audio'):
+            folder = os.path.dirname(folder)
+        filename = f"{os.path.basename(folder) or 'stems'}_stems.zip"
+        ascii_name = filename.encode('ascii', 'ignore').decode().replace('"', '')
+
+        logger.info(f"[Stems API] Streaming ZIP of {len(files)} stems for {extraction_id} ({size // 1024} KB)")
+        response = app.response_class(chunks, mimetype='application/zip', direct_passthrough=True)
+        response.headers['Content-Length'] = str(size)
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(filename)}'
+        )
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
     except Exception as e:
-        return jsonify({'error': str(e), 'success': False}), 500
+        logger.error(f"[Stems API] Error streaming ZIP for {extraction_id}: {e}")
+        return jsonify({'error': f'Error creating ZIP: {str(e)}'}), 500
 
 # ------------------------------------------------------------------
 # Karaoke/Lyrics API Routes
@@ -1968,38 +1968,10 @@ def create_zip_for_extraction(extraction_id):
 def get_extraction_lyrics(extraction_id):
     """Get or generate lyrics for an extraction"""
     try:
-        from core.downloads_db import get_download_by_id, list_extractions_for
+        from core.downloads_db import resolve_extraction
 
         # Find download using same logic as get_extraction_status
-        download = None
-        if extraction_id.startswith('download_'):
-            download_id = extraction_id.replace('download_', '')
-            download = get_download_by_id(current_user.id, download_id)
-        else:
-            # Search by video_id or filename
-            db_extractions = list_extractions_for(current_user.id)
-            for db_extraction in db_extractions:
-                video_id = db_extraction.get('video_id', '')
-                file_path = db_extraction.get('file_path', '')
-                filename = os.path.basename(file_path) if file_path else ''
-
-                # Normalize extraction_id for comparison (strip timestamp suffix like _1760135361)
-                normalized_extraction_id = extraction_id.rsplit('_', 1)[0] if '_' in extraction_id else extraction_id
-                # Also strip .mp3 extension if present in extraction_id for comparison
-                normalized_extraction_id = normalized_extraction_id.replace('.mp3', '')
-                normalized_filename = filename.replace('.mp3', '')
-
-                # Match by video_id or filename (with/without .mp3 extension)
-                matches = (
-                    video_id == extraction_id or
-                    filename == extraction_id or
-                    (normalized_filename and normalized_extraction_id.startswith(normalized_filename))
-                )
-
-                if matches:
-                    download = db_extraction
-                    logger.info(f"[LYRICS] Found extraction by matching {extraction_id} with video_id={video_id} or filename={filename}")
-                    break
+        download = resolve_extraction(current_user.id, extraction_id, include_analysis=True)
 
         if not download:
             return jsonify({'error': 'Extraction not found'}), 404
@@ -2030,24 +2002,11 @@ def get_extraction_lyrics(extraction_id):
 def regenerate_extraction_chords(extraction_id):
     """Regenerate chord timeline for an extraction."""
     try:
-        from core.downloads_db import get_download_by_id, list_extractions_for, update_download_analysis
+        from core.downloads_db import resolve_extraction, update_download_analysis_fields
         from core.chord_detector import analyze_audio_file
         from core.config import load_config
 
-        download = None
-        download_id = extraction_id
-        if extraction_id.startswith('download_'):
-            download_id = extraction_id.replace('download_', '')
-            download = get_download_by_id(current_user.id, download_id)
-        if not download:
-            db_extractions = list_extractions_for(current_user.id)
-            for db_extraction in db_extractions:
-                video_id = db_extraction.get('video_id', '')
-                file_path = db_extraction.get('file_path', '')
-                filename = os.path.basename(file_path).replace('.mp3', '') if file_path else ''
-                if video_id == extraction_id or (filename and extraction_id.startswith(filename)):
-                    download = db_extraction
-                    break
+        download = resolve_extraction(current_user.id, extraction_id)
 
         if not download:
             download = db_find_any_global_extraction(extraction_id)
@@ -2074,34 +2033,12 @@ def regenerate_extraction_chords(extraction_id):
         if not chords_json:
             return jsonify({'error': 'Chord detection failed'}), 500
 
-        structure_data = download.get('structure_data')
-        if isinstance(structure_data, str):
-            try:
-                structure_data = json.loads(structure_data)
-            except Exception:
-                structure_data = None
-
-        lyrics_data = download.get('lyrics_data')
-        if isinstance(lyrics_data, str):
-            try:
-                lyrics_data = json.loads(lyrics_data)
-            except Exception:
-                lyrics_data = None
-
         video_id = download.get('video_id')
         if not video_id:
             return jsonify({'error': 'Video ID not found'}), 400
 
-        update_download_analysis(
-            video_id,
-            download.get('detected_bpm'),
-            download.get('detected_key'),
-            download.get('analysis_confidence'),
-            chords_json,
-            beat_offset,
-            structure_data,
-            lyrics_data
-        )
+        # Only the chord columns change; structure and lyrics stay as stored
+        update_download_analysis_fields(video_id, chords_data=chords_json, beat_offset=beat_offset)
 
         parsed_chords = json.loads(chords_json)
         return jsonify({
@@ -2120,40 +2057,12 @@ def regenerate_extraction_chords(extraction_id):
 def generate_extraction_lyrics(extraction_id):
     """Generate lyrics for an extraction using faster-whisper"""
     try:
-        from core.downloads_db import get_download_by_id, update_download_lyrics, list_extractions_for
+        from core.downloads_db import resolve_extraction, update_download_lyrics
         from core.lyrics_detector import detect_song_lyrics
         from core.config import load_config
 
         # Find download using same logic as get_extraction_status
-        download = None
-        if extraction_id.startswith('download_'):
-            download_id = extraction_id.replace('download_', '')
-            download = get_download_by_id(current_user.id, download_id)
-        else:
-            # Search by video_id or filename
-            db_extractions = list_extractions_for(current_user.id)
-            for db_extraction in db_extractions:
-                video_id = db_extraction.get('video_id', '')
-                file_path = db_extraction.get('file_path', '')
-                filename = os.path.basename(file_path) if file_path else ''
-
-                # Normalize extraction_id for comparison (strip timestamp suffix like _1760135361)
-                normalized_extraction_id = extraction_id.rsplit('_', 1)[0] if '_' in extraction_id else extraction_id
-                # Also strip .mp3 extension if present in extraction_id for comparison
-                normalized_extraction_id = normalized_extraction_id.replace('.mp3', '')
-                normalized_filename = filename.replace('.mp3', '')
-
-                # Match by video_id or filename (with/without .mp3 extension)
-                matches = (
-                    video_id == extraction_id or
-                    filename == extraction_id or
-                    (normalized_filename and normalized_extraction_id.startswith(normalized_filename))
-                )
-
-                if matches:
-                    download = db_extraction
-                    logger.info(f"[LYRICS] Found extraction by matching {extraction_id} with video_id={video_id} or filename={filename}")
-                    break
+        download = resolve_extraction(current_user.id, extraction_id)
 
         if not download:
             return jsonify({'error': 'Extraction not found'}), 404
@@ -2685,6 +2594,29 @@ def admin_get_storage_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/db-stats', methods=['GET'])
+@api_login_required
+def admin_get_db_stats():
+    """Get per-query timings and connection pool usage for the admin dashboard."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+
+    try:
+        from core.db import get_pool, get_query_stats
+
+        stats = get_query_stats()
+        if request.args.get('reset') == '1':
+            stats.reset()
+            get_user_cache().reset_stats()
+        limit = request.args.get('limit', 50, type=int)
+        return jsonify({
+            'pool': get_pool().info(),
+            'user_cache': get_user_cache().stats(),
+            'queries': stats.snapshot(limit)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/admin/cleanup/downloads/<video_id>', methods=['DELETE'])
 @api_login_required
 def admin_delete_download_by_video_id(video_id):
@@ -3330,13 +3262,8 @@ def download_file_route():
         return jsonify({'error': 'Path is not a file'}), 400
     
     try:
-        # Get the directory and filename
-        directory = os.path.dirname(abs_file_path)
-        filename = os.path.basename(abs_file_path)
-        
-        # Use Flask's send_from_directory for secure file serving
-        return send_from_directory(directory, filename, as_attachment=True)
-        
+        return send_media_file(abs_file_path, as_attachment=True, version=request.args.get('v'))
+
     except Exception as e:
         return jsonify({'error': f'Error serving file: {str(e)}'}), 500
 
@@ -3364,15 +3291,12 @@ def stream_audio_route():
     if not os.path.isfile(abs_file_path):
         return jsonify({'error': 'Path is not a file'}), 400
 
-    directory = os.path.dirname(abs_file_path)
-    filename = os.path.basename(abs_file_path)
-
-    mimetype, _ = mimetypes.guess_type(filename)
+    mimetype, _ = mimetypes.guess_type(abs_file_path)
     if not mimetype:
         mimetype = 'audio/mpeg'
 
     try:
-        return send_from_directory(directory, filename, mimetype=mimetype, as_attachment=False)
+        return send_media_file(abs_file_path, mimetype=mimetype, version=request.args.get('v'))
     except Exception as e:
         return jsonify({'error': f'Error streaming file: {str(e)}'}), 500
 
@@ -3414,121 +3338,230 @@ def list_files_route():
     except Exception as e:
         return jsonify({'error': f'Error listing files: {str(e)}', 'success': False}), 500
 
+def _resolve_extraction_stems(extraction_id):
+    """Find the stem files of an extraction the current user can access.
+
+    Looks in the current session's extractions first, then in the database
+    (download_123, video_id or filename based ids).
+
+    Args:
+        extraction_id: Extraction identifier from the URL.
+
+    Returns:
+        ({stem name: file path}, None), or (None, error response tuple).
+    """
+    # First check current session's stems extractor
+    se = user_session_manager.get_stems_extractor()
+    extraction = se.get_extraction_status(extraction_id)
+
+    # If not found in current session, check database
+    if not extraction:
+        try:
+            from core.downloads_db import resolve_extraction, resolve_file_path
+            import json
+
+            # Accepts download_123, video_id or filename based ids (same as /api/extractions/<id>)
+            download_data = resolve_extraction(current_user.id, extraction_id)
+            logger.debug(f"[Stems API] Resolved extraction_id {extraction_id}: {'found' if download_data else 'not found'}")
+
+            if download_data and download_data.get('extracted') and download_data.get('stems_paths'):
+                stems_paths = json.loads(download_data['stems_paths']) if isinstance(download_data['stems_paths'], str) else download_data['stems_paths']
+                logger.debug(f"[Stems API] Stems paths for {extraction_id}: {list(stems_paths.keys())}")
+
+                # Resolve the paths to handle old absolute paths from migrations
+                return {name: resolve_file_path(path) for name, path in stems_paths.items() if path}, None
+
+            logger.warning(f"[Stems API] Extraction not found or not extracted: {extraction_id}")
+            return None, (jsonify({'error': 'Extraction not found or not completed'}), 404)
+
+        except Exception as e:
+            logger.error(f"[Stems API] Error loading database extraction {extraction_id}: {e}", exc_info=True)
+            # Fall through to session check
+
+    # If not found in database or session, return error - filesystem scanning disabled
+    if not extraction:
+        return None, (jsonify({'error': 'Extraction not found in your records'}), 404)
+
+    if extraction.status.value != 'completed':
+        return None, (jsonify({'error': 'Extraction not completed'}), 400)
+
+    return dict(extraction.output_paths or {}), None
+
+def _in_downloads_directory(file_path):
+    """Check that a file lies inside the downloads directory (security check)."""
+    downloads_dir = os.path.abspath(ensure_valid_downloads_directory())
+    return os.path.abspath(file_path).startswith(downloads_dir)
+
+def _resolve_stem_file(extraction_id, stem_name):
+    """Find the file of one stem of an extraction the current user can access.
+
+    Args:
+        extraction_id: Extraction identifier from the URL.
+        stem_name: Stem name (vocals, drums, ...).
+
+    Returns:
+        (absolute file path, None), or (None, error response tuple).
+    """
+    stems_paths, error = _resolve_extraction_stems(extraction_id)
+    if error:
+        return None, error
+
+    stem_file_path = stems_paths.get(stem_name)
+    logger.debug(f"[Stems API] Requested stem '{stem_name}' path: {stem_file_path}")
+    if not stem_file_path or not os.path.exists(stem_file_path):
+        logger.warning(f"[Stems API] Stem file not found: {stem_file_path}")
+        return None, (jsonify({'error': f'Stem file not found: {stem_name}'}), 404)
+
+    # Security check: ensure the file path is within allowed directories
+    if not _in_downloads_directory(stem_file_path):
+        logger.error(f"[Stems API] Security violation: {stem_file_path} not in downloads directory")
+        return None, (jsonify({'error': 'Access denied: file is outside downloads directory'}), 403)
+
+    return os.path.abspath(stem_file_path), None
+
 @app.route('/api/extracted_stems/<extraction_id>/<stem_name>', methods=['GET', 'HEAD'])
 @api_login_required
 def serve_extracted_stem(extraction_id, stem_name):
-    """Serve individual stem files for the mixer. Supports HEAD requests for existence checking."""
-    try:
-        # First check current session's stems extractor
-        se = user_session_manager.get_stems_extractor()
-        extraction = se.get_extraction_status(extraction_id)
+    """Serve individual stem files for the mixer. Supports HEAD requests for existence checking.
 
-        # If not found in current session, check database
-        if not extraction:
-            try:
-                from core.downloads_db import get_download_by_id, list_extractions_for, resolve_file_path
-                import json
+    ``quality`` selects a low-bitrate rendition (opus64, opus96, aac128)
+    or "original" (default) for the 320 kbps MP3. Renditions not
+    transcoded yet are queued and the original is served meanwhile;
+    X-Stem-Rendition tells which one was sent.
 
-                download_data = None
+    ``v`` (the stem version from the manifest) makes the response cacheable
+    as immutable, unless the requested rendition had to be replaced.
+    """
+    try:
+        abs_file_path, error = _resolve_stem_file(extraction_id, stem_name)
+        if error:
+            return error
+
+        rendition = choose_rendition(request.args.get('quality'))
+        served_path, mimetype = abs_file_path, 'audio/mpeg'
+        requested = rendition
+        if rendition != ORIGINAL:
+            rendition_file = find_rendition(abs_file_path, rendition)
+            if rendition_file:
+                served_path, mimetype = rendition_file, RENDITIONS[rendition]['mimetype']
+            else:
+                if rendition in enabled_renditions():
+                    get_rendition_transcoder().submit({stem_name: abs_file_path}, [rendition])
+                rendition = ORIGINAL
 
-                # Check if it's a download_ID format
-                if extraction_id.startswith('download_'):
-                    download_id = extraction_id.replace('download_', '')
-                    download_data = get_download_by_id(current_user.id, download_id)
-                    logger.debug(f"[Stems API] Searching by download_id: {download_id}")
-                else:
-                    # Search by video_id or filename (same logic as /api/extractions/<id>)
-                    db_extractions = list_extractions_for(current_user.id)
-                    logger.debug(f"[Stems API] Searching for extraction_id: {extraction_id} in {len(db_extractions)} extractions")
-
-                    for db_extraction in db_extractions:
-                        video_id = db_extraction.get('video_id', '')
-                        file_path = db_extraction.get('file_path', '')
-                        filename = os.path.basename(file_path).replace('.mp3', '') if file_path else ''
-
-                        # Match by video_id or filename
-                        if video_id == extraction_id or (filename and extraction_id.startswith(filename)):
-                            download_data = db_extraction
-                            logger.info(f"[Stems API] Found extraction by {'video_id' if video_id == extraction_id else 'filename'}: {extraction_id}")
-                            break
+        logger.info(f"[Stems API] Serving stem '{stem_name}' ({rendition}) for {extraction_id}: {served_path}")
 
-                if download_data and download_data.get('extracted') and download_data.get('stems_paths'):
-                    stems_paths = json.loads(download_data['stems_paths']) if isinstance(download_data['stems_paths'], str) else download_data['stems_paths']
-                    logger.debug(f"[Stems API] Stems paths for {extraction_id}: {list(stems_paths.keys())}")
+        # The version names the stem file; renditions are derived from it
+        version = request.args.get('v')
+        if version != file_etag(os.stat(abs_file_path)) or rendition != requested:
+            version = None
+        else:
+            version = file_etag(os.stat(served_path))
 
-                    # Get the requested stem path
-                    stem_file_path = stems_paths.get(stem_name)
-                    logger.debug(f"[Stems API] Requested stem '{stem_name}' path: {stem_file_path}")
+        # HEAD gets the same headers without the body
+        response = send_media_file(served_path, mimetype=mimetype, version=version)
+        response.headers['X-Stem-Rendition'] = rendition
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': f'Error serving stem file: {str(e)}'}), 500
 
-                    # Resolve the path to handle old absolute paths from migrations
-                    if stem_file_path:
-                        stem_file_path = resolve_file_path(stem_file_path)
-                        logger.debug(f"[Stems API] Resolved stem path: {stem_file_path}")
+@app.route('/api/extracted_stems/<extraction_id>/<stem_name>/peaks', methods=['GET'])
+@api_login_required
+def serve_stem_peaks(extraction_id, stem_name):
+    """Serve the waveform peak file of a stem so the mixer can draw it before the audio loads.
 
-                    if stem_file_path and os.path.exists(stem_file_path):
-                        # Security check: ensure the file path is within allowed directories
-                        abs_file_path = os.path.abspath(stem_file_path)
-                        downloads_dir = os.path.abspath(ensure_valid_downloads_directory())
+    Peak files are written by the extractor; older extractions get theirs
+    computed on first request. The manifest's peaks URL carries the peak
+    file version (``v``) and is cached as immutable; other URLs revalidate
+    with the ETag.
+    """
+    try:
+        abs_file_path, error = _resolve_stem_file(extraction_id, stem_name)
+        if error:
+            return error
 
-                        if abs_file_path.startswith(downloads_dir):
-                            logger.info(f"[Stems API] Serving stem '{stem_name}' for {extraction_id}: {abs_file_path}")
+        peaks_file = ensure_peaks_file(abs_file_path)
+        return send_media_file(peaks_file, mimetype='application/octet-stream',
+                               version=request.args.get('v'))
 
-                            # For HEAD requests, just return 200 to confirm existence
-                            if request.method == 'HEAD':
-                                return '', 200
+    except Exception as e:
+        logger.error(f"[Stems API] Error serving peaks for {extraction_id}/{stem_name}: {e}")
+        return jsonify({'error': f'Error serving waveform peaks: {str(e)}'}), 500
 
-                            directory = os.path.dirname(abs_file_path)
-                            filename = os.path.basename(abs_file_path)
-                            return send_from_directory(directory, filename, mimetype='audio/mpeg')
-                        else:
-                            logger.error(f"[Stems API] Security violation: {abs_file_path} not in {downloads_dir}")
-                    else:
-                        logger.warning(f"[Stems API] Stem file not found: {stem_file_path}")
+# Display order of the stems in the mixer
+STEM_ORDER = ['vocals', 'drums', 'bass', 'guitar', 'piano', 'other']
 
-                    return jsonify({'error': f'Stem file not found: {stem_name}'}), 404
+@app.route('/api/extractions/<extraction_id>/manifest', methods=['GET'])
+@api_login_required
+def get_extraction_manifest(extraction_id):
+    """Describe every stem of an extraction in one response.
 
-                logger.warning(f"[Stems API] Extraction not found or not extracted: {extraction_id}")
-                return jsonify({'error': 'Extraction not found or not completed'}), 404
+    Lists each stem with its size, ETag, duration and sample rate (from the
+    peak file), peaks and rendition URLs, and whether it was left out of the
+    mixer as silent, so the mixer needs no per-stem HEAD probes.
+    """
+    try:
+        stems_paths, error = _resolve_extraction_stems(extraction_id)
+        if error:
+            return error
+
+        # Stems the extractor judged silent stay on disk next to the kept ones
+        # but are not part of the extraction (and cannot be streamed)
+        candidates = {name: (path, False) for name, path in stems_paths.items()}
+        for stems_dir in {os.path.dirname(path) for path in stems_paths.values()}:
+            for name in STEM_ORDER:
+                path = os.path.join(stems_dir, f"{name}.mp3")
+                if name not in candidates and os.path.isfile(path):
+                    candidates[name] = (path, True)
+
+        base_url = f"/api/extracted_stems/{quote(extraction_id, safe='')}"
+        stems = []
+        for name, (path, silent) in candidates.items():
+            if not path or not _in_downloads_directory(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
 
-            except Exception as e:
-                logger.error(f"[Stems API] Error loading database extraction {extraction_id}: {e}", exc_info=True)
-                # Fall through to session check
-        
-        # If not found in database or session, return error - filesystem scanning disabled
-        if not extraction:
-            return jsonify({'error': f'Stem file not found in your records: {stem_name}'}), 404
-        
-        if extraction.status.value != 'completed':
-            return jsonify({'error': 'Extraction not completed'}), 400
-        
-        # Look for the stem file in the extraction output paths
-        stem_file_path = None
-        if extraction.output_paths:
-            stem_file_path = extraction.output_paths.get(stem_name)
-        
-        if not stem_file_path or not os.path.exists(stem_file_path):
-            return jsonify({'error': f'Stem file not found: {stem_name}'}), 404
-        
-        # Security check: ensure the file path is within allowed directories
-        abs_file_path = os.path.abspath(stem_file_path)
-        downloads_dir = os.path.abspath(ensure_valid_downloads_directory())
-        
-        if not abs_file_path.startswith(downloads_dir):
-            return jsonify({'error': 'Access denied: file is outside downloads directory'}), 403
+            header = read_peaks_header(peaks_path(path))
+            url = None if silent else versioned_url(f"{base_url}/{quote(name, safe='')}", stat)
+            peaks_url = None
+            if url:
+                # Peak files are rewritten with their stem: their own version covers both
+                peaks_url = f"{base_url}/{quote(name, safe='')}/peaks"
+                if is_peaks_file_current(path):
+                    peaks_url = versioned_url(peaks_url, os.stat(peaks_path(path)))
+            stems.append({
+                'name': name,
+                'url': url,
+                'size': stat.st_size,
+                'etag': f'"{file_etag(stat)}"',
+                'duration': header['duration'] if header else None,
+                'sample_rate': header['sample_rate'] if header else None,
+                'silent': silent,
+                'peaks_url': peaks_url,
+                'renditions': {} if silent else {
+                    rendition: {
+                        'url': f"{url}&quality={rendition}",
+                        'mimetype': RENDITIONS[rendition]['mimetype'],
+                        'ready': find_rendition(path, rendition) is not None,
+                    }
+                    for rendition in enabled_renditions()
+                },
+            })
 
-        # For HEAD requests, just return 200 to confirm existence
-        if request.method == 'HEAD':
-            return '', 200
+        stems.sort(key=lambda s: (STEM_ORDER.index(s['name']) if s['name'] in STEM_ORDER else len(STEM_ORDER), s['name']))
 
-        # Get the directory and filename
-        directory = os.path.dirname(abs_file_path)
-        filename = os.path.basename(abs_file_path)
+        response = jsonify({'extraction_id': extraction_id, 'stems': stems})
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
 
-        # Serve the file with appropriate MIME type for audio streaming
-        return send_from_directory(directory, filename, mimetype='audio/mpeg')
-        
     except Exception as e:
-        return jsonify({'error': f'Error serving stem file: {str(e)}'}), 500
+        logger.error(f"[Stems API] Error building manifest for {extraction_id}: {e}")
+        return jsonify({'error': f'Error building stem manifest: {str(e)}'}), 500
 
 # ------------------------------------------------------------------
 # Library API Endpoints
@@ -3541,112 +3574,75 @@ def get_library():
     try:
         filter_type = request.args.get('filter', 'all')  # 'all', 'downloads', 'extractions'
         search_query = request.args.get('search', '').strip()
+        limit = request.args.get('limit', get_setting('library_page_size', 100), type=int)
+        cursor = request.args.get('cursor') or None
         
-        # Get all global downloads
-        import sqlite3
-        from pathlib import Path
-        DB_PATH = Path("stemtubes.db")
-        
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Base query for global downloads with user access information
-            base_query = """
-                SELECT 
-                    gd.*,
-                    COUNT(DISTINCT ud.user_id) as user_count,
-                    CASE WHEN user_access.user_id IS NOT NULL THEN 1 ELSE 0 END as user_has_access,
-                    user_access.file_path as user_file_path,
-                    user_access.extracted as user_extracted
-                FROM global_downloads gd
-                LEFT JOIN user_downloads ud ON gd.id = ud.global_download_id
-                LEFT JOIN user_downloads user_access ON gd.id = user_access.global_download_id 
-                    AND user_access.user_id = ?
-            """
-            
-            # Add search filter
-            where_conditions = []
-            params = [current_user.id]
-            
-            if search_query:
-                where_conditions.append("(gd.title LIKE ? OR gd.video_id LIKE ?)")
-                search_param = f"%{search_query}%"
-                params.extend([search_param, search_param])
-            
-            # Add filter conditions
-            if filter_type == 'downloads':
-                where_conditions.append("gd.file_path IS NOT NULL")
-            elif filter_type == 'extractions':
-                where_conditions.append("gd.extracted = 1")
-            
-            if where_conditions:
-                base_query += " WHERE " + " AND ".join(where_conditions)
+        # Get one page of global downloads (ranked full-text search when a query is given)
+        from core.downloads_db import search_library
+        try:
+            library_items, next_cursor, total_count = search_library(
+                current_user.id, filter_type, search_query, limit, cursor
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Format results
+        formatted_items = []
+        for item in library_items:
+            # Determine what's available
+            has_download = bool(item['file_path'])
+            has_extraction = bool(item['extracted'])
             
-            base_query += """
-                GROUP BY gd.id
-                ORDER BY gd.created_at DESC
-            """
+            # Determine user's current access
+            user_has_download_access = bool(item['user_has_access'] and item['user_file_path'])
+            user_has_extraction_access = bool(item['user_has_access'] and item['user_extracted'])
             
-            cursor.execute(base_query, params)
-            library_items = cursor.fetchall()
+            # Stored size (set on completion, migration 7 for older rows), no stat per row
+            file_size = item['file_size'] if has_download else None
             
-            # Format results
-            formatted_items = []
-            for item in library_items:
-                # Determine what's available
-                has_download = bool(item['file_path'])
-                has_extraction = bool(item['extracted'])
+            formatted_item = {
+                'id': item['id'],
+                'video_id': item['video_id'],
+                'title': item['title'],
+                'thumbnail_url': item['thumbnail'],
+                'media_type': item['media_type'],
+                'quality': item['quality'],
+                'created_at': item['created_at'],
+                'user_count': item['user_count'],
+                'file_size': file_size,
                 
-                # Determine user's current access
-                user_has_download_access = bool(item['user_has_access'] and item['user_file_path'])
-                user_has_extraction_access = bool(item['user_has_access'] and item['user_extracted'])
+                # Availability flags
+                'has_download': has_download,
+                'has_extraction': has_extraction,
                 
-                # Calculate file size if available
-                file_size = None
-                if item['file_path'] and os.path.exists(item['file_path']):
-                    try:
-                        file_size = os.path.getsize(item['file_path'])
-                    except:
-                        pass
+                # User access flags
+                'user_has_download_access': user_has_download_access,
+                'user_has_extraction_access': user_has_extraction_access,
                 
-                formatted_item = {
-                    'id': item['id'],
-                    'video_id': item['video_id'],
-                    'title': item['title'],
-                    'thumbnail_url': item['thumbnail'],
-                    'media_type': item['media_type'],
-                    'quality': item['quality'],
-                    'created_at': item['created_at'],
-                    'user_count': item['user_count'],
-                    'file_size': file_size,
-                    
-                    # Availability flags
-                    'has_download': has_download,
-                    'has_extraction': has_extraction,
-                    
-                    # User access flags
-                    'user_has_download_access': user_has_download_access,
-                    'user_has_extraction_access': user_has_extraction_access,
-                    
-                    # Action availability
-                    'can_add_download': has_download and not user_has_download_access,
-                    'can_add_extraction': has_extraction and not user_has_extraction_access,
-                    
-                    # Badge type for display
-                    'badge_type': 'both' if (has_download and has_extraction) else ('download' if has_download else 'extraction')
-                }
+                # Action availability
+                'can_add_download': has_download and not user_has_download_access,
+                'can_add_extraction': has_extraction and not user_has_extraction_access,
                 
-                formatted_items.append(formatted_item)
-            
-            return jsonify({
-                'success': True,
-                'items': formatted_items,
-                'total_count': len(formatted_items),
-                'filter': filter_type,
-                'search': search_query
-            })
+                # Badge type for display
+                'badge_type': 'both' if (has_download and has_extraction) else ('download' if has_download else 'extraction'),
+
+                # Matched lyrics line when the search hit the lyrics
+                'lyrics_snippet': item.get('lyrics_snippet')
+            }
             
+            formatted_items.append(formatted_item)
+        
+        return jsonify({
+            'success': True,
+            'items': formatted_items,
+            'total_count': total_count,
+            'count': len(formatted_items),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'filter': filter_type,
+            'search': search_query
+        })
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3656,12 +3652,7 @@ def add_library_download_to_user(global_download_id):
     """Add a download from library to user's personal downloads list."""
     try:
         # Get the global download record
-        import sqlite3
-        from pathlib import Path
-        DB_PATH = Path("stemtubes.db")
-        
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM global_downloads WHERE id = ?", (global_download_id,))
             global_download = cursor.fetchone()
@@ -3695,12 +3686,7 @@ def add_library_extraction_to_user(global_download_id):
     """Add an extraction from library to user's personal extractions list."""
     try:
         # Get the global download record
-        import sqlite3
-        from pathlib import Path
-        DB_PATH = Path("stemtubes.db")
-        
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM global_downloads WHERE id = ?", (global_download_id,))
             global_download = cursor.fetchone()
@@ -3745,12 +3731,37 @@ def admin_mobile_settings():
     """Mobile settings configuration page"""
     return render_template('admin-mobile-settings.html')
 
+# ------------------------------------------------------------------
+# Model warm-up
+# ------------------------------------------------------------------
+def warm_up_models():
+    """Load the analysis models enabled for preloading, so the first song doesn't pay for it."""
+    if get_setting('preload_chord_models', True):
+        try:
+            from core.chord_detector import warm_up_detectors
+            warm_up_detectors(use_madmom=get_setting('chords_use_madmom', True))
+            logger.info("Chord detection models preloaded")
+        except Exception as e:
+            logger.warning(f"Chord model preload failed: {e}")
+    if get_setting('preload_lyrics_model', False):
+        try:
+            from core.lyrics_detector import preload_lyrics_model
+            preload_lyrics_model(
+                model_size=get_setting('lyrics_model_size', 'large-v3-int8'),
+                use_gpu=get_setting('use_gpu_for_extraction', False)
+            )
+            logger.info("Whisper model preloaded")
+        except Exception as e:
+            logger.warning(f"Whisper model preload failed: {e}")
+
 # ------------------------------------------------------------------
 # Run
 # ------------------------------------------------------------------
 if __name__ == '__main__':
     import socket
+    import threading
     # Use centralized configuration - single source of truth in core/config.py
     logger.info(f"Starting StemTube Web server on {HOST}:{PORT}")
     logger.info("Logging system active - all events will be recorded")
+    threading.Thread(target=warm_up_models, name="model-warmup", daemon=True).start()
     socketio.run(app, host=HOST, port=PORT, debug=False, allow_unsafe_werkzeug=True)
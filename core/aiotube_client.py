@@ -5,7 +5,6 @@ Alternative implementation that doesn't require an API key.
 import os
 import json
 import time
-import sqlite3
 import threading
 from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
@@ -19,6 +18,7 @@ import requests
 from bs4 import BeautifulSoup
 
 from .config import get_setting
+from .db import get_connection
 
 # Constants
 MAX_RESULTS_PER_PAGE = 50  # Increased limit to allow more results
@@ -42,7 +42,7 @@ class AiotubeClient:
 
     def _init_cache_db(self):
         """Initialize SQLite cache database."""
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH, row_factory=None)
         cursor = conn.cursor()
 
         # Table for searches
@@ -100,7 +100,7 @@ class AiotubeClient:
         filters_str = json.dumps(filters or {}) if filters else "{}"
         page_token_str = page_token or ""
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH, row_factory=None)
         cursor = conn.cursor()
 
         cursor.execute(
@@ -270,7 +270,7 @@ class AiotubeClient:
                 return {"error": f"Error extracting ID: {e}"}
         
         # Check if cache exists
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH, row_factory=None)
         cursor = conn.cursor()
         
         cursor.execute(
@@ -448,7 +448,7 @@ class AiotubeClient:
             return []
 
         # Check cache in SQLite
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH, row_factory=None)
         cursor = conn.cursor()
 
         cursor.execute(
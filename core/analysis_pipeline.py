@@ -0,0 +1,153 @@
+"""
+Post-download analysis pipeline for StemTubes application.
+Runs the analyzers of a track (tempo/key, chords, structure, lyrics) as a
+small dependency graph on a shared worker pool, so independent stages run
+concurrently and each result is available as soon as its stage finishes.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .config import get_setting
+
+
+@dataclass
+class AnalysisStage:
+    """One node of an analysis graph.
+
+    ``func`` receives the results of the stages it depends on, keyed by stage
+    name, and returns its own result.
+    """
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    depends_on: Sequence[str] = field(default_factory=tuple)
+
+
+class _AnalysisRun:
+    """Bookkeeping for one graph being executed."""
+
+    def __init__(self, label: str, stages: List[AnalysisStage],
+                 on_stage_complete: Optional[Callable[[str, Any, Optional[Exception]], None]],
+                 on_complete: Optional[Callable[[Dict[str, Any]], None]]):
+        self.label = label
+        self.stages = {stage.name: stage for stage in stages}
+        self.on_stage_complete = on_stage_complete
+        self.on_complete = on_complete
+        self.results: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        # Stages left to finish before each stage may start
+        self.pending = {stage.name: set(stage.depends_on) for stage in stages}
+        self.dependents: Dict[str, List[str]] = {name: [] for name in self.stages}
+        for stage in stages:
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+                self.dependents[dependency].append(stage.name)
+        self.remaining = len(stages)
+
+
+class AnalysisPipeline:
+    """Shared pool that executes analysis graphs.
+
+    A failed stage does not stop the graph: its result is None and stages
+    depending on it still run (they fall back to their own estimates).
+    """
+
+    def __init__(self, max_workers: int):
+        """Initialize the pipeline.
+
+        Args:
+            max_workers: Number of analysis stages allowed to run at once.
+        """
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="analysis-worker")
+
+    def submit(self, label: str, stages: List[AnalysisStage],
+               on_stage_complete: Optional[Callable[[str, Any, Optional[Exception]], None]] = None,
+               on_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Start running an analysis graph. Returns immediately.
+
+        Args:
+            label: Name used in log messages (usually the track title).
+            stages: Stages of the graph.
+            on_stage_complete: Called with (stage name, result, error) as each stage ends.
+            on_complete: Called with all results once every stage has ended.
+        """
+        run = _AnalysisRun(label, stages, on_stage_complete, on_complete)
+        if not stages:
+            self._finish(run)
+            return
+        ready = [name for name, deps in run.pending.items() if not deps]
+        if not ready:
+            raise ValueError(f"Analysis graph for '{label}' has no stage without dependencies")
+        for name in ready:
+            self._executor.submit(self._run_stage, run, name)
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting work; running stages finish on their own."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run_stage(self, run: _AnalysisRun, name: str):
+        """Worker: run one stage, then release the stages waiting on it."""
+        stage = run.stages[name]
+        with run.lock:
+            inputs = {dependency: run.results.get(dependency) for dependency in stage.depends_on}
+
+        result, error = None, None
+        try:
+            result = stage.func(inputs)
+        except Exception as e:
+            error = e
+            print(f"⚠️ [ANALYSIS] Stage '{name}' failed for {run.label}: {e}")
+
+        if run.on_stage_complete:
+            try:
+                run.on_stage_complete(name, result, error)
+            except Exception as e:
+                print(f"⚠️ [ANALYSIS] Error handling result of stage '{name}': {e}")
+
+        ready = []
+        with run.lock:
+            run.results[name] = result
+            run.remaining -= 1
+            finished = run.remaining == 0
+            for dependent in run.dependents[name]:
+                run.pending[dependent].discard(name)
+                if not run.pending[dependent]:
+                    ready.append(dependent)
+
+        for dependent in ready:
+            self._executor.submit(self._run_stage, run, dependent)
+        if finished:
+            self._finish(run)
+
+    def _finish(self, run: _AnalysisRun):
+        print(f"📊 [ANALYSIS] All analysis stages finished for {run.label}")
+        if run.on_complete:
+            try:
+                run.on_complete(run.results)
+            except Exception as e:
+                print(f"⚠️ [ANALYSIS] Error in completion handler: {e}")
+
+
+# Create a singleton instance
+_analysis_pipeline = None
+_analysis_pipeline_lock = threading.Lock()
+
+def get_analysis_pipeline() -> AnalysisPipeline:
+    """Get the analysis pipeline singleton instance."""
+    global _analysis_pipeline
+    with _analysis_pipeline_lock:
+        if _analysis_pipeline is None:
+            _analysis_pipeline = AnalysisPipeline(get_setting("max_concurrent_analyses", 3))
+        return _analysis_pipeline
+
+
+def shutdown_analysis_pipeline():
+    """Stop the analysis pipeline if it was started."""
+    with _analysis_pipeline_lock:
+        pipeline = _analysis_pipeline
+    if pipeline is not None:
+        pipeline.shutdown()
@@ -0,0 +1,211 @@
+"""
+Shared decoded audio for track analysis.
+Decodes an audio file once and hands resampled mono views to every analyzer
+(BPM/key, chords, lyrics) instead of letting each one decode the MP3 again.
+"""
+import os
+import re
+import glob
+import threading
+from math import gcd
+from typing import Dict, Optional
+
+import numpy as np
+
+from .config import get_setting
+
+
+# Decoded PCM cache next to the audio file: "<audio name>.<sample rate>hz.pcm.npy"
+_PCM_CACHE_SUFFIX = re.compile(r"\.(\d+)hz\.pcm\.npy")
+
+
+def _pcm_cache_files(audio_path: str) -> Dict[int, str]:
+    """Find the PCM caches of one audio file.
+
+    Only exact "<name>.<sr>hz.pcm.npy" names count, so the cache of a sibling
+    such as "Song.remix.mp3" is never taken for the one of "Song.mp3".
+
+    Returns:
+        Sample rate -> cache file path.
+    """
+    prefix = os.path.splitext(audio_path)[0]
+    found = {}
+    for cache_path in glob.glob(glob.escape(prefix) + ".*hz.pcm.npy"):
+        match = _PCM_CACHE_SUFFIX.fullmatch(cache_path[len(prefix):])
+        if match:
+            found[int(match.group(1))] = cache_path
+    return found
+
+
+def remove_pcm_cache(audio_path: str) -> int:
+    """Delete the PCM caches of an audio file (when the download is removed).
+
+    Args:
+        audio_path: Path of the audio file.
+
+    Returns:
+        Number of bytes freed.
+    """
+    freed = 0
+    for cache_path in _pcm_cache_files(audio_path).values():
+        try:
+            size = os.path.getsize(cache_path)
+            os.remove(cache_path)
+            freed += size
+        except OSError as e:
+            print(f"[AUDIO CONTEXT] Could not delete PCM cache {cache_path}: {e}")
+    return freed
+
+
+def _resample(samples: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """Resample a mono signal with a polyphase filter.
+
+    Args:
+        samples: Mono float32 samples.
+        orig_sr: Sample rate of the input.
+        target_sr: Wanted sample rate.
+
+    Returns:
+        Resampled float32 samples.
+    """
+    if orig_sr == target_sr:
+        return samples
+    from scipy.signal import resample_poly
+
+    factor = gcd(orig_sr, target_sr)
+    return resample_poly(samples, target_sr // factor, orig_sr // factor).astype(np.float32)
+
+
+class AudioAnalysisContext:
+    """Decoded PCM of one audio file, shared by the analyzers run on it.
+
+    The file is decoded once to float32 mono at its native sample rate,
+    optionally from/to a memory-mapped ``.npy`` cache next to the audio.
+    Resampled views (22.05 kHz for chroma, 44.1 kHz for madmom, 16 kHz for
+    Whisper) are computed on first use and kept for the next analyzer.
+
+    Arrays returned by :meth:`mono` are shared and read-only.
+    """
+
+    def __init__(self, audio_path: str, use_disk_cache: Optional[bool] = None):
+        """Initialize the context. Nothing is decoded until first use.
+
+        Args:
+            audio_path: Path to the audio file.
+            use_disk_cache: Keep the decoded PCM as ``<name>.<sr>hz.pcm.npy``
+                next to the audio (defaults to the ``analysis_pcm_cache`` setting).
+        """
+        self.audio_path = audio_path
+        if use_disk_cache is None:
+            use_disk_cache = get_setting("analysis_pcm_cache", False)
+        self.use_disk_cache = use_disk_cache
+
+        self._lock = threading.Lock()
+        self._native: Optional[np.ndarray] = None
+        self._native_sr: Optional[int] = None
+        self._views: Dict[int, np.ndarray] = {}
+
+    @property
+    def sample_rate(self) -> int:
+        """Native sample rate of the decoded audio."""
+        with self._lock:
+            self._ensure_decoded()
+            return self._native_sr
+
+    @property
+    def duration(self) -> float:
+        """Duration of the audio in seconds."""
+        with self._lock:
+            self._ensure_decoded()
+            return len(self._native) / float(self._native_sr)
+
+    def mono(self, sr: Optional[int] = None, max_seconds: Optional[float] = None) -> np.ndarray:
+        """Get mono float32 samples.
+
+        Args:
+            sr: Wanted sample rate (native rate if None).
+            max_seconds: Only return the first max_seconds of audio.
+
+        Returns:
+            Read-only array of samples.
+        """
+        with self._lock:
+            self._ensure_decoded()
+            target_sr = sr or self._native_sr
+            view = self._views.get(target_sr)
+            if view is None:
+                view = _resample(self._native, self._native_sr, target_sr)
+                view.flags.writeable = False
+                self._views[target_sr] = view
+
+        if max_seconds is not None:
+            view = view[:int(target_sr * max_seconds)]
+        return view
+
+    def _ensure_decoded(self):
+        """Decode the audio (or map the cached PCM). Caller holds the lock."""
+        if self._native is not None:
+            return
+
+        if self.use_disk_cache:
+            cached = self._load_cached()
+            if cached is not None:
+                return
+
+        samples, sr = self._decode()
+        self._native, self._native_sr = samples, sr
+        self._views[sr] = samples
+
+        if self.use_disk_cache:
+            self._write_cache()
+
+    def _decode(self):
+        """Decode the audio file to float32 mono."""
+        try:
+            # soundfile avoids the numba/DLL issues librosa has on Windows
+            import soundfile as sf
+            data, sr = sf.read(self.audio_path, dtype='float32', always_2d=True)
+            samples = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+        except Exception as e:
+            print(f"[AUDIO CONTEXT] soundfile could not decode {self.audio_path} ({e}), using librosa")
+            import librosa
+            samples, sr = librosa.load(self.audio_path, sr=None, mono=True)
+
+        samples = np.ascontiguousarray(samples, dtype=np.float32)
+        samples.flags.writeable = False
+        print(f"[AUDIO CONTEXT] Decoded {os.path.basename(self.audio_path)}: "
+              f"{len(samples) / sr:.1f}s at {sr} Hz")
+        return samples, int(sr)
+
+    def _cache_prefix(self) -> str:
+        return os.path.splitext(self.audio_path)[0]
+
+    def _load_cached(self) -> Optional[np.ndarray]:
+        """Memory-map a cached decode if it is newer than the audio file."""
+        try:
+            audio_mtime = os.path.getmtime(self.audio_path)
+            for sr, cache_path in _pcm_cache_files(self.audio_path).items():
+                if os.path.getmtime(cache_path) < audio_mtime:
+                    continue
+                self._native = np.load(cache_path, mmap_mode='r')
+                self._native_sr = sr
+                self._views[sr] = self._native
+                return self._native
+        except Exception as e:
+            print(f"[AUDIO CONTEXT] Ignoring unreadable PCM cache: {e}")
+        return None
+
+    def _write_cache(self):
+        """Write the decoded PCM next to the audio file for later analyses."""
+        cache_path = f"{self._cache_prefix()}.{self._native_sr}hz.pcm.npy"
+        tmp_path = cache_path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, self._native)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"[AUDIO CONTEXT] Could not write PCM cache: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
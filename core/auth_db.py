@@ -9,15 +9,95 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 import string
+import threading
+
+from .db import get_connection
 
 # Path to the database file
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stemtubes.db')
 
 def get_db_connection():
-    """Get a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get a pooled connection to the SQLite database (close() returns it to the pool)."""
+    return get_connection(DB_PATH)
+
+class UserCache:
+    """Short-lived in-process cache of logged-in users, keyed by user id.
+
+    The Flask-Login user loader runs on every authenticated request (stem
+    downloads, progress polls, browser logs), so the loaded user objects are
+    kept for a few seconds instead of reading the users table each time.
+    Every write to a user invalidates its entry.
+    """
+
+    def __init__(self, ttl_seconds=60, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user_id):
+        try:
+            return int(user_id)
+        except (TypeError, ValueError):
+            return str(user_id)
+
+    def get_or_load(self, user_id, loader):
+        """Get a cached user, calling loader(user_id) on a miss.
+
+        Args:
+            user_id: User id (Flask-Login passes it as a string).
+            loader: Function returning the user object, or None if unknown.
+
+        Returns:
+            The user object, or None. Unknown users are not cached.
+        """
+        key = self._key(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is not None and self.ttl_seconds > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    # Drop expired entries first, then the oldest ones
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                    while len(self._entries) >= self.max_entries:
+                        self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (now + self.ttl_seconds, user)
+        return user
+
+    def invalidate(self, user_id=None):
+        """Forget one user (or everyone when user_id is None)."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(user_id), None)
+
+    def reset_stats(self):
+        """Zero the hit/miss counters."""
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Get hit/miss counters for diagnostics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'ttl_seconds': self.ttl_seconds,
+            }
 
 def init_db():
     """Initialize the database with the users table if it doesn't exist."""
@@ -140,6 +220,7 @@ def update_user(user_id, username=None, email=None, is_admin=None):
         
         conn.execute(query, params)
         conn.commit()
+        get_user_cache().invalidate(user_id)
         return True
     except sqlite3.IntegrityError:
         # Username already exists
@@ -157,6 +238,7 @@ def change_password(user_id, new_password):
             (password_hash, user_id)
         )
         conn.commit()
+        get_user_cache().invalidate(user_id)
         return True
     finally:
         conn.close()
@@ -167,6 +249,7 @@ def delete_user(user_id):
     try:
         conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
         conn.commit()
+        get_user_cache().invalidate(user_id)
         return True
     finally:
         conn.close()
@@ -235,6 +318,7 @@ def update_user(user_id, username=None, email=None, is_admin=None):
             query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
             conn.execute(query, params)
             conn.commit()
+            get_user_cache().invalidate(user_id)
         
         return True, "User updated successfully"
     except Exception as e:
@@ -252,6 +336,7 @@ def reset_user_password(user_id, new_password):
         if cursor.rowcount == 0:
             return False, "User not found"
         conn.commit()
+        get_user_cache().invalidate(user_id)
         return True, "Password reset successfully"
     except Exception as e:
         print(f"Error resetting password: {e}")
@@ -277,6 +362,7 @@ def delete_user(user_id):
         # Delete user
         cursor = conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
         conn.commit()
+        get_user_cache().invalidate(user_id)
         return True, "User deleted successfully"
     except Exception as e:
         print(f"Error deleting user: {e}")
@@ -304,9 +390,26 @@ def accept_disclaimer(user_id):
             (user_id,)
         )
         conn.commit()
+        get_user_cache().invalidate(user_id)
         return True
     except Exception as e:
         print(f"Error accepting disclaimer: {e}")
         return False
     finally:
         conn.close()
+
+
+# Create singleton instance
+_user_cache = None
+
+def get_user_cache():
+    """Get the user cache singleton instance."""
+    global _user_cache
+    if _user_cache is None:
+        try:
+            from .config import get_setting
+            ttl_seconds = get_setting('user_cache_ttl_seconds', 60)
+        except ImportError:
+            ttl_seconds = 60
+        _user_cache = UserCache(ttl_seconds=ttl_seconds)
+    return _user_cache
@@ -0,0 +1,139 @@
+"""
+Beat grid helpers for StemTubes audio analysis.
+Onset envelopes, tempo estimation, grid phase search and beat snapping,
+all computed in array form.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def spectral_flux(magnitude: np.ndarray) -> np.ndarray:
+    """Onset strength of each frame from an STFT magnitude spectrogram.
+
+    Args:
+        magnitude: Magnitude spectrogram (bins x frames).
+
+    Returns:
+        Half-wave rectified spectral flux per frame.
+    """
+    onset_env = np.sum(np.diff(magnitude, axis=1, prepend=0), axis=0)
+    return np.maximum(0, onset_env)
+
+
+def onset_envelope(y: np.ndarray, sr: int, n_fft: int = 2048, hop_length: int = 512) -> np.ndarray:
+    """Compute the spectral-flux onset envelope of a signal.
+
+    Args:
+        y: Mono audio signal.
+        sr: Sample rate.
+        n_fft: FFT size.
+        hop_length: Samples between frames.
+
+    Returns:
+        Onset strength per frame (frame rate sr / hop_length).
+    """
+    from scipy import signal
+
+    _, _, Zxx = signal.stft(y, fs=sr, nperseg=n_fft, noverlap=n_fft - hop_length)
+    return spectral_flux(np.abs(Zxx))
+
+
+def autocorrelation_tempo(onset_env: np.ndarray, frame_rate: float,
+                          min_bpm: float = 60, max_bpm: float = 200) -> Optional[float]:
+    """Estimate the tempo from the strongest autocorrelation lag of an onset envelope.
+
+    Args:
+        onset_env: Onset strength per frame.
+        frame_rate: Frames per second of the envelope.
+        min_bpm: Slowest tempo considered.
+        max_bpm: Fastest tempo considered.
+
+    Returns:
+        Tempo in BPM, or None if the envelope is too short for min_bpm.
+    """
+    n = len(onset_env)
+    min_lag = int(frame_rate * 60 / max_bpm)
+    max_lag = int(frame_rate * 60 / min_bpm)
+    if max_lag >= n:
+        return None
+
+    # Autocorrelation through the FFT (zero-padded, so it is linear not circular)
+    spectrum = np.fft.rfft(onset_env, 2 * n)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), 2 * n)[:n]
+
+    peak_lag = int(np.argmax(autocorr[min_lag:max_lag])) + min_lag
+    tempo_period = peak_lag / frame_rate
+    return 60.0 / tempo_period if tempo_period > 0 else None
+
+
+def best_grid_offset(onset_env: np.ndarray, frame_rate: float, beat_period: float,
+                     num_offsets: int = 50, tolerance: float = 0.05) -> Tuple[float, float]:
+    """Find the phase of a beat grid that best lines up with the onsets.
+
+    Every candidate offset in [0, beat_period] is scored at once: for each
+    grid beat, take the strongest onset within +/- tolerance (a max-pool
+    centred on the beat) and sum over the grid.
+
+    Args:
+        onset_env: Onset strength per frame.
+        frame_rate: Frames per second of the envelope.
+        beat_period: Seconds per beat.
+        num_offsets: Number of evenly spaced offsets to try.
+        tolerance: Half-width of the window around each beat, in seconds.
+
+    Returns:
+        (best offset in seconds, its score). The first best offset wins ties.
+    """
+    n_frames = len(onset_env)
+    offsets = np.linspace(0, beat_period, num_offsets)
+    if n_frames == 0:
+        return 0.0, 0.0
+    last_time = (n_frames - 1) / frame_rate
+
+    # Beat times of every grid: offsets x beats, masked past the last frame
+    max_beats = int(np.ceil(last_time / beat_period)) + 1
+    beat_times = offsets[:, None] + np.arange(max_beats)[None, :] * beat_period
+    beat_valid = beat_times < last_time
+
+    # Frames that can fall inside each beat's window: offsets x beats x window
+    radius = int(np.ceil(tolerance * frame_rate)) + 1
+    centers = np.rint(beat_times * frame_rate).astype(np.int64)
+    frames = centers[:, :, None] + np.arange(-radius, radius + 1)[None, None, :]
+    in_window = (
+        (frames >= 0) & (frames < n_frames)
+        & (np.abs(frames / frame_rate - beat_times[:, :, None]) < tolerance)
+        & beat_valid[:, :, None]
+    )
+
+    # Onsets are non-negative, so empty windows contribute 0
+    strengths = np.where(in_window, onset_env[np.clip(frames, 0, n_frames - 1)], 0.0)
+    scores = strengths.max(axis=2).sum(axis=1)
+
+    best = int(np.argmax(scores))
+    return float(offsets[best]), float(scores[best])
+
+
+def snap_to_beats(times: np.ndarray, beats: np.ndarray, max_distance: float) -> np.ndarray:
+    """Move each time to its nearest beat when that beat is close enough.
+
+    Args:
+        times: Times in seconds.
+        beats: Sorted beat times in seconds.
+        max_distance: Only snap when the nearest beat is closer than this.
+
+    Returns:
+        Snapped times (unchanged where no beat is close enough).
+    """
+    times = np.asarray(times, dtype=float)
+    beats = np.asarray(beats, dtype=float)
+    if len(beats) == 0 or len(times) == 0:
+        return times
+
+    right = np.clip(np.searchsorted(beats, times), 0, len(beats) - 1)
+    left = np.clip(right - 1, 0, len(beats) - 1)
+    # Earlier beat wins ties
+    use_left = np.abs(times - beats[left]) <= np.abs(beats[right] - times)
+    nearest = np.where(use_left, beats[left], beats[right])
+
+    return np.where(np.abs(nearest - times) < max_distance, nearest, times)
@@ -6,6 +6,7 @@ Professional-grade chord detection with 170 chord vocabulary using deep learning
 import os
 import sys
 import json
+import threading
 import numpy as np
 from typing import Tuple, Optional, List, Dict
 
@@ -226,6 +227,20 @@ class BTCChordDetector:
         return merged
 
 
+# Shared detector: loading the BTC transformer weights is expensive
+_detector = None
+_detector_lock = threading.Lock()
+_detect_lock = threading.Lock()
+
+def get_detector() -> BTCChordDetector:
+    """Get the shared BTC detector, building it on first use."""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = BTCChordDetector()
+        return _detector
+
+
 def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None) -> Tuple[Optional[str], float]:
     """
     Main entry point for BTC chord detection (matches Stemtube API).
@@ -242,8 +257,10 @@ def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None) -> Tup
         return None, 0.0
 
     try:
-        detector = BTCChordDetector()
-        return detector.detect_chords(audio_file_path, bpm)
+        detector = get_detector()
+        # One transformer instance is shared, so analyses run one at a time
+        with _detect_lock:
+            return detector.detect_chords(audio_file_path, bpm)
     except Exception as e:
         print(f"[BTC] Analysis failed: {e}")
         import traceback
@@ -8,6 +8,13 @@ import librosa
 import numpy as np
 from pathlib import Path
 
+from core.chroma import compute_chroma
+from core.chord_templates import ChordTemplateBank, sum_normalize, run_lengths
+from core.beat_grid import onset_envelope, autocorrelation_tempo, best_grid_offset
+
+# Major and minor triads on every root, shared by all detectors
+TRIAD_BANK = ChordTemplateBank.triads()
+
 try:
     from pychord import Chord as PyChord
     PYCHORD_AVAILABLE = True
@@ -24,11 +31,10 @@ class ChordDetector:
         # Note names in chromatic order
         self.note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
-        # Major and minor chord templates (triad intervals)
-        self.major_template = np.array([1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0])  # Root, major 3rd, 5th
-        self.minor_template = np.array([1, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 0])  # Root, minor 3rd, 5th
+        # Major and minor chord templates (triad intervals) on all 12 roots
+        self.template_bank = TRIAD_BANK
 
-    def detect_chords(self, audio_file_path, hop_length=2048, bpm=None):
+    def detect_chords(self, audio_file_path, hop_length=2048, bpm=None, context=None):
         """
         Detect chords in an audio file using librosa chroma analysis.
 
@@ -36,6 +42,7 @@ class ChordDetector:
             audio_file_path: Path to the audio file
             hop_length: Number of samples between frames (affects time resolution)
             bpm: Optional BPM for beat grid alignment (if not provided, will estimate)
+            context: Optional AudioAnalysisContext holding the decoded audio
 
         Returns:
             List of dicts with {timestamp: float, chord: str}
@@ -49,10 +56,13 @@ class ChordDetector:
             print(f"Analyzing chords in: {audio_file_path}")
 
             # Load audio file (limit to first 3 minutes for performance)
-            # Use soundfile directly to avoid numba/llvmlite issues on Windows
-            import soundfile as sf
+            if context is not None:
+                y, sr = context.mono(22050, max_seconds=180), 22050
+            else:
+                # Use soundfile directly to avoid numba/llvmlite issues on Windows
+                import soundfile as sf
 
-            y, sr = sf.read(audio_file_path, dtype='float32')
+                y, sr = sf.read(audio_file_path, dtype='float32')
 
             # Convert to mono if stereo
             if len(y.shape) > 1:
@@ -93,54 +103,26 @@ class ChordDetector:
             magnitude = np.abs(Zxx)
 
             # Map frequency bins to pitch classes (12-note chromagram)
-            chroma = self._compute_chroma_from_stft(magnitude, f, sr)
+            chroma = compute_chroma(magnitude, sr, n_fft=4096)
 
             # Compute frame times manually (avoid librosa.frames_to_time which uses numba)
             frame_times = np.arange(chroma.shape[1]) * hop_length / sr
 
-            # Detect chords for each frame
-            chord_timeline = []
-            current_chord = None
-            current_start_time = 0
-
-            for i, frame_time in enumerate(frame_times):
-
-                # Get chroma vector for this frame
-                chroma_frame = chroma[:, i]
-
-                # Detect chord from chroma
-                detected_chord = self._detect_chord_from_chroma(chroma_frame)
-
-                # Only add to timeline if chord changed
-                if detected_chord != current_chord:
-                    # Filter out very short chord segments (< 0.5 seconds)
-                    if current_chord is not None and (frame_time - current_start_time) >= 0.5:
-                        # Quantize timestamp to nearest beat (Chordify/Moises style)
-                        quantized_time = self._quantize_to_beat_grid(
-                            current_start_time,
-                            beat_offset,
-                            seconds_per_beat
-                        )
-
-                        chord_timeline.append({
-                            'timestamp': round(quantized_time, 2),
-                            'chord': current_chord
-                        })
-
-                    current_chord = detected_chord
-                    current_start_time = frame_time
-
-            # Add the last chord (quantized)
-            if current_chord is not None:
-                quantized_time = self._quantize_to_beat_grid(
-                    current_start_time,
-                    beat_offset,
-                    seconds_per_beat
-                )
-                chord_timeline.append({
-                    'timestamp': round(quantized_time, 2),
-                    'chord': current_chord
-                })
+            # Detect chords for all frames at once, then collapse into runs
+            frame_chords = self._detect_chords_from_chroma(chroma)
+            run_starts, run_chords = run_lengths(frame_chords)
+            start_times = frame_times[run_starts]
+
+            # Filter out very short chord segments (< 0.5 seconds); the last one is always kept
+            keep = np.append(np.diff(start_times) >= 0.5, True)[:len(start_times)]
+
+            # Quantize timestamps to nearest beat (Chordify/Moises style)
+            quantized_times = self._quantize_to_beat_grid(start_times[keep], beat_offset, seconds_per_beat)
+
+            chord_timeline = [
+                {'timestamp': round(float(timestamp), 2), 'chord': str(chord)}
+                for timestamp, chord in zip(quantized_times, run_chords[keep])
+            ]
 
             print(f"Detected {len(chord_timeline)} chord changes (quantized to beat grid)")
             return chord_timeline
@@ -157,18 +139,18 @@ class ChordDetector:
         This is how Chordify/Moises align chords to beats.
 
         Args:
-            timestamp: Original timestamp in seconds
+            timestamp: Original timestamp in seconds (float or array)
             beat_offset: Time of first downbeat in seconds
             seconds_per_beat: Duration of one beat in seconds
 
         Returns:
-            float: Quantized timestamp aligned to nearest beat
+            Quantized timestamp(s) aligned to nearest beat
         """
         # Calculate time relative to first downbeat
         relative_time = timestamp - beat_offset
 
-        # Find nearest beat number
-        beat_number = round(relative_time / seconds_per_beat)
+        # Find nearest beat number (round half to even, like round())
+        beat_number = np.rint(relative_time / seconds_per_beat)
 
         # Convert back to absolute time
         quantized_time = beat_offset + (beat_number * seconds_per_beat)
@@ -189,60 +171,28 @@ class ChordDetector:
             float: Time in seconds of first downbeat
         """
         try:
-            from scipy import signal
-
             # Estimate BPM if not provided
             if bpm is None:
                 bpm = self._estimate_bpm(y, sr)
                 print(f"Estimated BPM for beat grid: {bpm:.1f}")
 
-            # Compute onset envelope
+            # Compute onset envelope (spectral flux)
             hop_length = 512
-            n_fft = 2048
-
-            f, t, Zxx = signal.stft(y, fs=sr, nperseg=n_fft, noverlap=n_fft-hop_length)
-            magnitude = np.abs(Zxx)
-
-            # Onset strength (spectral flux)
-            onset_env = np.sum(np.diff(magnitude, axis=1, prepend=0), axis=0)
-            onset_env = np.maximum(0, onset_env)
+            onset_env = onset_envelope(y, sr, n_fft=2048, hop_length=hop_length)
 
             # Normalize onset envelope
             if np.max(onset_env) > 0:
                 onset_env = onset_env / np.max(onset_env)
 
-            # Frame times
-            frame_times = np.arange(len(onset_env)) * hop_length / sr
-
-            # Beat period in seconds
-            beat_period = 60.0 / bpm
-
-            # Try different phase offsets to find best alignment
-            # Test offsets from 0 to one beat period
-            num_test_offsets = 50
-            test_offsets = np.linspace(0, beat_period, num_test_offsets)
-
-            best_score = -1
-            best_offset = 0
-
-            for offset in test_offsets:
-                # Create beat grid with this offset
-                beat_times = np.arange(offset, frame_times[-1], beat_period)
-
-                # Score: sum of onset strengths near beat times
-                score = 0
-                tolerance = 0.05  # 50ms tolerance window
-
-                for beat_time in beat_times:
-                    # Find frames within tolerance of this beat
-                    nearby_frames = np.where(np.abs(frame_times - beat_time) < tolerance)[0]
-                    if len(nearby_frames) > 0:
-                        # Add max onset strength in this window
-                        score += np.max(onset_env[nearby_frames])
-
-                if score > best_score:
-                    best_score = score
-                    best_offset = offset
+            # Score 50 phase offsets across one beat period at once,
+            # with a 50ms tolerance window around each beat
+            best_offset, best_score = best_grid_offset(
+                onset_env,
+                frame_rate=sr / hop_length,
+                beat_period=60.0 / bpm,
+                num_offsets=50,
+                tolerance=0.05
+            )
 
             print(f"Beat grid alignment score: {best_score:.2f}, offset: {best_offset:.3f}s")
             return best_offset
@@ -255,123 +205,36 @@ class ChordDetector:
 
     def _estimate_bpm(self, y, sr):
         """Quick BPM estimation using autocorrelation."""
-        from scipy import signal
-
         hop_length = 512
-        n_fft = 2048
 
         # Compute onset envelope
-        f, t, Zxx = signal.stft(y, fs=sr, nperseg=n_fft, noverlap=n_fft-hop_length)
-        magnitude = np.abs(Zxx)
-        onset_env = np.sum(np.diff(magnitude, axis=1, prepend=0), axis=0)
-        onset_env = np.maximum(0, onset_env)
-
-        # Autocorrelation
-        autocorr = np.correlate(onset_env, onset_env, mode='full')
-        autocorr = autocorr[len(autocorr)//2:]
+        onset_env = onset_envelope(y, sr, n_fft=2048, hop_length=hop_length)
 
         # Find peak in 60-200 BPM range
-        min_lag = int(sr / hop_length * 60 / 200)
-        max_lag = int(sr / hop_length * 60 / 60)
+        bpm = autocorrelation_tempo(onset_env, sr / hop_length, min_bpm=60, max_bpm=200)
+        if bpm is None:
+            return 120.0  # Default
+        return np.clip(bpm, 60, 200)
 
-        if max_lag < len(autocorr):
-            peak_lag = np.argmax(autocorr[min_lag:max_lag]) + min_lag
-            tempo_period = peak_lag * hop_length / sr
-            bpm = 60.0 / tempo_period if tempo_period > 0 else 120.0
-            return np.clip(bpm, 60, 200)
-
-        return 120.0  # Default
-
-    def _detect_chord_from_chroma(self, chroma_frame):
+    def _detect_chords_from_chroma(self, chroma):
         """
-        Detect chord from a chroma feature vector.
+        Detect the chord of every frame of a chromagram.
 
         Args:
-            chroma_frame: 12-dimensional chroma vector
+            chroma: 12 x time_frames chroma matrix
 
         Returns:
-            str: Chord name (e.g., "C", "Am", "G7")
+            np.ndarray: Chord name per frame (e.g., "C", "Am"), "N" for no chord
         """
-        # Normalize chroma
-        if np.sum(chroma_frame) > 0:
-            chroma_frame = chroma_frame / np.sum(chroma_frame)
-        else:
-            return "N"  # No chord
-
-        # Find root note (highest energy pitch class)
-        root_note = int(np.argmax(chroma_frame))
-
-        # Try to match major or minor chord by rotating templates
-        best_match = None
-        best_score = 0
-        best_quality = "maj"
-
-        for root in range(12):
-            # Rotate templates to match root
-            major_rotated = np.roll(self.major_template, root)
-            minor_rotated = np.roll(self.minor_template, root)
-
-            # Calculate correlation with chroma
-            major_score = np.dot(chroma_frame, major_rotated)
-            minor_score = np.dot(chroma_frame, minor_rotated)
-
-            if major_score > best_score:
-                best_score = major_score
-                best_match = root
-                best_quality = ""  # Major (no suffix)
-
-            if minor_score > best_score:
-                best_score = minor_score
-                best_match = root
-                best_quality = "m"  # Minor
+        # Normalize each frame, then score all triads against all frames in one matmul
+        scores = self.template_bank.dot_scores(sum_normalize(chroma))
+        best_idx, best_scores = self.template_bank.best(scores)
 
         # If no good match, return N (no chord)
         # Lower threshold to 0.2 for better chord detection
-        if best_score < 0.2:
-            return "N"
-
-        # Build chord name
-        chord_name = self.note_names[best_match] + best_quality
-
-        return chord_name
-
-    def _compute_chroma_from_stft(self, magnitude, frequencies, sr):
-        """
-        Compute 12-dimensional chroma features from STFT magnitude spectrogram.
-
-        Args:
-            magnitude: STFT magnitude spectrogram (freq_bins x time_frames)
-            frequencies: Frequency values for each bin
-            sr: Sample rate
-
-        Returns:
-            12 x time_frames chroma matrix
-        """
-        # Initialize chroma matrix
-        n_frames = magnitude.shape[1]
-        chroma = np.zeros((12, n_frames))
-
-        # Reference frequency for A4 (MIDI note 69)
-        A4_freq = 440.0
-
-        # Map each frequency bin to a pitch class (0-11)
-        for i, freq in enumerate(frequencies):
-            if freq > 0:
-                # Convert frequency to MIDI note number
-                midi_note = 69 + 12 * np.log2(freq / A4_freq)
-
-                # Get pitch class (C=0, C#=1, ..., B=11)
-                pitch_class = int(round(midi_note)) % 12
-
-                # Add magnitude to corresponding pitch class
-                chroma[pitch_class, :] += magnitude[i, :]
-
-        # Normalize each frame
-        for j in range(n_frames):
-            if np.sum(chroma[:, j]) > 0:
-                chroma[:, j] /= np.sum(chroma[:, j])
-
-        return chroma
+        names = np.array(self.template_bank.names + ['N'])
+        best_idx = np.where(best_scores >= 0.2, best_idx, len(self.template_bank))
+        return names[best_idx]
 
     def _simplify_chord_name(self, chord_name):
         """
@@ -466,7 +329,32 @@ class ChordDetector:
         }
 
 
-def analyze_audio_file(audio_file_path, bpm=None, detected_key=None, use_btc=True, use_hybrid=False, use_madmom=True):
+def warm_up_detectors(use_btc=True, use_madmom=True):
+    """
+    Build the shared BTC and madmom detectors ahead of the first analysis.
+
+    Args:
+        use_btc: Whether to load the BTC transformer
+        use_madmom: Whether to load the madmom processors
+    """
+    if use_btc:
+        try:
+            from core.btc_chord_detector import get_detector as get_btc_detector, is_available
+            if is_available():
+                get_btc_detector()
+        except Exception as e:
+            print(f"[CHORD DETECTION] BTC warm-up failed: {e}")
+
+    if use_madmom:
+        try:
+            from core.madmom_chord_detector import get_detector as get_madmom_detector, is_available
+            if is_available():
+                get_madmom_detector()
+        except Exception as e:
+            print(f"[CHORD DETECTION] Madmom warm-up failed: {e}")
+
+
+def analyze_audio_file(audio_file_path, bpm=None, detected_key=None, use_btc=True, use_hybrid=False, use_madmom=True, context=None):
     """
     Main function to analyze an audio file for chords.
 
@@ -483,6 +371,8 @@ def analyze_audio_file(audio_file_path, bpm=None, detected_key=None, use_btc=Tru
         use_btc: Whether to use BTC transformer (default: True - RECOMMENDED for best accuracy)
         use_hybrid: Whether to try hybrid detector (default: False)
         use_madmom: Whether to use pure madmom CRF (default: True)
+        context: Optional AudioAnalysisContext so madmom/hybrid/basic reuse the decoded audio
+                 (BTC loads the file itself)
 
     Returns:
         tuple: (chords_json, beat_offset) or (None, 0.0) if failed
@@ -515,7 +405,7 @@ def analyze_audio_file(audio_file_path, bpm=None, detected_key=None, use_btc=Tru
 
             if is_available():
                 print("[CHORD DETECTION] Using professional madmom CRF engine (works on all genres)...")
-                chords_json, beat_offset = madmom_analyze(audio_file_path, bpm)
+                chords_json, beat_offset = madmom_analyze(audio_file_path, bpm, context=context)
 
                 if chords_json:
                     print("[CHORD DETECTION] ✓ Madmom CRF detection successful")
@@ -533,7 +423,7 @@ def analyze_audio_file(audio_file_path, bpm=None, detected_key=None, use_btc=Tru
             from core.hybrid_chord_detector import analyze_audio_file as hybrid_analyze
 
             print("[CHORD DETECTION] Using hybrid engine (madmom beats + key-aware templates)...")
-            chords_json, beat_offset = hybrid_analyze(audio_file_path, bpm, detected_key)
+            chords_json, beat_offset = hybrid_analyze(audio_file_path, bpm, detected_key, context=context)
 
             if chords_json:
                 print("[CHORD DETECTION] ✓ Hybrid detection successful")
@@ -546,7 +436,7 @@ def analyze_audio_file(audio_file_path, bpm=None, detected_key=None, use_btc=Tru
     # Fallback to basic detector
     print("[CHORD DETECTION] Using basic STFT-based detector...")
     detector = ChordDetector()
-    chord_timeline = detector.detect_chords(audio_file_path, bpm=bpm)
+    chord_timeline = detector.detect_chords(audio_file_path, bpm=bpm, context=context)
 
     # Return both chord data and beat offset
     chords_json = detector.format_for_database(chord_timeline)
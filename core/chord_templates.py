@@ -0,0 +1,139 @@
+"""
+Chord template matching for StemTubes chord detection.
+Holds chord templates as one (templates x 12) matrix and scores them against
+a whole chromagram at once instead of frame by frame.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+
+class ChordTemplateBank:
+    """A set of named 12-bin chord templates stacked into one matrix."""
+
+    def __init__(self, templates: Dict[str, Sequence[float]]):
+        """Build the bank.
+
+        Args:
+            templates: Chord name -> 12-bin template (C=0 ... B=11), in
+                tie-break order: on equal scores the earlier chord wins.
+        """
+        self.names: List[str] = list(templates)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.matrix = np.array([templates[name] for name in self.names], dtype=np.float32)
+        self.norms = np.linalg.norm(self.matrix, axis=1)
+        self.note_counts = np.count_nonzero(self.matrix, axis=1)
+
+    @classmethod
+    def triads(cls) -> "ChordTemplateBank":
+        """Major and minor triads on all 12 roots (C, Cm, C#, C#m, ...)."""
+        templates = {}
+        for root, note in enumerate(NOTE_NAMES):
+            for suffix, third in (("", 4), ("m", 3)):
+                template = np.zeros(12)
+                template[[root, (root + third) % 12, (root + 7) % 12]] = 1
+                templates[note + suffix] = template
+        return cls(templates)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def subset(self, names: Iterable[str]) -> np.ndarray:
+        """Get the row indices of the given chords, in bank order."""
+        wanted = set(names)
+        return np.array([i for i, name in enumerate(self.names) if name in wanted], dtype=np.intp)
+
+    def dot_scores(self, chroma: np.ndarray) -> np.ndarray:
+        """Score every template against every frame with a plain dot product.
+
+        Args:
+            chroma: Chromagram (12 x frames).
+
+        Returns:
+            Scores (templates x frames).
+        """
+        return self.matrix @ np.asarray(chroma, dtype=np.float32)
+
+    def cosine_scores(self, chroma: np.ndarray, eps: float = 1e-10) -> np.ndarray:
+        """Score every template against every frame with cosine similarity.
+
+        Args:
+            chroma: Chromagram (12 x frames).
+            eps: Added to the norm product to avoid dividing by zero.
+
+        Returns:
+            Scores (templates x frames).
+        """
+        frame_norms = np.linalg.norm(chroma, axis=0)
+        return self.dot_scores(chroma) / (self.norms[:, None] * frame_norms[None, :] + eps)
+
+    def notes_present(self, chroma: np.ndarray, min_energy: float) -> np.ndarray:
+        """Check which templates have every one of their notes in each frame.
+
+        Args:
+            chroma: Chromagram (12 x frames).
+            min_energy: Energy a pitch class needs to count as present.
+
+        Returns:
+            Boolean matrix (templates x frames).
+        """
+        missing = (np.asarray(chroma) < min_energy).astype(np.float32)
+        return (self.matrix > 0).astype(np.float32) @ missing == 0
+
+    def key_mask(self, key_chords: Optional[Iterable[str]]) -> np.ndarray:
+        """Get a boolean mask of the templates belonging to a key.
+
+        Args:
+            key_chords: Chord names of the key, or None to accept every chord.
+
+        Returns:
+            Boolean vector (templates,).
+        """
+        if key_chords is None:
+            return np.ones(len(self.names), dtype=bool)
+        mask = np.zeros(len(self.names), dtype=bool)
+        mask[self.subset(key_chords)] = True
+        return mask
+
+    @staticmethod
+    def best(scores: np.ndarray, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick the best template per frame.
+
+        Args:
+            scores: Scores (templates x frames).
+            mask: Optional boolean matrix of allowed (template, frame) pairs.
+
+        Returns:
+            (template index per frame, score per frame). Frames with no
+            allowed template get score -inf.
+        """
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        best_idx = np.argmax(scores, axis=0)
+        best_scores = scores[best_idx, np.arange(scores.shape[1])]
+        return best_idx, best_scores
+
+
+def sum_normalize(chroma: np.ndarray) -> np.ndarray:
+    """Scale each chroma frame to sum to 1, leaving silent frames at zero."""
+    chroma = np.asarray(chroma, dtype=np.float32)
+    totals = chroma.sum(axis=0, keepdims=True)
+    return np.divide(chroma, totals, out=np.zeros_like(chroma), where=totals > 0)
+
+
+def run_lengths(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Collapse a label sequence into runs of identical values.
+
+    Args:
+        labels: 1-D array of per-frame labels.
+
+    Returns:
+        (start index of each run, label of each run).
+    """
+    labels = np.asarray(labels)
+    if labels.size == 0:
+        return np.array([], dtype=np.intp), labels
+    starts = np.concatenate(([0], np.flatnonzero(labels[1:] != labels[:-1]) + 1))
+    return starts, labels[starts]
@@ -0,0 +1,78 @@
+"""
+Chroma features for StemTubes audio analysis.
+Folds an STFT magnitude spectrogram into the 12 pitch classes with a single
+precomputed bin-to-pitch-class matrix instead of a Python loop over bins.
+"""
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+# Reference frequency for A4 (MIDI note 69)
+A4_FREQ = 440.0
+
+
+@lru_cache(maxsize=32)
+def _pitch_class_matrix(n_fft: int, sr: int, dtype_name: str) -> np.ndarray:
+    matrix = np.zeros((12, n_fft // 2 + 1), dtype=dtype_name)
+    frequencies = np.arange(n_fft // 2 + 1) * (sr / n_fft)
+
+    # DC bin has no pitch
+    bins = np.nonzero(frequencies > 0)[0]
+    midi_notes = 69 + 12 * np.log2(frequencies[bins] / A4_FREQ)
+    pitch_classes = np.rint(midi_notes).astype(np.int64) % 12
+    matrix[pitch_classes, bins] = 1.0
+
+    matrix.flags.writeable = False
+    return matrix
+
+
+def pitch_class_matrix(n_fft: int, sr: int, dtype=np.float32) -> np.ndarray:
+    """Get the 12 x (n_fft // 2 + 1) matrix mapping STFT bins to pitch classes.
+
+    Each bin is assigned to the pitch class of its nearest equal-tempered note.
+    The matrix is built once per (n_fft, sr, dtype) and shared (read-only).
+
+    Args:
+        n_fft: FFT size of the STFT.
+        sr: Sample rate of the audio.
+        dtype: Floating point type of the matrix.
+
+    Returns:
+        Read-only 0/1 matrix of shape (12, n_fft // 2 + 1).
+    """
+    return _pitch_class_matrix(int(n_fft), int(sr), np.dtype(dtype).name)
+
+
+def compute_chroma(magnitude: np.ndarray, sr: int, n_fft: int, normalize: bool = True,
+                   chunk_frames: Optional[int] = None, dtype=np.float32) -> np.ndarray:
+    """Compute 12-dimensional chroma features from an STFT magnitude spectrogram.
+
+    Args:
+        magnitude: Magnitude spectrogram (n_fft // 2 + 1 bins x frames).
+        sr: Sample rate of the audio.
+        n_fft: FFT size used for the spectrogram.
+        normalize: Scale each frame to sum to 1 (silent frames stay zero).
+        chunk_frames: Process this many frames at a time to bound the memory
+            of the dtype conversion on long tracks (None processes all at once).
+        dtype: Floating point type of the computation and result.
+
+    Returns:
+        Chroma matrix of shape (12, frames).
+    """
+    mapping = pitch_class_matrix(n_fft, sr, dtype)
+    if magnitude.shape[0] != mapping.shape[1]:
+        raise ValueError(f"Spectrogram has {magnitude.shape[0]} bins, expected {mapping.shape[1]} for n_fft={n_fft}")
+
+    n_frames = magnitude.shape[1]
+    step = chunk_frames or n_frames or 1
+    chroma = np.empty((12, n_frames), dtype=dtype)
+    for start in range(0, n_frames, step):
+        block = np.asarray(magnitude[:, start:start + step], dtype=dtype)
+        np.matmul(mapping, block, out=chroma[:, start:start + step])
+
+    if normalize:
+        totals = chroma.sum(axis=0, keepdims=True)
+        np.divide(chroma, totals, out=chroma, where=totals > 0)
+
+    return chroma
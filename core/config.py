@@ -68,6 +68,27 @@ DEFAULT_SETTINGS = {
     "auto_check_updates": True,
     "extraction_timeout_minutes": 30,
     "extraction_progress_timeout_minutes": 5,
+    "max_cached_stem_models": 2,           # Demucs models kept loaded between extractions
+    "max_concurrent_extractions": 0,       # Shared extraction workers (0 = size from CPU/GPU and RAM)
+    "analysis_pcm_cache": False,           # Keep decoded PCM (.npy) next to downloads for re-analysis
+    "max_concurrent_analyses": 3,          # Post-download analysis stages running at once (all users)
+    "max_concurrent_transcriptions": 1,    # Whisper transcriptions running at once (all users)
+    "lyrics_model_idle_minutes": 30,       # Unload Whisper models unused this long (0 = keep loaded)
+    "preload_lyrics_model": False,         # Load the Whisper model at startup
+    "preload_chord_models": True,          # Load the BTC/madmom chord models at startup
+    # SQLite connection pool settings
+    "db_pool_size": 8,                     # Idle connections kept open per database file
+    "db_busy_timeout_ms": 5000,            # Wait this long for a write lock before failing
+    "db_cache_size_kb": 16384,             # Page cache per connection
+    "db_mmap_size_mb": 64,                 # Memory-mapped I/O per connection (0 = off)
+    "db_slow_query_ms": 200,               # Log statements slower than this (0 = never)
+    "user_cache_ttl_seconds": 60,          # Keep logged-in users in memory this long (0 = always reload)
+    "library_page_size": 100,              # Items per /api/library page (clients follow next_cursor)
+    "stem_renditions": ["opus64", "opus96", "aac128"],  # Low-bitrate stem copies for mobile ([] = off)
+    "stem_rendition_workers": 1,           # Background ffmpeg transcodes allowed at once
+    "media_delivery": "direct",            # Media bytes sent by: "direct" (Flask), "x-accel" (nginx), "x-sendfile"
+    "media_accel_prefix": "/internal-media/",  # nginx internal location aliased to the downloads directory
+    "media_immutable_max_age": 31536000,   # Browser cache lifetime of versioned (?v=) media URLs (seconds)
     # Silent stem detection settings
     "enable_silent_stem_detection": True,  # Enable intelligent filtering of silent/empty stems
     "silent_stem_threshold_db": -40.0,     # dB threshold for silence detection
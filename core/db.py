@@ -0,0 +1,378 @@
+"""
+SQLite connection pooling for StemTubes application.
+Keeps a few open connections per database file, configured once with WAL
+journaling and tuned pragmas, and hands them out to request and worker
+threads instead of opening a new connection for every query.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Main application database (users, downloads, extractions)
+APP_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stemtubes.db')
+
+# Distinct statements tracked in the query statistics
+MAX_TRACKED_QUERIES = 500
+
+
+def _settings() -> Dict[str, float]:
+    """Read the database settings, falling back to defaults if config is unavailable."""
+    defaults = {
+        "db_pool_size": 8,
+        "db_busy_timeout_ms": 5000,
+        "db_cache_size_kb": 16384,
+        "db_mmap_size_mb": 64,
+        "db_slow_query_ms": 200,
+    }
+    try:
+        from .config import get_setting
+    except ImportError:
+        return defaults
+    return {key: get_setting(key, default) for key, default in defaults.items()}
+
+
+class QueryStats:
+    """Thread-safe timings of the statements run through pooled connections."""
+
+    def __init__(self, slow_query_ms: float):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, sql: str, elapsed: float):
+        """Record one execution of a statement.
+
+        Args:
+            sql: Statement text.
+            elapsed: Execution time in seconds.
+        """
+        elapsed_ms = elapsed * 1000
+        key = re.sub(r"\s+", " ", sql).strip()[:200]
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= MAX_TRACKED_QUERIES:
+                    entry = None
+                else:
+                    entry = self._stats[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            if entry is not None:
+                entry["count"] += 1
+                entry["total_ms"] += elapsed_ms
+                entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+        if self.slow_query_ms and elapsed_ms >= self.slow_query_ms:
+            print(f"🐢 [DB] Slow query ({elapsed_ms:.1f} ms): {key}")
+
+    def snapshot(self, limit: Optional[int] = None) -> List[Dict]:
+        """Get the statistics, most expensive statements first.
+
+        Args:
+            limit: Maximum number of statements to return (None for all).
+
+        Returns:
+            List of dicts with sql, count, total_ms, avg_ms and max_ms.
+        """
+        with self._lock:
+            items = [(sql, dict(entry)) for sql, entry in self._stats.items()]
+        rows = [
+            {
+                "sql": sql,
+                "count": entry["count"],
+                "total_ms": round(entry["total_ms"], 3),
+                "avg_ms": round(entry["total_ms"] / entry["count"], 3),
+                "max_ms": round(entry["max_ms"], 3),
+            }
+            for sql, entry in items
+        ]
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def reset(self):
+        """Forget all recorded timings."""
+        with self._lock:
+            self._stats.clear()
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """Cursor that reports the time of each statement to the query stats."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            get_query_stats().record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            get_query_stats().record(sql, time.perf_counter() - start)
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that goes back to its pool instead of closing.
+
+    Works with the usual patterns: ``with conn:`` commits (or rolls back) and
+    then returns the connection, and ``conn.close()`` discards uncommitted
+    changes and returns it. Releasing twice is harmless.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool: Optional["ConnectionPool"] = None
+        self._checked_out = False
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or _TimedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        result = super().__exit__(exc_type, exc_value, traceback)
+        self.close()
+        return result
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def _close_connection(self):
+        """Really close the underlying connection."""
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """Bounded set of idle connections to one SQLite database file."""
+
+    def __init__(self, db_path: str, max_idle: int = 8, busy_timeout_ms: int = 5000,
+                 cache_size_kb: int = 16384, mmap_size_mb: int = 64):
+        """Initialize the pool. Connections are opened on demand.
+
+        Args:
+            db_path: Path to the database file.
+            max_idle: Connections kept open while unused; extra ones are closed
+                when released.
+            busy_timeout_ms: How long a writer waits for a lock before failing.
+            cache_size_kb: Page cache size per connection.
+            mmap_size_mb: Memory-mapped I/O size per connection.
+        """
+        self.db_path = db_path
+        self.max_idle = max(0, int(max_idle))
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.cache_size_kb = int(cache_size_kb)
+        self.mmap_size_mb = int(mmap_size_mb)
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _open(self) -> PooledConnection:
+        """Open and configure a new connection."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # Connections move between threads through the pool
+            factory=PooledConnection,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size_mb * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    def connect(self, row_factory=sqlite3.Row) -> PooledConnection:
+        """Check out a connection.
+
+        Args:
+            row_factory: Row factory for this checkout (None for plain tuples).
+
+        Returns:
+            Connection owned by the caller until it is closed or used as a
+            context manager.
+        """
+        conn = None
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+        if conn is None:
+            conn = self._open()
+        conn._pool = self
+        conn._checked_out = True
+        conn.row_factory = row_factory
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Take back a checked-out connection."""
+        if not conn._checked_out:
+            return
+        conn._checked_out = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            print(f"⚠️ [DB] Dropping broken connection to {self.db_path}: {e}")
+            conn._close_connection()
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn._close_connection()
+
+    def close_all(self):
+        """Close every idle connection. Checked-out ones close when released."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.max_idle = 0
+        for conn in idle:
+            try:
+                conn._close_connection()
+            except sqlite3.Error:
+                pass
+
+    def info(self) -> Dict:
+        """Get pool occupancy for diagnostics."""
+        with self._lock:
+            return {"db_path": self.db_path, "idle": len(self._idle), "opened": self._opened}
+
+
+def run_migrations(conn: sqlite3.Connection, component: str, migrations) -> int:
+    """Bring one component's schema up to date.
+
+    The applied version is stored per component in ``schema_migrations``, so
+    an up-to-date database costs a single lookup at startup. Each pending
+    migration runs in its own write transaction together with the version
+    bump, so a failed migration leaves the previous version in place.
+
+    Args:
+        conn: Connection to the database.
+        component: Name of the schema owner (e.g. "downloads").
+        migrations: Sequence of (version, description, func(conn)) in
+            increasing version order.
+
+    Returns:
+        Schema version after the run.
+    """
+    def current_version():
+        try:
+            row = conn.execute(
+                "SELECT version FROM schema_migrations WHERE component=?", (component,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return 0  # Table not created yet
+        return row[0] if row else 0
+
+    latest = migrations[-1][0] if migrations else 0
+    version = current_version()
+    if version >= latest:
+        return version
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations(
+            component TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    if conn.in_transaction:
+        conn.commit()
+
+    for target, description, migrate in migrations:
+        # BEGIN IMMEDIATE serializes concurrent starts; re-check once we hold the lock
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = current_version()
+            if target <= version:
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute("""
+                INSERT INTO schema_migrations (component, version) VALUES (?, ?)
+                ON CONFLICT(component) DO UPDATE SET
+                    version = excluded.version,
+                    applied_at = CURRENT_TIMESTAMP
+            """, (component, target))
+            conn.commit()
+            version = target
+            print(f"🗄️ [DB] Migrated {component} schema to v{target}: {description}")
+        except Exception:
+            conn.rollback()
+            raise
+    return version
+
+
+# Create singleton instances
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_query_stats = None
+
+def get_query_stats() -> QueryStats:
+    """Get the query statistics singleton instance."""
+    global _query_stats
+    if _query_stats is None:
+        with _pools_lock:
+            if _query_stats is None:
+                _query_stats = QueryStats(_settings()["db_slow_query_ms"])
+    return _query_stats
+
+
+def get_pool(db_path: Optional[str] = None) -> ConnectionPool:
+    """Get the connection pool of a database file.
+
+    Args:
+        db_path: Path to the database (default: the main application database).
+
+    Returns:
+        The pool shared by every caller using that file.
+    """
+    key = os.path.abspath(str(db_path or APP_DB_PATH))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            settings = _settings()
+            pool = _pools[key] = ConnectionPool(
+                key,
+                max_idle=settings["db_pool_size"],
+                busy_timeout_ms=settings["db_busy_timeout_ms"],
+                cache_size_kb=settings["db_cache_size_kb"],
+                mmap_size_mb=settings["db_mmap_size_mb"],
+            )
+        return pool
+
+
+def get_connection(db_path: Optional[str] = None, row_factory=sqlite3.Row) -> PooledConnection:
+    """Check out a pooled connection.
+
+    Args:
+        db_path: Path to the database (default: the main application database).
+        row_factory: Row factory for this checkout (None for plain tuples).
+
+    Returns:
+        Connection to close (or use in a ``with`` block) when done.
+    """
+    return get_pool(db_path).connect(row_factory)
+
+
+def close_all_pools():
+    """Close the idle connections of every pool (on application shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -16,6 +16,9 @@ import librosa
 import numpy as np
 
 from .config import get_setting, update_setting, get_ffmpeg_path, DOWNLOADS_DIR, ensure_valid_downloads_directory
+from .audio_context import AudioAnalysisContext
+from .chroma import compute_chroma
+from .beat_grid import spectral_flux, autocorrelation_tempo
 
 
 class DownloadType(Enum):
@@ -82,15 +85,22 @@ class DownloadManager:
         # Create downloads directory if it doesn't exist
         os.makedirs(self.downloads_directory, exist_ok=True)
         
-        # Start download worker thread
-        self.worker_thread = threading.Thread(target=self._download_worker, daemon=True)
-        self.worker_thread.start()
+        # Download slots: the worker blocks on this until a download finishes
+        self._slot_condition = threading.Condition()
+        self._slot_holders: set = set()
+        self._stopping = False
+
+        # Worker thread is started on the first download so idle sessions cost nothing
+        self.worker_thread: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
         
         # Callbacks
         self.on_download_progress: Optional[Callable[[str, float, str, str], None]] = None
         self.on_download_complete: Optional[Callable[[str, str, str, Optional["DownloadItem"]], None]] = None
         self.on_download_error: Optional[Callable[[str, str], None]] = None
         self.on_download_start: Optional[Callable[[str], None]] = None
+        # (download_id, video_id, stage, result fields or None, error message or None)
+        self.on_analysis_stage: Optional[Callable[[str, str, str, Optional[Dict[str, Any]], Optional[str]], None]] = None
     
     def add_download(self, item: DownloadItem) -> str:
         """Add a download to the queue.
@@ -101,9 +111,36 @@ class DownloadManager:
         Returns:
             Download ID.
         """
-        self.download_queue.put(item)
         self.queued_downloads[item.download_id] = item
+        self._ensure_worker()
+        self.download_queue.put(item)
         return item.download_id
+
+    def _ensure_worker(self):
+        """Start the worker thread if it is not running yet."""
+        with self._worker_lock:
+            if self.worker_thread is None or not self.worker_thread.is_alive():
+                self._stopping = False
+                self.worker_thread = threading.Thread(target=self._download_worker, daemon=True)
+                self.worker_thread.start()
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop the worker thread.
+
+        Queued downloads are left in the queue; running downloads finish on
+        their own threads.
+
+        Args:
+            timeout: Seconds to wait for the worker to exit (None waits forever).
+        """
+        with self._slot_condition:
+            self._stopping = True
+            self._slot_condition.notify_all()
+        # Wake the worker if it is blocked on an empty queue
+        self.download_queue.put(None)
+        worker = self.worker_thread
+        if worker and worker.is_alive():
+            worker.join(timeout)
     
     def cancel_download(self, download_id: str) -> bool:
         """Cancel a download.
@@ -235,25 +272,35 @@ class DownloadManager:
                 removed = True
         return removed
 
-    def analyze_audio_with_librosa(self, audio_path: str) -> dict:
-        """Analyzes audio file to detect BPM and key (Windows-compatible)."""
+    def analyze_audio_with_librosa(self, audio_path: str, context=None) -> dict:
+        """Analyzes audio file to detect BPM and key (Windows-compatible).
+
+        Args:
+            audio_path: Path to the audio file
+            context: Optional AudioAnalysisContext holding the decoded audio
+        """
         try:
             print(f"🎵 [DOWNLOAD] Audio analysis of: {audio_path}")
 
-            # Load audio with soundfile (avoids DLL issues with librosa/numba)
-            import soundfile as sf
             from scipy import signal
 
-            y, sr = sf.read(audio_path, dtype='float32')
+            if context is not None:
+                # Limit to 60 seconds for performance
+                y, sr = context.mono(max_seconds=60), context.sample_rate
+            else:
+                # Load audio with soundfile (avoids DLL issues with librosa/numba)
+                import soundfile as sf
 
-            # Convert to mono if stereo
-            if len(y.shape) > 1:
-                y = np.mean(y, axis=1)
+                y, sr = sf.read(audio_path, dtype='float32')
 
-            # Limit to 60 seconds for performance
-            max_samples = int(sr * 60)
-            if len(y) > max_samples:
-                y = y[:max_samples]
+                # Convert to mono if stereo
+                if len(y.shape) > 1:
+                    y = np.mean(y, axis=1)
+
+                # Limit to 60 seconds for performance
+                max_samples = int(sr * 60)
+                if len(y) > max_samples:
+                    y = y[:max_samples]
 
             print(f"   📊 [DOWNLOAD] Audio loaded: {len(y)} samples at {sr} Hz")
 
@@ -270,25 +317,12 @@ class DownloadManager:
             magnitude = np.abs(Zxx)
 
             # Compute spectral flux (onset strength)
-            onset_env = np.sum(np.diff(magnitude, axis=1, prepend=0), axis=0)
-            onset_env = np.maximum(0, onset_env)  # Half-wave rectification
-
-            # Autocorrelation to find tempo
-            autocorr = np.correlate(onset_env, onset_env, mode='full')
-            autocorr = autocorr[len(autocorr)//2:]
-
-            # Look for peaks in autocorrelation (60-200 BPM range)
-            min_lag = int(sr / hop_length * 60 / 200)  # 200 BPM
-            max_lag = int(sr / hop_length * 60 / 60)   # 60 BPM
+            onset_env = spectral_flux(magnitude)
 
-            if max_lag < len(autocorr):
-                autocorr_region = autocorr[min_lag:max_lag]
-                peak_lag = np.argmax(autocorr_region) + min_lag
-
-                # Convert lag to BPM
-                tempo_period = peak_lag * hop_length / sr  # seconds per beat
-                detected_tempo = 60.0 / tempo_period if tempo_period > 0 else 120.0
+            # Autocorrelation to find tempo, looking for peaks in the 60-200 BPM range
+            detected_tempo = autocorrelation_tempo(onset_env, sr / hop_length, min_bpm=60, max_bpm=200)
 
+            if detected_tempo is not None:
                 # Fix octave errors: Check if half/double BPM has similar strength
                 # Most music is 80-140 BPM, so prefer this range
                 candidate_tempos = [detected_tempo]
@@ -323,7 +357,7 @@ class DownloadManager:
             print("   🎹 [DOWNLOAD] Key Detection...")
 
             # Compute chroma from STFT (same as chord detector)
-            chroma = self._compute_chroma_from_stft(magnitude, f, sr)
+            chroma = compute_chroma(magnitude, sr, n_fft=n_fft)
 
             # Average chroma over time
             chroma_mean = np.mean(chroma, axis=1)
@@ -367,51 +401,63 @@ class DownloadManager:
                 'confidence': None
             }
 
-    def _compute_chroma_from_stft(self, magnitude, frequencies, sr):
-        """Compute 12-dimensional chroma features from STFT magnitude spectrogram."""
-        n_frames = magnitude.shape[1]
-        chroma = np.zeros((12, n_frames))
+    def _acquire_slot(self, item: DownloadItem) -> bool:
+        """Block until a download slot is free and assign it to the item.
 
-        A4_freq = 440.0
+        Args:
+            item: Download item about to start.
 
-        for i, freq in enumerate(frequencies):
-            if freq > 0:
-                midi_note = 69 + 12 * np.log2(freq / A4_freq)
-                pitch_class = int(round(midi_note)) % 12
-                chroma[pitch_class, :] += magnitude[i, :]
+        Returns:
+            True if a slot was acquired, False if the manager is shutting down.
+        """
+        with self._slot_condition:
+            while len(self._slot_holders) >= self.max_concurrent_downloads and not self._stopping:
+                self._slot_condition.wait()
+            if self._stopping:
+                return False
+            self._slot_holders.add(item.download_id)
+            return True
 
-        # Normalize each frame
-        for j in range(n_frames):
-            if np.sum(chroma[:, j]) > 0:
-                chroma[:, j] /= np.sum(chroma[:, j])
+    def _release_slot(self, item: DownloadItem):
+        """Free the download slot held by an item (safe to call more than once).
+
+        Args:
+            item: Download item that no longer needs its slot.
+        """
+        with self._slot_condition:
+            if item.download_id in self._slot_holders:
+                self._slot_holders.discard(item.download_id)
+                self._slot_condition.notify()
 
-        return chroma
-    
     def _download_worker(self):
         """Worker thread for processing downloads."""
         while True:
-            # Check if we can start a new download
-            if len(self.active_downloads) >= self.max_concurrent_downloads:
-                time.sleep(1)
-                continue
-            
+            # Block until a download is queued (None is the shutdown sentinel)
+            item = self.download_queue.get()
             try:
-                # Get the next download item
-                item = self.download_queue.get(block=False)
+                if item is None or self._stopping:
+                    return
                 
                 # Check if the download was cancelled
                 if item.status == DownloadStatus.CANCELLED:
                     self.failed_downloads[item.download_id] = item
-                    del self.queued_downloads[item.download_id]
-                    self.download_queue.task_done()
+                    self.queued_downloads.pop(item.download_id, None)
                     continue
                 
-                # Start the download
-                self._start_download(item)
+                # Wait for a free slot, then start the download
+                if not self._acquire_slot(item):
+                    return
+                
+                # The item may have been cancelled while waiting for a slot
+                if item.status == DownloadStatus.CANCELLED:
+                    self._release_slot(item)
+                    self.failed_downloads[item.download_id] = item
+                    self.queued_downloads.pop(item.download_id, None)
+                    continue
                 
-            except queue.Empty:
-                # No downloads in the queue
-                time.sleep(1)
+                self._start_download(item)
+            finally:
+                self.download_queue.task_done()
     
     def _start_download(self, item: DownloadItem):
         """Start a download.
@@ -422,7 +468,7 @@ class DownloadManager:
         # Update status
         item.status = DownloadStatus.DOWNLOADING
         self.active_downloads[item.download_id] = item
-        del self.queued_downloads[item.download_id]
+        self.queued_downloads.pop(item.download_id, None)
         
         # Notify download start
         if self.on_download_start:
@@ -454,6 +500,7 @@ class DownloadManager:
             if item.download_id in self.active_downloads:
                 del self.active_downloads[item.download_id]
             self.failed_downloads[item.download_id] = item
+            self._release_slot(item)
 
             # Notify error immediately
             if self.on_download_error:
@@ -515,6 +562,134 @@ class DownloadManager:
         )
         download_thread.start()
     
+    def _start_analysis(self, item: DownloadItem):
+        """Analyze a finished audio download in the background.
+
+        Tempo/key, structure and lyrics run concurrently on the shared analysis
+        pipeline; chords start once tempo/key is known. Each stage's result is
+        saved and reported as soon as it is ready.
+
+        Args:
+            item: The completed audio download
+        """
+        from .analysis_pipeline import AnalysisStage, get_analysis_pipeline
+        from .downloads_db import update_download_analysis_fields
+
+        print(f"🎵 [DOWNLOAD] Starting audio analysis for: {item.title}")
+        # Decode once, every analyzer below reuses the samples
+        audio_context = AudioAnalysisContext(item.file_path)
+
+        def analyze_tempo_key(_inputs):
+            analysis_results = self.analyze_audio_with_librosa(item.file_path, context=audio_context)
+
+            # Store results in item
+            item.detected_bpm = analysis_results.get('bpm')
+            item.detected_key = analysis_results.get('key')
+            item.analysis_confidence = analysis_results.get('confidence')
+
+            print(f"📊 [DOWNLOAD] Analysis complete: BPM={item.detected_bpm}, Key={item.detected_key}")
+            return {
+                'detected_bpm': item.detected_bpm,
+                'detected_key': item.detected_key,
+                'analysis_confidence': item.analysis_confidence
+            }
+
+        def analyze_chords(inputs):
+            from .chord_detector import analyze_audio_file
+            tempo_key = inputs.get('tempo_key') or {}
+            bpm = tempo_key.get('detected_bpm')
+            key = tempo_key.get('detected_key')
+            print(f"🎸 [DOWNLOAD] Starting chord detection for: {item.title} (BPM: {bpm}, Key: {key})")
+
+            # Pass detected BPM and key to chord analyzer for better accuracy
+            chords_data, beat_offset = analyze_audio_file(
+                item.file_path,
+                bpm=bpm,
+                detected_key=key,
+                use_madmom=True,  # Use professional madmom CRF for all genres
+                context=audio_context
+            )
+            if chords_data:
+                print(f"🎸 [DOWNLOAD] Chord detection complete (beat offset: {beat_offset:.3f}s)")
+            else:
+                print(f"⚠️ [DOWNLOAD] No chords detected")
+            return {'chords_data': chords_data, 'beat_offset': beat_offset}
+
+        def analyze_structure(_inputs):
+            # Detect song structure using simple MSAF segmentation
+            from .msaf_structure_detector import detect_song_structure_msaf
+            print(f"🎭 [DOWNLOAD] Starting structure detection with MSAF for: {item.title}")
+
+            structure_data = detect_song_structure_msaf(item.file_path)
+
+            if structure_data:
+                print(f"🎭 [DOWNLOAD] Structure detected: {len(structure_data)} sections")
+                for section in structure_data:
+                    print(f"   - {section['label']}: {section['start']:.1f}s - {section['end']:.1f}s")
+            else:
+                print(f"⚠️ [DOWNLOAD] No detected structure (MSAF)")
+            return {'structure_data': structure_data}
+
+        def analyze_lyrics(_inputs):
+            # Detect lyrics with Whisper (faster-whisper)
+            from .lyrics_detector import detect_song_lyrics
+            print(f"🎤 [DOWNLOAD] Starting lyrics detection for: {item.title}")
+            # Use GPU if available from config
+            from .config import load_config
+            config = load_config()
+            use_gpu = config.get('use_gpu_for_extraction', False)
+
+            # Try to use vocals stem for better transcription quality
+            audio_for_lyrics = item.file_path
+            lyrics_context = audio_context
+            vocals_stem_path = os.path.join(os.path.dirname(item.file_path), "stems", "vocals.mp3")
+
+            if os.path.exists(vocals_stem_path):
+                print(f"🎤 [DOWNLOAD] Using vocal stem for transcription: {vocals_stem_path}")
+                audio_for_lyrics = vocals_stem_path
+                lyrics_context = None
+            else:
+                print(f"🎤 [DOWNLOAD] No vocal stem found, using original audio")
+
+            lyrics_data = detect_song_lyrics(
+                audio_for_lyrics,
+                model_size="large-v3-int8",
+                language=None,  # Auto-detect
+                use_gpu=use_gpu,
+                context=lyrics_context
+            )
+            if lyrics_data:
+                print(f"🎤 [DOWNLOAD] Lyrics detected: {len(lyrics_data)} segments")
+                # Print first few segments for debugging
+                for seg in lyrics_data[:3]:
+                    print(f"   {seg['start']:.1f}s - {seg['end']:.1f}s: {seg['text'][:50]}...")
+            else:
+                print(f"⚠️ [DOWNLOAD] No lyrics detected")
+            return {'lyrics_data': lyrics_data}
+
+        def on_stage_complete(stage, fields, error):
+            if error is None and fields:
+                try:
+                    update_download_analysis_fields(item.video_id, **fields)
+                except Exception as e:
+                    print(f"⚠️ [DOWNLOAD] Error updating database analysis ({stage}): {e}")
+            if self.on_analysis_stage:
+                self.on_analysis_stage(
+                    item.download_id,
+                    item.video_id,
+                    stage,
+                    fields if error is None else None,
+                    str(error) if error else None
+                )
+
+        stages = [
+            AnalysisStage('tempo_key', analyze_tempo_key),
+            AnalysisStage('chords', analyze_chords, depends_on=('tempo_key',)),
+            AnalysisStage('structure', analyze_structure),
+            AnalysisStage('lyrics', analyze_lyrics),
+        ]
+        get_analysis_pipeline().submit(item.title, stages, on_stage_complete=on_stage_complete)
+
     def _download_thread(self, url: str, ydl_opts: Dict[str, Any], item: DownloadItem):
         """Thread for downloading a video.
         
@@ -612,6 +787,9 @@ class DownloadManager:
                         del self.active_downloads[item.download_id]
                     self.completed_downloads[item.download_id] = item
 
+                    # Post-download analysis does not hold a download slot
+                    self._release_slot(item)
+
                     # Notify completion FIRST - this saves download to database
                     if self.on_download_complete:
                         self.on_download_complete(
@@ -621,115 +799,10 @@ class DownloadManager:
                             item
                         )
 
-                    # Wait a moment for database save to complete
-                    time.sleep(0.3)
-
-                    # NOW run analysis - database entry exists for UPDATE
+                    # Analysis runs on the shared pipeline; the download is already complete
+                    # and its database row exists (on_download_complete saved it above)
                     if item.download_type == DownloadType.AUDIO and item.file_path and os.path.exists(item.file_path):
-                        print(f"🎵 [DOWNLOAD] Starting audio analysis for: {item.title}")
-                        analysis_results = self.analyze_audio_with_librosa(item.file_path)
-
-                        # Store results in item
-                        item.detected_bpm = analysis_results.get('bpm')
-                        item.detected_key = analysis_results.get('key')
-                        item.analysis_confidence = analysis_results.get('confidence')
-
-                        print(f"📊 [DOWNLOAD] Analysis complete: BPM={item.detected_bpm}, Key={item.detected_key}")
-
-                        # Detect chords (pass BPM for beat grid alignment)
-                        chords_data = None
-                        beat_offset = 0.0
-                        try:
-                            from .chord_detector import analyze_audio_file
-                            print(f"🎸 [DOWNLOAD] Starting chord detection for: {item.title} (BPM: {item.detected_bpm}, Key: {item.detected_key})")
-                            # Pass detected BPM and key to chord analyzer for better accuracy
-                            chords_data, beat_offset = analyze_audio_file(
-                                item.file_path,
-                                bpm=item.detected_bpm,
-                                detected_key=item.detected_key,
-                                use_madmom=True  # Use professional madmom CRF for all genres
-                            )
-                            if chords_data:
-                                print(f"🎸 [DOWNLOAD] Chord detection complete (beat offset: {beat_offset:.3f}s)")
-                            else:
-                                print(f"⚠️ [DOWNLOAD] No chords detected")
-                        except Exception as e:
-                            print(f"⚠️ [DOWNLOAD] Error chord detection: {e}")
-                            # Fallback if analyze_audio_file returns old format
-                            if isinstance(e, ValueError):
-                                chords_data = None
-                                beat_offset = 0.0
-
-                        # Detect song structure using simple MSAF segmentation
-                        structure_data = None
-                        try:
-                            from .msaf_structure_detector import detect_song_structure_msaf
-                            print(f"🎭 [DOWNLOAD] Starting structure detection with MSAF for: {item.title}")
-
-                            structure_data = detect_song_structure_msaf(item.file_path)
-
-                            if structure_data:
-                                print(f"🎭 [DOWNLOAD] Structure detected: {len(structure_data)} sections")
-                                for section in structure_data:
-                                    print(f"   - {section['label']}: {section['start']:.1f}s - {section['end']:.1f}s")
-                            else:
-                                print(f"⚠️ [DOWNLOAD] No detected structure (MSAF)")
-                        except Exception as e:
-                            print(f"⚠️ [DOWNLOAD] Error MSAF structure: {e}")
-                            structure_data = None
-
-                        # Detect lyrics with Whisper (faster-whisper)
-                        lyrics_data = None
-                        try:
-                            from .lyrics_detector import detect_song_lyrics
-                            print(f"🎤 [DOWNLOAD] Starting lyrics detection for: {item.title}")
-                            # Use GPU if available from config
-                            from .config import load_config
-                            config = load_config()
-                            use_gpu = config.get('use_gpu_for_extraction', False)
-
-                            # Try to use vocals stem for better transcription quality
-                            audio_for_lyrics = item.file_path
-                            vocals_stem_path = os.path.join(os.path.dirname(item.file_path), "stems", "vocals.mp3")
-
-                            if os.path.exists(vocals_stem_path):
-                                print(f"🎤 [DOWNLOAD] Using vocal stem for transcription: {vocals_stem_path}")
-                                audio_for_lyrics = vocals_stem_path
-                            else:
-                                print(f"🎤 [DOWNLOAD] No vocal stem found, using original audio")
-
-                            lyrics_data = detect_song_lyrics(
-                                audio_for_lyrics,
-                                model_size="large-v3-int8",
-                                language=None,  # Auto-detect
-                                use_gpu=use_gpu
-                            )
-                            if lyrics_data:
-                                print(f"🎤 [DOWNLOAD] Lyrics detected: {len(lyrics_data)} segments")
-                                # Print first few segments for debugging
-                                for seg in lyrics_data[:3]:
-                                    print(f"   {seg['start']:.1f}s - {seg['end']:.1f}s: {seg['text'][:50]}...")
-                            else:
-                                print(f"⚠️ [DOWNLOAD] No lyrics detected")
-                        except Exception as e:
-                            print(f"⚠️ [DOWNLOAD] Error lyrics detection: {e}")
-                            lyrics_data = None
-
-                        # Update database with analysis results
-                        try:
-                            from .downloads_db import update_download_analysis
-                            update_download_analysis(
-                                item.video_id,
-                                item.detected_bpm,
-                                item.detected_key,
-                                item.analysis_confidence,
-                                chords_data,
-                                beat_offset,
-                                structure_data,
-                                lyrics_data
-                            )
-                        except Exception as e:
-                            print(f"⚠️ [DOWNLOAD] Error updating database analysis: {e}")
+                        self._start_analysis(item)
                         
                     print(f"Download completed: {item.title}")
                     return
@@ -795,6 +868,10 @@ class DownloadManager:
                     item.download_id,
                     item.error_message
                 )
+
+        finally:
+            # Let the worker start the next queued download
+            self._release_slot(item)
     
     def _convert_to_mp3(self, input_file: str, output_file: str):
         """Convert an audio file to MP3 using FFmpeg.
@@ -995,7 +1072,10 @@ class DownloadManager:
         Args:
             max_downloads: Maximum number of concurrent downloads.
         """
-        self.max_concurrent_downloads = max(1, max_downloads)
+        with self._slot_condition:
+            self.max_concurrent_downloads = max(1, max_downloads)
+            # A larger limit may let a waiting download start right away
+            self._slot_condition.notify_all()
         update_setting("max_concurrent_downloads", self.max_concurrent_downloads)
     
     def set_downloads_directory(self, directory: str) -> bool:
@@ -1,18 +1,57 @@
 """
 Persistent per-user library (table: user_downloads)
 """
+import base64
+import json
 import os
+import re
 import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 
+from .db import get_connection, run_migrations
+from .timeline_codec import decode_timeline, encode_timeline, is_encoded
+
 DB_PATH = Path(__file__).parent.parent / "stemtubes.db"
 APP_ROOT = Path(__file__).parent.parent  # Application root directory
 DOWNLOADS_ROOT = APP_ROOT / "core" / "downloads"
 
+# Columns returned by listings: everything a library row or stem request needs
+_SUMMARY_COLUMNS = """
+    ud.id,
+    ud.user_id,
+    ud.global_download_id,
+    ud.video_id,
+    ud.title,
+    COALESCE(gd.thumbnail, ud.thumbnail) as thumbnail,
+    ud.file_path,
+    ud.media_type,
+    ud.quality,
+    ud.created_at,
+    ud.extracted,
+    ud.extracting,
+    ud.extracted_at,
+    ud.extraction_model,
+    ud.stems_paths,
+    ud.stems_zip_path,
+    COALESCE(gd.detected_bpm, ud.detected_bpm) as detected_bpm,
+    COALESCE(gd.detected_key, ud.detected_key) as detected_key,
+    COALESCE(gd.analysis_confidence, ud.analysis_confidence) as analysis_confidence,
+    COALESCE(gd.beat_offset, ud.beat_offset) as beat_offset"""
+
+# Large analysis payloads, only loaded for the track being opened
+_ANALYSIS_PAYLOAD_COLUMNS = """,
+    COALESCE(gd.chords_data, ud.chords_data) as chords_data,
+    COALESCE(gd.structure_data, ud.structure_data) as structure_data,
+    COALESCE(gd.lyrics_data, ud.lyrics_data) as lyrics_data"""
+
+# Analysis timelines stored in compact form (see core/timeline_codec.py)
+_TIMELINE_COLUMNS = ("chords_data", "structure_data", "lyrics_data")
+
 def _conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_connection(DB_PATH)
 
 def resolve_file_path(stored_path):
     """
@@ -62,14 +101,22 @@ def resolve_file_path(stored_path):
     # Return the original path if nothing worked (will fail later with clear error)
     return path_str
 
+@lru_cache(maxsize=2048)
+def _resolve_stems_paths(stems_paths_json):
+    """Resolve every path of a stems_paths JSON string (memoized per stored string)."""
+    try:
+        stems_dict = json.loads(stems_paths_json)
+        resolved_stems = {k: resolve_file_path(v) for k, v in stems_dict.items()}
+        return json.dumps(resolved_stems)
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return stems_paths_json  # Leave as-is if not valid JSON
+
 def _resolve_paths_in_record(record):
     """
     Helper function to resolve file paths in a database record dictionary.
 
     Modifies the record in-place to replace stored paths with resolved paths.
     """
-    import json
-
     if not record:
         return record
 
@@ -82,67 +129,277 @@ def _resolve_paths_in_record(record):
 
     # Resolve individual stem paths in JSON
     if record.get('stems_paths'):
-        try:
-            stems_dict = json.loads(record['stems_paths'])
-            resolved_stems = {k: resolve_file_path(v) for k, v in stems_dict.items()}
-            record['stems_paths'] = json.dumps(resolved_stems)
-        except (json.JSONDecodeError, TypeError):
-            pass  # Leave as-is if not valid JSON
+        record['stems_paths'] = _resolve_stems_paths(record['stems_paths'])
+
+    return _decode_timelines(record)
 
+def _decode_timelines(record):
+    """Turn the stored timeline columns of a record back into JSON text (in-place)."""
+    if record:
+        for column in _TIMELINE_COLUMNS:
+            if column in record:
+                record[column] = decode_timeline(record[column])
     return record
 
 def init_table():
-    """Create the downloads tables if they don't exist."""
+    """Create the downloads tables and bring their schema up to date."""
     with _conn() as conn:
-        # Global downloads table - tracks actual files on disk
+        run_migrations(conn, "downloads", _MIGRATIONS)
+
+def _create_base_tables(conn):
+    """Migration 1: base tables, plus the columns older installs lack."""
+    # Global downloads table - tracks actual files on disk
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS global_downloads(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            title TEXT,
+            thumbnail TEXT,
+            file_path TEXT,
+            media_type TEXT,
+            quality TEXT,
+            file_size INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            extracted BOOLEAN DEFAULT 0,
+            extraction_model TEXT,
+            stems_paths TEXT,
+            stems_zip_path TEXT,
+            extracted_at TIMESTAMP,
+            extracting BOOLEAN DEFAULT 0,
+            UNIQUE(video_id, media_type, quality)
+        )
+    """)
+    
+    # User downloads table - tracks which users have access to which files  
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_downloads(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            global_download_id INTEGER NOT NULL,
+            video_id TEXT NOT NULL,
+            title TEXT,
+            thumbnail TEXT,
+            file_path TEXT,
+            media_type TEXT,
+            quality TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            extracted BOOLEAN DEFAULT 0,
+            extraction_model TEXT,
+            stems_paths TEXT,
+            stems_zip_path TEXT,
+            extracted_at TIMESTAMP,
+            extracting BOOLEAN DEFAULT 0,
+            FOREIGN KEY (global_download_id) REFERENCES global_downloads(id),
+            UNIQUE(user_id, video_id, media_type)
+        )
+    """)
+    
+    # Add extraction fields to existing tables if they don't exist
+    _add_extraction_fields_if_missing(conn)
+
+def _create_extraction_aliases(conn):
+    """Migration 2: identifier forms (video_id, file name) accepted for an extraction_id."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS extraction_aliases(
+            alias TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            global_download_id INTEGER NOT NULL,
+            PRIMARY KEY (alias, global_download_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_extraction_aliases_global
+        ON extraction_aliases(global_download_id)
+    """)
+    missing = conn.execute("""
+        SELECT id FROM global_downloads
+        WHERE id NOT IN (SELECT global_download_id FROM extraction_aliases)
+    """).fetchall()
+    for row in missing:
+        _sync_extraction_aliases(conn, row[0])
+
+def _create_lookup_indexes(conn):
+    """Migration 3: secondary indexes for the listing, extraction and cleanup queries."""
+    statements = [
+        # list_for: WHERE user_id=? ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_user_downloads_user_created ON user_downloads(user_id, created_at)",
+        # list_extractions_for: WHERE user_id=? AND extracted=1 ORDER BY extracted_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_user_downloads_user_extracted ON user_downloads(user_id, extracted, extracted_at)",
+        # Library JOIN and per-global updates/deletes
+        "CREATE INDEX IF NOT EXISTS idx_user_downloads_global ON user_downloads(global_download_id)",
+        # Analysis and extraction updates fan out by video_id
+        "CREATE INDEX IF NOT EXISTS idx_user_downloads_video ON user_downloads(video_id)",
+        # find_global_extraction / find_or_reserve_extraction
+        "CREATE INDEX IF NOT EXISTS idx_global_downloads_video_extraction ON global_downloads(video_id, extracted, extraction_model)",
+        # Stuck extraction cleanup only ever looks at the few rows in progress
+        "CREATE INDEX IF NOT EXISTS idx_global_downloads_extracting ON global_downloads(extracting) WHERE extracting=1",
+    ]
+    for statement in statements:
+        conn.execute(statement)
+    conn.execute("ANALYZE")
+
+# Plain text of a lyrics_data JSON array (the "text" of every segment)
+_LYRICS_TEXT_SQL = """(
+    SELECT group_concat(json_extract(seg.value, '$.text'), ' ')
+    FROM json_each(CASE WHEN json_valid({col}) THEN {col} ELSE '[]' END) AS seg
+    WHERE seg.type = 'object'
+)"""
+
+def _create_library_search(conn):
+    """Migration 4: full-text index over title, video_id and lyrics, kept in sync by triggers."""
+    try:
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS global_downloads(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                video_id TEXT NOT NULL,
-                title TEXT,
-                thumbnail TEXT,
-                file_path TEXT,
-                media_type TEXT,
-                quality TEXT,
-                file_size INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                extracted BOOLEAN DEFAULT 0,
-                extraction_model TEXT,
-                stems_paths TEXT,
-                stems_zip_path TEXT,
-                extracted_at TIMESTAMP,
-                extracting BOOLEAN DEFAULT 0,
-                UNIQUE(video_id, media_type, quality)
+            CREATE VIRTUAL TABLE IF NOT EXISTS library_fts USING fts5(
+                title, video_id, lyrics,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
             )
         """)
-        
-        # User downloads table - tracks which users have access to which files  
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: library search keeps using LIKE
+        print(f"⚠️ [DB] Full-text search unavailable, library search will use LIKE: {e}")
+        return
+
+    new_lyrics = _LYRICS_TEXT_SQL.format(col="NEW.lyrics_data")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS global_downloads_fts_insert
+        AFTER INSERT ON global_downloads BEGIN
+            INSERT INTO library_fts (rowid, title, video_id, lyrics)
+            VALUES (NEW.id, NEW.title, NEW.video_id, {new_lyrics});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS global_downloads_fts_update
+        AFTER UPDATE OF title, video_id, lyrics_data ON global_downloads BEGIN
+            DELETE FROM library_fts WHERE rowid = OLD.id;
+            INSERT INTO library_fts (rowid, title, video_id, lyrics)
+            VALUES (NEW.id, NEW.title, NEW.video_id, {new_lyrics});
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS global_downloads_fts_delete
+        AFTER DELETE ON global_downloads BEGIN
+            DELETE FROM library_fts WHERE rowid = OLD.id;
+        END
+    """)
+
+    conn.execute("DELETE FROM library_fts")
+    conn.execute(f"""
+        INSERT INTO library_fts (rowid, title, video_id, lyrics)
+        SELECT id, title, video_id, {_LYRICS_TEXT_SQL.format(col="lyrics_data")}
+        FROM global_downloads
+    """)
+
+def _create_library_order_index(conn):
+    """Migration 5: newest-first order of the shared library (keyset pagination)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_global_downloads_created ON global_downloads(created_at)")
+
+def _compact_timelines(conn):
+    """Migration 6: store chords, structure and lyrics timelines in compact form."""
+    if _has_library_fts(conn):
+        # Triggers cannot read encoded lyrics: title changes no longer rebuild
+        # the lyrics column, and encoded lyrics are indexed by _index_lyrics()
+        conn.execute("DROP TRIGGER IF EXISTS global_downloads_fts_update")
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS user_downloads(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                global_download_id INTEGER NOT NULL,
-                video_id TEXT NOT NULL,
-                title TEXT,
-                thumbnail TEXT,
-                file_path TEXT,
-                media_type TEXT,
-                quality TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                extracted BOOLEAN DEFAULT 0,
-                extraction_model TEXT,
-                stems_paths TEXT,
-                stems_zip_path TEXT,
-                extracted_at TIMESTAMP,
-                extracting BOOLEAN DEFAULT 0,
-                FOREIGN KEY (global_download_id) REFERENCES global_downloads(id),
-                UNIQUE(user_id, video_id, media_type)
-            )
+            CREATE TRIGGER IF NOT EXISTS global_downloads_fts_title
+            AFTER UPDATE OF title, video_id ON global_downloads BEGIN
+                UPDATE library_fts SET title = NEW.title, video_id = NEW.video_id
+                WHERE rowid = NEW.id;
+            END
         """)
-        conn.commit()
-        
-        # Add extraction fields to existing tables if they don't exist
-        _add_extraction_fields_if_missing(conn)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS global_downloads_fts_lyrics
+            AFTER UPDATE OF lyrics_data ON global_downloads
+            WHEN typeof(NEW.lyrics_data) != 'blob' BEGIN
+                UPDATE library_fts SET lyrics = {_LYRICS_TEXT_SQL.format(col="NEW.lyrics_data")}
+                WHERE rowid = NEW.id;
+            END
+        """)
+
+    saved = 0
+    for table in ("global_downloads", "user_downloads"):
+        ids = [row[0] for row in conn.execute(f"""
+            SELECT id FROM {table}
+            WHERE typeof(chords_data)='text' OR typeof(structure_data)='text' OR typeof(lyrics_data)='text'
+        """)]
+        for start in range(0, len(ids), 100):
+            chunk = ids[start:start + 100]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(f"""
+                SELECT id, chords_data, structure_data, lyrics_data FROM {table}
+                WHERE id IN ({placeholders})
+            """, chunk).fetchall()
+            for row in rows:
+                values = []
+                for column in _TIMELINE_COLUMNS:
+                    stored = row[column]
+                    if isinstance(stored, str):
+                        encoded = encode_timeline(stored)
+                        saved += len(stored.encode("utf-8")) - len(encoded or b"")
+                        stored = encoded
+                    values.append(stored)
+                conn.execute(
+                    f"UPDATE {table} SET chords_data=?, structure_data=?, lyrics_data=? WHERE id=?",
+                    values + [row["id"]],
+                )
+    print(f"🗄️ [DB] Compacted analysis timelines ({saved // 1024} KB saved, run VACUUM to shrink the file)")
+
+def _backfill_file_sizes(conn):
+    """Migration 7: store the size of downloads recorded without one.
+
+    New downloads get their size when they complete (add_or_update), so the
+    library listing never has to stat files. Files missing on disk keep a
+    NULL size.
+    """
+    rows = conn.execute("""
+        SELECT id, file_path FROM global_downloads
+        WHERE COALESCE(file_size, 0) = 0 AND file_path IS NOT NULL AND file_path != ''
+    """).fetchall()
+    filled = 0
+    for row in rows:
+        try:
+            size = os.path.getsize(resolve_file_path(row["file_path"]))
+        except (OSError, TypeError):
+            continue
+        conn.execute("UPDATE global_downloads SET file_size=? WHERE id=?", (size, row["id"]))
+        filled += 1
+    print(f"🗄️ [DB] Stored file sizes of {filled}/{len(rows)} downloads")
+
+def _lyrics_text(lyrics_data):
+    """Plain text of a lyrics timeline (same as _LYRICS_TEXT_SQL)."""
+    if isinstance(lyrics_data, str):
+        try:
+            lyrics_data = json.loads(lyrics_data)
+        except ValueError:
+            return None
+    if not isinstance(lyrics_data, list):
+        return None
+    parts = [str(seg["text"]) for seg in lyrics_data if isinstance(seg, dict) and seg.get("text") is not None]
+    return " ".join(parts) if parts else None
+
+def _index_lyrics(conn, video_id, lyrics_data, stored):
+    """Refresh the full-text lyrics of a video after writing encoded lyrics.
+
+    Plain-text lyrics are indexed by the global_downloads_fts_lyrics trigger;
+    encoded ones are indexed here, inside the caller's transaction.
+    """
+    if not is_encoded(stored) or not _has_library_fts(conn):
+        return
+    conn.execute("""
+        UPDATE library_fts SET lyrics=?
+        WHERE rowid IN (SELECT id FROM global_downloads WHERE video_id=?)
+    """, (_lyrics_text(lyrics_data), video_id))
+
+# Schema versions of the downloads tables, applied in order by init_table()
+_MIGRATIONS = [
+    (1, "base tables and extraction/analysis columns", _create_base_tables),
+    (2, "extraction alias table", _create_extraction_aliases),
+    (3, "secondary lookup indexes", _create_lookup_indexes),
+    (4, "library full-text search", _create_library_search),
+    (5, "library keyset pagination index", _create_library_order_index),
+    (6, "compact analysis timelines", _compact_timelines),
+    (7, "file sizes of older downloads", _backfill_file_sizes),
+]
 
 def _add_extraction_fields_if_missing(conn):
     """Add extraction fields to existing tables if they don't exist."""
@@ -180,8 +437,6 @@ def _add_extraction_fields_if_missing(conn):
                     print(f"Added column {field_name} to {table_name}")
                 except Exception as e:
                     print(f"Error adding column {field_name} to {table_name}: {e}")
-        
-        conn.commit()
 
 def add_or_update(user_id, meta):
     """Insert or update a download record for a user."""
@@ -207,6 +462,12 @@ def add_or_update(user_id, meta):
         if global_download:
             # File already exists globally - just add user access
             global_download_id = global_download[0]
+            if meta.get("file_size"):
+                # Record the size if the first download did not
+                conn.execute("""
+                    UPDATE global_downloads SET file_size=?
+                    WHERE id=? AND COALESCE(file_size, 0) = 0
+                """, (meta["file_size"], global_download_id))
         else:
             # File doesn't exist - create global record
             cursor.execute("""
@@ -223,6 +484,7 @@ def add_or_update(user_id, meta):
                 meta.get("file_size", 0)
             ))
             global_download_id = cursor.lastrowid
+            _sync_extraction_aliases(conn, global_download_id)
         
         # Add/update user access record
         conn.execute("""
@@ -255,17 +517,18 @@ def update_download_analysis(video_id, detected_bpm, detected_key, analysis_conf
     with _conn() as conn:
         print(f"[DB DEBUG] Updating analysis for video_id='{video_id}': BPM={detected_bpm}, Key={detected_key}, Chords={bool(chords_data)}, BeatOffset={beat_offset:.3f}s, Structure={bool(structure_data)}, Lyrics={bool(lyrics_data)}")
 
-        # Convert structure_data and lyrics_data to JSON if necessary
-        import json
-        structure_json = json.dumps(structure_data) if structure_data else None
-        lyrics_json = json.dumps(lyrics_data) if lyrics_data else None
+        # Store the timelines in compact form
+        chords_stored = encode_timeline(chords_data)
+        structure_stored = encode_timeline(structure_data)
+        lyrics_stored = encode_timeline(lyrics_data)
 
         # Update global_downloads table
         cursor = conn.execute("""
             UPDATE global_downloads
             SET detected_bpm=?, detected_key=?, analysis_confidence=?, chords_data=?, beat_offset=?, structure_data=?, lyrics_data=?
             WHERE video_id=?
-        """, (detected_bpm, detected_key, analysis_confidence, chords_data, beat_offset, structure_json, lyrics_json, video_id))
+        """, (detected_bpm, detected_key, analysis_confidence, chords_stored, beat_offset, structure_stored, lyrics_stored, video_id))
+        _index_lyrics(conn, video_id, lyrics_data, lyrics_stored)
 
         rows_updated = cursor.rowcount
         print(f"[DB DEBUG] Updated {rows_updated} rows in global_downloads")
@@ -275,7 +538,7 @@ def update_download_analysis(video_id, detected_bpm, detected_key, analysis_conf
             UPDATE user_downloads
             SET detected_bpm=?, detected_key=?, analysis_confidence=?, chords_data=?, beat_offset=?, structure_data=?, lyrics_data=?
             WHERE video_id=?
-        """, (detected_bpm, detected_key, analysis_confidence, chords_data, beat_offset, structure_json, lyrics_json, video_id))
+        """, (detected_bpm, detected_key, analysis_confidence, chords_stored, beat_offset, structure_stored, lyrics_stored, video_id))
 
         rows_updated2 = cursor2.rowcount
         print(f"[DB DEBUG] Updated {rows_updated2} rows in user_downloads")
@@ -287,21 +550,66 @@ def update_download_analysis(video_id, detected_bpm, detected_key, analysis_conf
         else:
             print(f"[DB DEBUG] Analysis updated successfully for video_id='{video_id}'")
 
+# Columns a single analysis stage may write on its own
+ANALYSIS_COLUMNS = (
+    "detected_bpm", "detected_key", "analysis_confidence",
+    "chords_data", "beat_offset", "structure_data", "lyrics_data",
+)
+
+def update_download_analysis_fields(video_id, **fields):
+    """Update only the given analysis columns for a download.
+
+    Used by the analysis pipeline to store each stage's result as soon as it
+    is ready, without overwriting the columns of stages still running.
+
+    Args:
+        video_id: Video ID of the download
+        **fields: Column values (see ANALYSIS_COLUMNS); chords_data,
+            structure_data and lyrics_data (JSON strings or Python values)
+            are stored in compact form
+    """
+    unknown = set(fields) - set(ANALYSIS_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown analysis columns: {sorted(unknown)}")
+    if not fields:
+        return
+
+    values = dict(fields)
+    for column in _TIMELINE_COLUMNS:
+        if column in values:
+            values[column] = encode_timeline(values[column])
+
+    columns = list(values)
+    assignments = ", ".join(f"{column}=?" for column in columns)
+    params = [values[column] for column in columns] + [video_id]
+
+    with _conn() as conn:
+        cursor = conn.execute(f"UPDATE global_downloads SET {assignments} WHERE video_id=?", params)
+        if "lyrics_data" in values:
+            _index_lyrics(conn, video_id, fields["lyrics_data"], values["lyrics_data"])
+        conn.execute(f"UPDATE user_downloads SET {assignments} WHERE video_id=?", params)
+        conn.commit()
+
+        if cursor.rowcount == 0:
+            print(f"[DB DEBUG] WARNING: No rows updated! Video_id '{video_id}' not found in global_downloads")
+        else:
+            print(f"[DB DEBUG] Updated {', '.join(columns)} for video_id='{video_id}'")
+
 def update_download_lyrics(video_id, lyrics_data):
     """Update lyrics data for a download."""
-    import json
     with _conn() as conn:
         print(f"[LYRICS] Saving lyrics data for video_id='{video_id}': {len(lyrics_data)} segments")
 
-        # Convert to JSON string
-        lyrics_json = json.dumps(lyrics_data) if lyrics_data else None
+        # Store in compact form
+        lyrics_stored = encode_timeline(lyrics_data)
 
         # Update global_downloads
         cursor = conn.execute("""
             UPDATE global_downloads
             SET lyrics_data=?
             WHERE video_id=?
-        """, (lyrics_json, video_id))
+        """, (lyrics_stored, video_id))
+        _index_lyrics(conn, video_id, lyrics_data, lyrics_stored)
 
         rows_updated = cursor.rowcount
         print(f"[LYRICS] Updated {rows_updated} rows in global_downloads")
@@ -311,7 +619,7 @@ def update_download_lyrics(video_id, lyrics_data):
             UPDATE user_downloads
             SET lyrics_data=?
             WHERE video_id=?
-        """, (lyrics_json, video_id))
+        """, (lyrics_stored, video_id))
 
         rows_updated2 = cursor2.rowcount
         print(f"[LYRICS] Updated {rows_updated2} rows in user_downloads")
@@ -325,12 +633,11 @@ def update_download_lyrics(video_id, lyrics_data):
 
 def update_download_structure(video_id, structure_data):
     """Update LLM-analyzed structure data for a download."""
-    import json
     with _conn() as conn:
         print(f"[STRUCTURE] Saving structure data for video_id='{video_id}'")
 
-        # Convert to JSON string
-        structure_json = json.dumps(structure_data) if structure_data else None
+        # Store in compact form
+        structure_json = encode_timeline(structure_data)
 
         # Update global_downloads
         cursor = conn.execute("""
@@ -368,7 +675,7 @@ def find_global_download(video_id, media_type, quality):
             WHERE video_id=? AND media_type=? AND quality=?
         """, (video_id, media_type, quality))
         result = cursor.fetchone()
-        return dict(result) if result else None
+        return _decode_timelines(dict(result)) if result else None
 
 def add_user_access(user_id, global_download):
     """Give a user access to an existing global download."""
@@ -391,33 +698,14 @@ def add_user_access(user_id, global_download):
         conn.commit()
 
 def list_for(user_id):
-    """Return all downloads for a given user, newest first."""
+    """Return all downloads for a given user, newest first.
+
+    Rows carry the summary columns only; fetch the analysis payloads of a single
+    track with get_download_by_id().
+    """
     with _conn() as conn:
-        cur = conn.execute("""
-            SELECT
-                ud.id,
-                ud.user_id,
-                ud.global_download_id,
-                ud.video_id,
-                ud.title,
-                COALESCE(gd.thumbnail, ud.thumbnail) as thumbnail,
-                ud.file_path,
-                ud.media_type,
-                ud.quality,
-                ud.created_at,
-                ud.extracted,
-                ud.extracting,
-                ud.extracted_at,
-                ud.extraction_model,
-                ud.stems_paths,
-                ud.stems_zip_path,
-                COALESCE(gd.detected_bpm, ud.detected_bpm) as detected_bpm,
-                COALESCE(gd.detected_key, ud.detected_key) as detected_key,
-                COALESCE(gd.analysis_confidence, ud.analysis_confidence) as analysis_confidence,
-                COALESCE(gd.chords_data, ud.chords_data) as chords_data,
-                COALESCE(gd.beat_offset, ud.beat_offset) as beat_offset,
-                COALESCE(gd.structure_data, ud.structure_data) as structure_data,
-                COALESCE(gd.lyrics_data, ud.lyrics_data) as lyrics_data
+        cur = conn.execute(f"""
+            SELECT {_SUMMARY_COLUMNS}
             FROM user_downloads ud
             LEFT JOIN global_downloads gd ON ud.global_download_id = gd.id
             WHERE ud.user_id=?
@@ -425,34 +713,80 @@ def list_for(user_id):
         """, (user_id,))
         return [_resolve_paths_in_record(dict(row)) for row in cur.fetchall()]
 
-def get_download_by_id(user_id, download_id):
-    """Get a specific download by ID for a user."""
+def list_downloads_page(user_id, limit, cursor=None, media_type=None, extracted=None,
+                        exclude_video_ids=()):
+    """Return one page of a user's downloads that still have a file, newest first.
+
+    Args:
+        user_id: Owner of the downloads.
+        limit: Page size (capped at MAX_PAGE_SIZE).
+        cursor: next_cursor of the previous page.
+        media_type: Only this media type ('audio' or 'video').
+        extracted: Only extracted (True) or not extracted (False) downloads.
+        exclude_video_ids: Videos left out of the page and the count (e.g.
+            the ones the caller lists from the live session).
+
+    Returns:
+        (rows, next_cursor, total_count). Rows carry the summary columns;
+        next_cursor is None on the last page; total_count is only computed
+        for the first page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    # Removed downloads keep their row (and extraction) with an empty file_path
+    conditions = ["ud.user_id=?", "ud.file_path != ''"]
+    params = [user_id]
+    exclude_video_ids = list(exclude_video_ids)
+    if exclude_video_ids:
+        conditions.append(f"ud.video_id NOT IN ({','.join('?' * len(exclude_video_ids))})")
+        params.extend(exclude_video_ids)
+    if media_type:
+        conditions.append("ud.media_type=?")
+        params.append(media_type)
+    if extracted is not None:
+        conditions.append("ud.extracted=?" if extracted else "COALESCE(ud.extracted, 0)=?")
+        params.append(1 if extracted else 0)
+
+    page_size = _page_size(limit)
+    total = None
     with _conn() as conn:
-        cur = conn.execute("""
-            SELECT
-                ud.id,
-                ud.user_id,
-                ud.global_download_id,
-                ud.video_id,
-                ud.title,
-                COALESCE(gd.thumbnail, ud.thumbnail) as thumbnail,
-                ud.file_path,
-                ud.media_type,
-                ud.quality,
-                ud.created_at,
-                ud.extracted,
-                ud.extracting,
-                ud.extracted_at,
-                ud.extraction_model,
-                ud.stems_paths,
-                ud.stems_zip_path,
-                COALESCE(gd.detected_bpm, ud.detected_bpm) as detected_bpm,
-                COALESCE(gd.detected_key, ud.detected_key) as detected_key,
-                COALESCE(gd.analysis_confidence, ud.analysis_confidence) as analysis_confidence,
-                COALESCE(gd.chords_data, ud.chords_data) as chords_data,
-                COALESCE(gd.beat_offset, ud.beat_offset) as beat_offset,
-                COALESCE(gd.structure_data, ud.structure_data) as structure_data,
-                COALESCE(gd.lyrics_data, ud.lyrics_data) as lyrics_data
+        if cursor is None:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM user_downloads ud WHERE {' AND '.join(conditions)}", params
+            ).fetchone()[0]
+        else:
+            conditions.append("(ud.created_at, ud.id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        cur = conn.execute(f"""
+            SELECT {_SUMMARY_COLUMNS}
+            FROM user_downloads ud
+            LEFT JOIN global_downloads gd ON ud.global_download_id = gd.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY ud.created_at DESC, ud.id DESC
+            LIMIT ?
+        """, params + [page_size + 1])
+        rows = [_resolve_paths_in_record(dict(row)) for row in cur.fetchall()]
+
+    rows, next_cursor = _split_page(rows, page_size, lambda row: (row['created_at'], row['id']))
+    return rows, next_cursor, total
+
+def get_download_by_id(user_id, download_id, include_analysis=True):
+    """Get a specific download by ID for a user.
+
+    Args:
+        user_id: Owner of the download.
+        download_id: user_downloads.id of the download.
+        include_analysis: Also load chords_data, structure_data and lyrics_data.
+
+    Returns:
+        Download record dict, or None if the user has no such download.
+    """
+    columns = _SUMMARY_COLUMNS + (_ANALYSIS_PAYLOAD_COLUMNS if include_analysis else "")
+    with _conn() as conn:
+        cur = conn.execute(f"""
+            SELECT {columns}
             FROM user_downloads ud
             LEFT JOIN global_downloads gd ON ud.global_download_id = gd.id
             WHERE ud.user_id=? AND ud.id=?
@@ -506,7 +840,7 @@ def find_global_extraction(video_id, model_name):
             cursor.execute("SELECT id, video_id, extracted, extraction_model FROM global_downloads WHERE video_id=?", (video_id,))
             debug_results = cursor.fetchall()
             print(f"[DB DEBUG] All records for video_id '{video_id}': {[(r[0], r[1], r[2], r[3]) for r in debug_results]}")
-        return dict(result) if result else None
+        return _decode_timelines(dict(result)) if result else None
 
 def find_any_global_extraction(video_id):
     """Check if ANY extraction exists for a video_id, regardless of model.
@@ -527,7 +861,7 @@ def find_any_global_extraction(video_id):
             print(f"[DB DEBUG] Found extraction: id={result[0]}, model={result['extraction_model']}")
         else:
             print(f"[DB DEBUG] No extraction found for video_id='{video_id}'")
-        return dict(result) if result else None
+        return _decode_timelines(dict(result)) if result else None
 
 def find_or_reserve_extraction(video_id, model_name):
     """Atomically check for existing extraction or reserve it for processing.
@@ -556,7 +890,7 @@ def find_or_reserve_extraction(video_id, model_name):
             if existing:
                 print(f"[DB DEBUG] Found existing completed extraction")
                 conn.commit()
-                return dict(existing), False
+                return _decode_timelines(dict(existing)), False
             
             # Check for in-progress extraction
             cursor.execute("""
@@ -600,7 +934,7 @@ def find_global_extraction_in_progress(video_id, model_name):
             WHERE video_id=? AND extracting=1 AND extraction_model=?
         """, (video_id, model_name))
         result = cursor.fetchone()
-        return dict(result) if result else None
+        return _decode_timelines(dict(result)) if result else None
 
 def set_extraction_in_progress(video_id, model_name):
     """Mark an extraction as in progress."""
@@ -749,6 +1083,99 @@ def add_user_extraction_access(user_id, global_download):
             ))
         conn.commit()
 
+def complete_extraction(video_id, user_id, result):
+    """Persist a finished extraction and the requesting user's access in one transaction.
+
+    Combines mark_extraction_complete() and add_user_extraction_access(): the
+    global rows, every user's copy and the requester's record are written
+    under a single write lock, so readers see either the old state or the
+    finished extraction, never a mix. Needs SQLite 3.35+ (RETURNING).
+
+    Args:
+        video_id: Extracted video.
+        user_id: User who requested the extraction.
+        result: Dict with model_name, stems_paths and optional zip_path.
+
+    Returns:
+        Dict with global_download_id and download_id (the user's
+        user_downloads.id), or None if the video has no global download.
+    """
+    stems_paths = json.dumps(result.get("stems_paths") or {})
+    zip_path = result.get("zip_path") or ""
+    model_name = result["model_name"]
+
+    with _conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = conn.execute("""
+                UPDATE global_downloads
+                SET extracted=1,
+                    extracting=0,
+                    extraction_model=?,
+                    stems_paths=?,
+                    stems_zip_path=?,
+                    extracted_at=CURRENT_TIMESTAMP
+                WHERE video_id=?
+                RETURNING id, title, thumbnail, extracted_at
+            """, (model_name, stems_paths, zip_path, video_id)).fetchall()
+            if not updated:
+                conn.rollback()
+                print(f"[DB DEBUG] WARNING: No global download found for video_id='{video_id}'")
+                return None
+            global_download = min(updated, key=lambda row: row['id'])
+
+            # Every user holding this video gets the stems
+            conn.execute("""
+                UPDATE user_downloads
+                SET extracted=1,
+                    extracting=0,
+                    extraction_model=?,
+                    stems_paths=?,
+                    stems_zip_path=?,
+                    extracted_at=?
+                WHERE video_id=?
+            """, (model_name, stems_paths, zip_path, global_download['extracted_at'], video_id))
+
+            # The requester keeps a single record (newest one), created if missing
+            records = conn.execute("""
+                SELECT id FROM user_downloads
+                WHERE user_id=? AND video_id=?
+                ORDER BY created_at DESC
+            """, (user_id, video_id)).fetchall()
+            if records:
+                download_id = records[0]['id']
+                duplicate_ids = [record['id'] for record in records[1:]]
+                if duplicate_ids:
+                    print(f"[DB DEBUG] Cleaning up {len(duplicate_ids)} duplicate records: {duplicate_ids}")
+                    conn.executemany("DELETE FROM user_downloads WHERE id=?", [(dup_id,) for dup_id in duplicate_ids])
+            else:
+                download_id = conn.execute("""
+                    INSERT INTO user_downloads
+                        (user_id, global_download_id, video_id, title, thumbnail, file_path, media_type, quality,
+                         extracted, extraction_model, stems_paths, stems_zip_path, extracted_at)
+                    VALUES (?, ?, ?, ?, ?, NULL, NULL, NULL, 1, ?, ?, ?, ?)
+                    RETURNING id
+                """, (
+                    user_id,
+                    global_download['id'],
+                    video_id,
+                    global_download['title'],
+                    global_download['thumbnail'],
+                    model_name,
+                    stems_paths,
+                    zip_path,
+                    global_download['extracted_at'],
+                )).fetchone()[0]
+
+            conn.commit()
+        except Exception as e:
+            print(f"[DB DEBUG] Error completing extraction: {e}")
+            conn.rollback()
+            raise
+
+    print(f"[DB DEBUG] Extraction complete for video_id='{video_id}': global_id={global_download['id']}, download_id={download_id}")
+    return {'global_download_id': global_download['id'], 'download_id': download_id}
+
 def set_user_extraction_in_progress(user_id, video_id, model_name):
     """Mark an extraction as in progress for a specific user."""
     with _conn() as conn:
@@ -760,33 +1187,14 @@ def set_user_extraction_in_progress(user_id, video_id, model_name):
         conn.commit()
 
 def list_extractions_for(user_id):
-    """Return all downloads with extractions for a given user, newest first."""
+    """Return all downloads with extractions for a given user, newest first.
+
+    Rows carry the summary columns only; fetch the analysis payloads of a single
+    track with get_download_by_id().
+    """
     with _conn() as conn:
-        cur = conn.execute("""
-            SELECT
-                ud.id,
-                ud.user_id,
-                ud.video_id,
-                ud.title,
-                ud.file_path,
-                ud.media_type,
-                ud.quality,
-                COALESCE(gd.thumbnail, ud.thumbnail) as thumbnail,
-                ud.created_at,
-                ud.extracted,
-                ud.extracting,
-                ud.extracted_at,
-                ud.extraction_model,
-                ud.stems_paths,
-                ud.stems_zip_path,
-                ud.global_download_id,
-                COALESCE(gd.detected_bpm, ud.detected_bpm) as detected_bpm,
-                COALESCE(gd.detected_key, ud.detected_key) as detected_key,
-                COALESCE(gd.analysis_confidence, ud.analysis_confidence) as analysis_confidence,
-                COALESCE(gd.chords_data, ud.chords_data) as chords_data,
-                COALESCE(gd.beat_offset, ud.beat_offset) as beat_offset,
-                COALESCE(gd.structure_data, ud.structure_data) as structure_data,
-                COALESCE(gd.lyrics_data, ud.lyrics_data) as lyrics_data
+        cur = conn.execute(f"""
+            SELECT {_SUMMARY_COLUMNS}
             FROM user_downloads ud
             LEFT JOIN global_downloads gd ON ud.global_download_id = gd.id
             WHERE ud.user_id=? AND ud.extracted=1
@@ -794,6 +1202,344 @@ def list_extractions_for(user_id):
         """, (user_id,))
         return [_resolve_paths_in_record(dict(row)) for row in cur.fetchall()]
 
+def get_extraction_statuses(user_id, video_ids):
+    """Look up the extraction state of many videos in one query.
+
+    Set-based counterpart of find_any_global_extraction(): the ids are passed
+    as one JSON array and joined against the indexes, so checking a page of
+    search results costs a single statement.
+
+    Args:
+        user_id: User whose access is checked.
+        video_ids: Video ids to look up.
+
+    Returns:
+        Dict of video_id -> {id, extraction_model, stems_paths, stems_zip_path,
+        user_has_access} for the videos with a completed extraction. Videos
+        that were never extracted are left out.
+    """
+    video_ids = [str(video_id) for video_id in video_ids if video_id]
+    if not video_ids:
+        return {}
+    with _conn() as conn:
+        cur = conn.execute("""
+            WITH wanted(video_id) AS (
+                SELECT DISTINCT value FROM json_each(?)
+            )
+            SELECT w.video_id, gd.id, gd.extraction_model, gd.stems_paths, gd.stems_zip_path,
+                   EXISTS(
+                       SELECT 1 FROM user_downloads ud
+                       WHERE ud.user_id=? AND ud.video_id=w.video_id AND ud.extracted=1
+                   ) as user_has_access
+            FROM wanted w
+            JOIN global_downloads gd ON gd.id = (
+                SELECT g.id FROM global_downloads g
+                WHERE g.video_id=w.video_id AND g.extracted=1
+                LIMIT 1
+            )
+        """, (json.dumps(video_ids), user_id))
+        statuses = {}
+        for row in cur.fetchall():
+            status = dict(row)
+            status['user_has_access'] = bool(status['user_has_access'])
+            statuses[status.pop('video_id')] = status
+        return statuses
+
+# ============ EXTRACTION ID RESOLUTION ============
+
+def _filename_alias(file_path):
+    """File name form of an extraction_id (base name without .mp3)."""
+    if not file_path:
+        return None
+    return os.path.basename(str(file_path).replace('\\', '/')).replace('.mp3', '') or None
+
+def _sync_extraction_aliases(conn, global_download_id):
+    """Rewrite the aliases of one global download inside the caller's transaction."""
+    row = conn.execute(
+        "SELECT video_id, file_path FROM global_downloads WHERE id=?", (global_download_id,)
+    ).fetchone()
+    conn.execute("DELETE FROM extraction_aliases WHERE global_download_id=?", (global_download_id,))
+    if row:
+        aliases = [(row[0], 'video_id'), (_filename_alias(row[1]), 'filename')]
+        conn.executemany("""
+            INSERT OR IGNORE INTO extraction_aliases (alias, kind, global_download_id)
+            VALUES (?, ?, ?)
+        """, [(alias, kind, global_download_id) for alias, kind in aliases if alias])
+    _extraction_cache.clear()
+
+class _ExtractionCache:
+    """Small thread-safe LRU of (user_id, extraction_id) -> user_downloads.id."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_extraction_cache = _ExtractionCache()
+
+# Filename aliases come from file names, which filesystems cap at 255 characters
+MAX_ALIAS_LENGTH = 255
+# Longer client ids cannot name an extraction and are rejected before any query
+MAX_EXTRACTION_ID_LENGTH = 1024
+
+def _alias_candidates(extraction_id):
+    """Every alias that could match an extraction_id.
+
+    Accepts the forms the mixer uses: a video_id, a file name, a file name
+    with .mp3, or a file name followed by a suffix such as "_<timestamp>".
+    Prefixes stop at MAX_ALIAS_LENGTH, which keeps the bound parameters
+    under SQLite's variable limit.
+    """
+    normalized = extraction_id.replace('.mp3', '')
+    candidates = {extraction_id}
+    for value in (extraction_id, normalized):
+        candidates.update(value[:i] for i in range(1, min(len(value), MAX_ALIAS_LENGTH) + 1))
+    return list(candidates)
+
+def _lookup_extraction_id(user_id, extraction_id):
+    """Find the user_downloads.id an extraction_id refers to, without the cache."""
+    if extraction_id.startswith('download_'):
+        download_id = extraction_id[len('download_'):]
+        return int(download_id) if download_id.isdigit() else None
+    if len(extraction_id) > MAX_EXTRACTION_ID_LENGTH:
+        return None
+
+    candidates = _alias_candidates(extraction_id)
+    placeholders = ", ".join("?" for _ in candidates)
+    with _conn() as conn:
+        row = conn.execute(f"""
+            SELECT ud.id
+            FROM extraction_aliases a
+            JOIN user_downloads ud ON ud.global_download_id = a.global_download_id
+            WHERE a.alias IN ({placeholders})
+              AND (a.kind = 'filename' OR a.alias = ?)
+              AND ud.user_id = ? AND ud.extracted = 1
+            ORDER BY a.kind = 'video_id' DESC, length(a.alias) DESC, ud.extracted_at DESC
+            LIMIT 1
+        """, (*candidates, extraction_id, user_id)).fetchone()
+    return row[0] if row else None
+
+def resolve_extraction(user_id, extraction_id, include_analysis=False):
+    """Find the extraction record an extraction_id refers to.
+
+    Accepts "download_<id>" (user_downloads.id), a video_id, or a file name
+    based id (see _alias_candidates). Lookups go through the alias index and
+    an LRU cache, so resolving costs a couple of indexed queries instead of a
+    scan of the user's library. Cached entries are re-checked on use.
+
+    Args:
+        user_id: User the extraction must belong to.
+        extraction_id: Identifier sent by the client.
+        include_analysis: Also load chords_data, structure_data and lyrics_data.
+
+    Returns:
+        Download record dict, or None if nothing matches. "download_<id>"
+        returns the record even if it is not extracted; the other forms only
+        match extracted records.
+    """
+    if not extraction_id:
+        return None
+
+    key = (user_id, extraction_id)
+    cached_id = _extraction_cache.get(key)
+    if cached_id is not None:
+        record = get_download_by_id(user_id, cached_id, include_analysis)
+        if record and (record.get('extracted') or extraction_id.startswith('download_')):
+            return record
+        _extraction_cache.discard(key)
+
+    download_id = _lookup_extraction_id(user_id, extraction_id)
+    if download_id is None:
+        return None
+    record = get_download_by_id(user_id, download_id, include_analysis)
+    if record:
+        _extraction_cache.put(key, download_id)
+    return record
+
+# ============ PAGINATION ============
+
+# Largest page any listing returns
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(*values):
+    """Encode a keyset position (e.g. created_at, id) as an opaque URL-safe cursor."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size=2):
+    """Decode a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+def _page_size(limit):
+    """Clamp a requested page size (None means no paging)."""
+    if limit is None:
+        return None
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def _split_page(rows, page_size, key):
+    """Trim the look-ahead row fetched past the page and build the next cursor."""
+    if page_size is None or len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(*key(rows[-1]))
+
+# ============ LIBRARY ============
+
+def _fts_query(search_query):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", search_query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def _has_library_fts(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='library_fts'"
+    ).fetchone()
+    return row is not None
+
+def search_library(user_id, filter_type='all', search_query='', limit=None, cursor=None):
+    """List one page of the shared library with the user's access to each item.
+
+    With a search query, results come from the full-text index over title,
+    video_id and lyrics, best match first (title matches weigh most), and
+    carry a lyrics_snippet showing the matched line. Without one, newest first.
+
+    Args:
+        user_id: User whose access flags are reported.
+        filter_type: 'all', 'downloads' (has a file) or 'extractions' (extracted).
+        search_query: Free text; the last word matches as a prefix.
+        limit: Page size (capped at MAX_PAGE_SIZE; None returns everything).
+        cursor: next_cursor of the previous page.
+
+    Returns:
+        (items, next_cursor, total_count). Items are dicts with the global
+        download summary columns plus user_count, user_has_access,
+        user_file_path, user_extracted and lyrics_snippet. next_cursor is None
+        on the last page; total_count is only computed for the first page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    conditions = []
+    if filter_type == 'downloads':
+        conditions.append("gd.file_path IS NOT NULL")
+    elif filter_type == 'extractions':
+        conditions.append("gd.extracted = 1")
+
+    select = """
+        SELECT
+            gd.id, gd.video_id, gd.title, gd.thumbnail, gd.file_path, gd.file_size,
+            gd.media_type, gd.quality, gd.created_at, gd.extracted,
+            (SELECT COUNT(DISTINCT ud.user_id) FROM user_downloads ud
+             WHERE ud.global_download_id = gd.id) as user_count,
+            CASE WHEN user_access.user_id IS NOT NULL THEN 1 ELSE 0 END as user_has_access,
+            user_access.file_path as user_file_path,
+            user_access.extracted as user_extracted,
+            {extra}
+        FROM {source}
+        LEFT JOIN user_downloads user_access ON user_access.id = (
+            -- A user can hold several rows for one global download: prefer one with a file
+            SELECT ua.id FROM user_downloads ua
+            WHERE ua.global_download_id = gd.id AND ua.user_id = ?
+            ORDER BY ua.file_path IS NULL, ua.extracted DESC
+            LIMIT 1
+        )
+    """
+    page_size = _page_size(limit)
+    position = decode_cursor(cursor) if cursor else None
+
+    with _conn() as conn:
+        fts_query = _fts_query(search_query) if search_query else None
+        if fts_query and _has_library_fts(conn):
+            # Materialized so the ranking functions run inside the full-text query
+            hits = """
+                WITH hits AS MATERIALIZED (
+                    SELECT rowid,
+                           bm25(library_fts, 10.0, 5.0, 1.0) as score,
+                           snippet(library_fts, 2, '', '', '…', 12) as snippet
+                    FROM library_fts WHERE library_fts MATCH ?
+                )
+            """
+            source = "hits JOIN global_downloads gd ON gd.id = hits.rowid"
+            query = hits + select.format(
+                extra="hits.snippet as lyrics_snippet, hits.score as sort_key",
+                source=source,
+            )
+            count_query = f"{hits} SELECT COUNT(*) FROM {source}"
+            cte_params, condition_params = [fts_query], []
+            # Best score first; bm25 scores are negative, lower is better
+            keyset, order = "(hits.score, gd.id) > (?, ?)", "hits.score, gd.id"
+        else:
+            query = select.format(
+                extra="NULL as lyrics_snippet, gd.created_at as sort_key",
+                source="global_downloads gd",
+            )
+            count_query = "SELECT COUNT(*) FROM global_downloads gd"
+            cte_params, condition_params = [], []
+            keyset, order = "(gd.created_at, gd.id) < (?, ?)", "gd.created_at DESC, gd.id DESC"
+            if search_query:
+                # No usable full-text index (or no words): substring match
+                conditions.append("(gd.title LIKE ? OR gd.video_id LIKE ?)")
+                condition_params.extend([f"%{search_query}%"] * 2)
+
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+        total = None
+        if position is None:
+            total = conn.execute(count_query + where, cte_params + condition_params).fetchone()[0]
+
+        page_conditions = list(conditions)
+        page_params = cte_params + [user_id] + condition_params
+        if position is not None:
+            page_conditions.append(keyset)
+            page_params.extend(position)
+        if page_conditions:
+            query += " WHERE " + " AND ".join(page_conditions)
+        query += f" ORDER BY {order}"
+        if page_size is not None:
+            query += " LIMIT ?"
+            page_params.append(page_size + 1)
+
+        items = [dict(row) for row in conn.execute(query, page_params).fetchall()]
+        items, next_cursor = _split_page(items, page_size, lambda item: (item['sort_key'], item['id']))
+
+    return items, next_cursor, total
+
 # ============ ADMIN CLEANUP FUNCTIONS ============
 
 def get_all_downloads_for_admin():
@@ -853,10 +1599,12 @@ def delete_download_completely(global_download_id):
             affected_users = cursor.rowcount
             
             # Delete from global_downloads
+            cursor.execute("DELETE FROM extraction_aliases WHERE global_download_id=?", (global_download_id,))
             cursor.execute("DELETE FROM global_downloads WHERE id=?", (global_download_id,))
             
             conn.commit()
-            return True, f"Deleted download from database (affected {affected_users} users)", dict(download_info)
+            _extraction_cache.clear()
+            return True, f"Deleted download from database (affected {affected_users} users)", _decode_timelines(dict(download_info))
             
         except Exception as e:
             conn.rollback()
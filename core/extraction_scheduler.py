@@ -0,0 +1,198 @@
+"""
+Global extraction scheduler for StemTubes application.
+Runs stem extractions from every user session on one shared worker pool.
+"""
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import torch
+
+from .config import get_setting
+
+
+def _total_memory_gb() -> Optional[float]:
+    """Get the physical memory of the machine in GB, or None if unknown."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 ** 3)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_worker_count() -> int:
+    """Size the extraction pool from the available hardware.
+
+    Returns:
+        Number of concurrent extractions the machine can sustain.
+    """
+    if torch.cuda.is_available() and get_setting("use_gpu_for_extraction", True):
+        # One separation per GPU keeps VRAM usage predictable
+        return max(1, torch.cuda.device_count())
+
+    # On CPU each Demucs job already uses several cores and ~4 GB of RAM
+    workers = max(1, (os.cpu_count() or 1) // 4)
+    memory_gb = _total_memory_gb()
+    if memory_gb:
+        workers = min(workers, max(1, int(memory_gb // 4)))
+    return workers
+
+
+class ExtractionScheduler:
+    """Process-wide extraction queue with fair scheduling across users.
+
+    Each StemsExtractor registers under an owner key (the user's socket room).
+    Jobs are queued per owner and workers pick owners round-robin, so one user
+    queueing a whole album cannot starve everybody else. The job still runs
+    through the owning extractor, which keeps emitting progress to its room.
+    """
+
+    def __init__(self, max_workers: int):
+        """Initialize the scheduler and start the worker pool.
+
+        Args:
+            max_workers: Number of extractions allowed to run at once.
+        """
+        self.max_workers = max(1, int(max_workers))
+        self._condition = threading.Condition()
+        # owner key -> queued (extractor, item) jobs, in round-robin order
+        self._queues: "OrderedDict[str, Deque[Tuple[Any, Any]]]" = OrderedDict()
+        # extraction id -> (owner key, item) for jobs currently running
+        self._running: Dict[str, Tuple[str, Any]] = {}
+        self._workers: List[threading.Thread] = []
+        self._stopping = False
+
+        for index in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"extraction-worker-{index}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+        print(f"Extraction scheduler started with {self.max_workers} worker(s)")
+
+    def submit(self, owner_key: str, extractor, item):
+        """Queue an extraction.
+
+        Args:
+            owner_key: Key of the session that owns the extraction.
+            extractor: StemsExtractor that runs the job and reports progress.
+            item: Extraction item to process.
+        """
+        with self._condition:
+            self._queues.setdefault(owner_key, deque()).append((extractor, item))
+            self._condition.notify()
+
+    def remove_queued(self, owner_key: str, extraction_id: str) -> Optional[Any]:
+        """Remove an extraction that has not started yet.
+
+        Args:
+            owner_key: Key of the session that owns the extraction.
+            extraction_id: ID of the extraction.
+
+        Returns:
+            The removed item, or None if it was not queued.
+        """
+        with self._condition:
+            jobs = self._queues.get(owner_key)
+            if not jobs:
+                return None
+            for job in jobs:
+                if job[1].extraction_id == extraction_id:
+                    jobs.remove(job)
+                    if not jobs:
+                        del self._queues[owner_key]
+                    return job[1]
+        return None
+
+    def queued_items(self, owner_key: str) -> Dict[str, Any]:
+        """Get the queued extractions of one owner, in queue order."""
+        with self._condition:
+            return {item.extraction_id: item for _, item in self._queues.get(owner_key, ())}
+
+    def running_items(self, owner_key: str) -> Dict[str, Any]:
+        """Get the running extractions of one owner."""
+        with self._condition:
+            return {
+                extraction_id: item
+                for extraction_id, (key, item) in self._running.items()
+                if key == owner_key
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get a snapshot of the scheduler state for monitoring."""
+        with self._condition:
+            return {
+                "max_workers": self.max_workers,
+                "running": len(self._running),
+                "queued": sum(len(jobs) for jobs in self._queues.values()),
+                "queued_by_owner": {key: len(jobs) for key, jobs in self._queues.items()},
+            }
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop the workers once their current extraction finishes.
+
+        Jobs still queued are not started.
+
+        Args:
+            timeout: Seconds to wait for each worker to exit (None waits forever).
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _next_job(self) -> Tuple[str, Any, Any]:
+        """Pop the next job, rotating between owners. Caller holds the lock."""
+        owner_key, jobs = next(iter(self._queues.items()))
+        extractor, item = jobs.popleft()
+        if jobs:
+            # Owner goes to the back of the line for its next job
+            self._queues.move_to_end(owner_key)
+        else:
+            del self._queues[owner_key]
+        return owner_key, extractor, item
+
+    def _worker_loop(self):
+        """Worker thread: run queued extractions one after another."""
+        while True:
+            with self._condition:
+                while not self._queues and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                owner_key, extractor, item = self._next_job()
+                self._running[item.extraction_id] = (owner_key, item)
+
+            try:
+                extractor._run_extraction(item)
+            except Exception as e:
+                print(f"❌ Unexpected error in extraction worker: {e}")
+            finally:
+                with self._condition:
+                    self._running.pop(item.extraction_id, None)
+
+
+# Create a singleton instance
+_extraction_scheduler = None
+_extraction_scheduler_lock = threading.Lock()
+
+def get_extraction_scheduler() -> ExtractionScheduler:
+    """Get the extraction scheduler singleton instance."""
+    global _extraction_scheduler
+    with _extraction_scheduler_lock:
+        if _extraction_scheduler is None:
+            max_workers = get_setting("max_concurrent_extractions", 0) or default_worker_count()
+            _extraction_scheduler = ExtractionScheduler(max_workers)
+        return _extraction_scheduler
+
+
+def shutdown_extraction_scheduler(timeout: Optional[float] = None):
+    """Stop the extraction scheduler if it was started."""
+    with _extraction_scheduler_lock:
+        scheduler = _extraction_scheduler
+    if scheduler is not None:
+        scheduler.shutdown(timeout)
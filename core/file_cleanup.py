@@ -111,6 +111,15 @@ def delete_download_files(download_info):
                 seen.add(d)
                 unique_dirs.append(d)
         possible_dirs = unique_dirs
+
+        # Decoded PCM caches of the analyzers sit next to the audio file
+        if download_info.get('file_path'):
+            try:
+                from core.audio_context import remove_pcm_cache
+                from core.downloads_db import resolve_file_path
+                total_size_freed += remove_pcm_cache(resolve_file_path(download_info['file_path']))
+            except Exception as e:
+                errors.append(f"Error deleting PCM cache: {e}")
         
         download_folder = None
         for possible_dir in possible_dirs:
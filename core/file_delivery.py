@@ -0,0 +1,110 @@
+"""
+Media file delivery for StemTubes routes.
+Serves stems, downloads and streamed audio with a validator tied to the
+file (modification time + size), long-lived caching for versioned URLs,
+and optionally hands the byte transfer to the front proxy
+(X-Accel-Redirect for nginx, X-Sendfile for Apache/lighttpd) so Python
+threads only answer the request.
+"""
+import mimetypes
+import os
+from typing import Optional
+from urllib.parse import quote
+
+from flask import request, send_file, current_app
+
+from .config import get_setting, ensure_valid_downloads_directory
+
+# Delivery modes (media_delivery setting)
+DIRECT = "direct"
+X_ACCEL = "x-accel"
+X_SENDFILE = "x-sendfile"
+
+# Cache-Control of unversioned URLs: the browser keeps the file but asks first
+REVALIDATE = "private, no-cache"
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Get the entity tag of a file (unquoted; changes whenever the file is rewritten)."""
+    return f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+
+
+def versioned_url(url: str, stat_result: os.stat_result) -> str:
+    """Add the file version to a media URL so it can be cached as immutable."""
+    return f"{url}{'&' if '?' in url else '?'}v={file_etag(stat_result)}"
+
+
+def _cache_control(immutable: bool) -> str:
+    """Cache-Control value of a media response."""
+    if not immutable:
+        return REVALIDATE
+    max_age = int(get_setting("media_immutable_max_age", 31536000))
+    return f"private, max-age={max_age}, immutable"
+
+
+def _proxy_response(path: str, mode: str, mimetype: Optional[str], as_attachment: bool,
+                    download_name: Optional[str]):
+    """Empty response telling the front proxy which file to send.
+
+    The proxy answers Range and conditional requests itself and keeps the
+    Content-Type, Content-Disposition and caching headers set here.
+    """
+    response = current_app.response_class(mimetype=mimetype or "application/octet-stream")
+    if as_attachment:
+        name = download_name or os.path.basename(path)
+        response.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(name)}"
+
+    if mode == X_ACCEL:
+        # nginx: internal location whose alias is the downloads directory
+        root = os.path.abspath(ensure_valid_downloads_directory())
+        relative = os.path.relpath(path, root).replace(os.sep, "/")
+        prefix = get_setting("media_accel_prefix", "/internal-media/").rstrip("/")
+        response.headers["X-Accel-Redirect"] = f"{prefix}/{quote(relative)}"
+    else:
+        response.headers["X-Sendfile"] = path
+    return response
+
+
+def send_media_file(path: str, mimetype: Optional[str] = None, as_attachment: bool = False,
+                    download_name: Optional[str] = None, version: Optional[str] = None):
+    """Send a media file with validators, caching and optional proxy offload.
+
+    Args:
+        path: Absolute path of a file inside the downloads directory.
+        mimetype: Content type (guessed from the name when None).
+        as_attachment: Ask the browser to save the file.
+        download_name: File name for attachments.
+        version: Version the client asked for (``v`` query parameter); when
+            it matches the file the response may be cached forever.
+
+    Returns:
+        Flask response: 304 when If-None-Match matches, otherwise the file
+        (200/206 with Range in direct mode) or a proxy redirect header.
+    """
+    stat_result = os.stat(path)
+    etag = file_etag(stat_result)
+    cache_control = _cache_control(version == etag)
+
+    # Answer revalidations from the stat alone, without opening the file
+    if request.method in ("GET", "HEAD") and etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+    mode = str(get_setting("media_delivery", DIRECT)).lower()
+    if mode in (X_ACCEL, X_SENDFILE):
+        if mimetype is None:
+            mimetype, _ = mimetypes.guess_type(path)
+        response = _proxy_response(path, mode, mimetype, as_attachment, download_name)
+        response.last_modified = stat_result.st_mtime
+    else:
+        # werkzeug serves Range requests (206) and If-Range for us
+        response = send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                             download_name=download_name, conditional=True,
+                             etag=etag, last_modified=stat_result.st_mtime)
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.headers.pop("Expires", None)
+    return response
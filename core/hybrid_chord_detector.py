@@ -9,6 +9,9 @@ import numpy as np
 import librosa
 from typing import Tuple, List, Dict, Optional
 
+from core.chord_templates import ChordTemplateBank, sum_normalize
+from core.beat_grid import snap_to_beats
+
 # Monkey-patch numpy for madmom compatibility
 if not hasattr(np, 'int'):
     np.int = np.int64
@@ -192,7 +195,7 @@ class HybridChordDetector:
         else:
             print("[HYBRID] Madmom not available, using basic beat detection")
 
-    def detect_chords(self, audio_file_path: str, bpm: Optional[float] = None, detected_key: Optional[str] = None) -> Tuple[Optional[str], float]:
+    def detect_chords(self, audio_file_path: str, bpm: Optional[float] = None, detected_key: Optional[str] = None, context=None) -> Tuple[Optional[str], float]:
         """
         Detect chords using hybrid approach.
 
@@ -200,6 +203,7 @@ class HybridChordDetector:
             audio_file_path: Path to audio file
             bpm: Known BPM (optional)
             detected_key: Known musical key (optional, improves accuracy)
+            context: Optional AudioAnalysisContext holding the decoded audio
 
         Returns:
             tuple: (chords_json, beat_offset)
@@ -214,10 +218,13 @@ class HybridChordDetector:
 
         try:
             # Load audio
-            y, sr = librosa.load(audio_file_path, sr=22050)
+            if context is not None:
+                y, sr = context.mono(22050), 22050
+            else:
+                y, sr = librosa.load(audio_file_path, sr=22050)
 
             # Step 1: Beat tracking (madmom if available, else librosa)
-            beat_offset, beats = self._detect_beats(audio_file_path, y, sr, bpm)
+            beat_offset, beats = self._detect_beats(audio_file_path, y, sr, bpm, context)
             print(f"[HYBRID] Beats: offset={beat_offset:.3f}s, count={len(beats)}")
 
             # Step 2: Extract chroma features with HPSS preprocessing for distorted guitar
@@ -263,11 +270,15 @@ class HybridChordDetector:
             traceback.print_exc()
             return None, 0.0
 
-    def _detect_beats(self, audio_file_path: str, y: np.ndarray, sr: int, known_bpm: Optional[float]) -> Tuple[float, np.ndarray]:
+    def _detect_beats(self, audio_file_path: str, y: np.ndarray, sr: int, known_bpm: Optional[float], context=None) -> Tuple[float, np.ndarray]:
         """Detect beats using madmom (preferred) or librosa."""
         if MADMOM_AVAILABLE:
             # Use madmom RNN beat tracker
-            beat_activations = self.beat_processor(audio_file_path)
+            audio_input = audio_file_path
+            if context is not None:
+                from madmom.audio.signal import Signal
+                audio_input = Signal(context.mono(44100), sample_rate=44100, num_channels=1)
+            beat_activations = self.beat_processor(audio_input)
             beats = self.beat_tracker(beat_activations)
 
             if len(beats) > 0:
@@ -284,6 +295,33 @@ class HybridChordDetector:
             else:
                 return 0.0, np.array([])
 
+    @classmethod
+    def _template_bank(cls) -> Tuple[ChordTemplateBank, np.ndarray, np.ndarray]:
+        """
+        Get the chord template bank with the row indices of simple and complex chords.
+
+        Built once per class from CHORD_TEMPLATES.
+        """
+        if cls.__dict__.get('_bank') is None:
+            simple_chords = []  # Major and minor only
+            complex_chords = []  # 7th, 7#9, maj7, etc.
+
+            for name, template in cls.CHORD_TEMPLATES.items():
+                # Simple = just major or minor triads (3 notes)
+                if len([n for n in template if n == 1]) == 3:
+                    if 'm' in name and name.replace('m', '').replace('#', '').replace('b', '').isalpha():
+                        simple_chords.append(name)  # Minor
+                    elif name.replace('#', '').replace('b', '').isalpha():
+                        simple_chords.append(name)  # Major
+                    else:
+                        complex_chords.append(name)
+                else:
+                    complex_chords.append(name)
+
+            bank = ChordTemplateBank(cls.CHORD_TEMPLATES)
+            cls._bank = (bank, bank.subset(simple_chords), bank.subset(complex_chords))
+        return cls._bank
+
     def _match_chords(self, chroma: np.ndarray, sr: int, key: Optional[str]) -> List[Dict]:
         """
         Match chroma to chord templates using TWO-PASS detection.
@@ -292,110 +330,47 @@ class HybridChordDetector:
         Pass 2: Only if Pass 1 fails, try complex chords with VERY strict threshold
 
         This prevents false detection of complex chords on distorted music.
+        All frames are scored against all templates at once.
         """
-        # Separate simple chords from complex chords
-        simple_chords = {}  # Major and minor only
-        complex_chords = {}  # 7th, 7#9, maj7, etc.
-
-        for name, template in self.CHORD_TEMPLATES.items():
-            # Simple = just major or minor triads (3 notes)
-            if len([n for n in template if n == 1]) == 3:
-                if 'm' in name and name.replace('m', '').replace('#', '').replace('b', '').isalpha():
-                    simple_chords[name] = template  # Minor
-                elif name.replace('#', '').replace('b', '').isalpha():
-                    simple_chords[name] = template  # Major
-                else:
-                    complex_chords[name] = template
-            else:
-                complex_chords[name] = template
-
-        print(f"[HYBRID] Two-pass detection: {len(simple_chords)} simple + {len(complex_chords)} complex chords")
+        bank, simple_rows, complex_rows = self._template_bank()
+        print(f"[HYBRID] Two-pass detection: {len(simple_rows)} simple + {len(complex_rows)} complex chords")
 
-        chords = []
         hop_length = 2048
         frame_duration = hop_length / sr
 
-        # Process each frame
-        for i in range(chroma.shape[1]):
-            frame_chroma = chroma[:, i]
-
-            # Normalize
-            if np.sum(frame_chroma) > 0:
-                frame_chroma = frame_chroma / np.sum(frame_chroma)
-
-            # PASS 1: Try simple chords first
-            best_simple_chord = None
-            best_simple_score = 0.0
-
-            for chord_name, template in simple_chords.items():
-                template_arr = np.array(template)
-
-                # Standard cosine similarity (no weighting)
-                score = np.dot(frame_chroma, template_arr) / (
-                    np.linalg.norm(frame_chroma) * np.linalg.norm(template_arr) + 1e-10
-                )
-
-                if score > best_simple_score:
-                    best_simple_score = score
-                    best_simple_chord = chord_name
-
-            # If simple chord is good enough, use it and SKIP complex detection
-            if best_simple_score >= 0.65:  # Good match with simple chord
-                timestamp = i * frame_duration
-                chords.append({
-                    'timestamp': round(timestamp, 3),
-                    'chord': best_simple_chord,
-                    'confidence': round(float(best_simple_score), 3)
-                })
-                continue
-
-            # PASS 2: Simple chord didn't work well, try complex chords
-            # But require VERY high threshold to avoid false positives
-            best_complex_chord = None
-            best_complex_score = 0.0
-
-            for chord_name, template in complex_chords.items():
-                template_arr = np.array(template)
-                template_notes = np.where(template_arr > 0)[0]
-
-                # For complex chords, require ALL notes to be somewhat present
-                # Check if each required note is present in chroma
-                all_notes_present = True
-                for note_idx in template_notes:
-                    if frame_chroma[note_idx] < 0.03:  # Note must have at least 3% energy
-                        all_notes_present = False
-                        break
-
-                if not all_notes_present:
-                    continue  # Skip this complex chord if any note is missing
-
-                # Standard cosine similarity
-                score = np.dot(frame_chroma, template_arr) / (
-                    np.linalg.norm(frame_chroma) * np.linalg.norm(template_arr) + 1e-10
-                )
-
-                if score > best_complex_score:
-                    best_complex_score = score
-                    best_complex_chord = chord_name
-
-            # Use complex chord only if score is VERY high
-            if best_complex_score >= 0.85:  # VERY strict threshold
-                timestamp = i * frame_duration
-                chords.append({
-                    'timestamp': round(timestamp, 3),
-                    'chord': best_complex_chord,
-                    'confidence': round(float(best_complex_score), 3)
-                })
-            elif best_simple_score >= 0.5:  # Fallback to simple chord if decent
-                timestamp = i * frame_duration
-                chords.append({
-                    'timestamp': round(timestamp, 3),
-                    'chord': best_simple_chord,
-                    'confidence': round(float(best_simple_score), 3)
-                })
-            # else: skip this frame (too uncertain)
-
-        return chords
+        # Normalize each frame, then standard cosine similarity against every template
+        frame_chroma = sum_normalize(chroma)
+        scores = bank.cosine_scores(frame_chroma)
+
+        # PASS 1: best simple chord per frame
+        simple_best, simple_scores = bank.best(scores[simple_rows])
+        simple_best = simple_rows[simple_best]
+
+        # PASS 2: complex chords, which require ALL notes to be somewhat present
+        # (each note must have at least 3% energy)
+        complex_present = bank.notes_present(frame_chroma, 0.03)[complex_rows]
+        complex_best, complex_scores = bank.best(scores[complex_rows], mask=complex_present)
+        complex_best = complex_rows[complex_best]
+
+        # Good simple match wins and skips complex detection; complex chords need a
+        # VERY strict threshold; otherwise fall back to a decent simple chord
+        use_simple = simple_scores >= 0.65
+        use_complex = ~use_simple & (complex_scores >= 0.85)
+        use_fallback = ~use_simple & ~use_complex & (simple_scores >= 0.5)
+
+        chord_idx = np.where(use_complex, complex_best, simple_best)
+        confidence = np.where(use_complex, complex_scores, simple_scores)
+        # Other frames are skipped (too uncertain)
+        frames = np.flatnonzero(use_simple | use_complex | use_fallback)
+
+        return [
+            {
+                'timestamp': round(int(i) * frame_duration, 3),
+                'chord': bank.names[chord_idx[i]],
+                'confidence': round(float(confidence[i]), 3)
+            }
+            for i in frames
+        ]
 
     def _consolidate_chords(self, chords: List[Dict], min_duration: float = 1.0) -> List[Dict]:
         """
@@ -456,52 +431,27 @@ class HybridChordDetector:
         if len(chords) < 3:
             return chords
 
-        filtered = []
-
-        for i, chord in enumerate(chords):
-            # Get context
-            prev_chord = chords[i-1]['chord'] if i > 0 else None
-            next_chord = chords[i+1]['chord'] if i < len(chords)-1 else None
-
-            # Check if chord makes harmonic sense
-            keep = True
-
-            # Rule 1: Consecutive duplicates with high confidence
-            if prev_chord == chord['chord'] and chord['confidence'] > 0.5:
-                keep = True
-            # Rule 2: Valid progression in key
-            elif key and self._is_valid_progression(prev_chord, chord['chord'], next_chord, key):
-                keep = True
-            # Rule 3: High confidence standalone
-            elif chord['confidence'] > 0.6:
-                keep = True
-            # Rule 4: Low confidence outlier
-            elif chord['confidence'] < 0.4:
-                keep = False
-
-            if keep:
-                filtered.append(chord)
-
-        return filtered
+        confidence = np.array([chord['confidence'] for chord in chords])
 
-    def _is_valid_progression(self, prev: Optional[str], current: str, next: Optional[str], key: str) -> bool:
-        """Check if chord progression is harmonically valid."""
-        if key not in self.KEY_CHORDS:
-            return True  # Unknown key, accept all
-
-        valid_chords = self.KEY_CHORDS[key]
-
-        # Current chord should be in key
-        if current not in valid_chords:
-            return False
+        # Rule 2: valid progression in key (a chord is valid when it belongs to the key,
+        # or when the key is unknown)
+        if key:
+            if key in self.KEY_CHORDS:
+                bank = self._template_bank()[0]
+                in_key = bank.key_mask(self.KEY_CHORDS[key])
+                chord_idx = np.array([bank.index.get(chord['chord'], -1) for chord in chords])
+                valid_in_key = (chord_idx >= 0) & in_key[chord_idx]
+            else:
+                valid_in_key = np.ones(len(chords), dtype=bool)
+        else:
+            valid_in_key = np.zeros(len(chords), dtype=bool)
 
-        # Check common progressions
-        if prev and next:
-            # All three in key is good
-            if prev in valid_chords and next in valid_chords:
-                return True
+        # Rule 1 (repeated chord above 0.5) and Rule 3 (confidence above 0.6) keep chords
+        # that are never low-confidence outliers, so only Rule 4 can remove a chord:
+        # low confidence (< 0.4) and not valid in key
+        keep = valid_in_key | (confidence >= 0.4)
 
-        return True  # Default to accepting
+        return [chord for chord, kept in zip(chords, keep) if kept]
 
     def _align_to_beats(self, chords: List[Dict], beats: np.ndarray, beat_offset: float) -> List[Dict]:
         """Align chord changes to beat grid and merge nearby changes."""
@@ -512,18 +462,11 @@ class HybridChordDetector:
         last_chord = None
         min_chord_duration = 0.5  # Minimum time between chord changes (seconds)
 
-        # Snap each chord to nearest beat
-        for chord in chords:
-            timestamp = chord['timestamp']
-
-            # Find nearest beat
-            beat_diffs = np.abs(beats - timestamp)
-            nearest_beat_idx = np.argmin(beat_diffs)
-            nearest_beat_time = beats[nearest_beat_idx]
+        # Snap each chord to nearest beat, only if close enough (within 0.3s)
+        snapped = snap_to_beats([chord['timestamp'] for chord in chords], beats, 0.3)
 
-            # Only snap if close enough (within 0.3s)
-            if beat_diffs[nearest_beat_idx] < 0.3:
-                timestamp = nearest_beat_time
+        for chord, timestamp in zip(chords, snapped):
+            timestamp = float(timestamp)
 
             # Skip if same chord or too close to previous
             if last_chord:
@@ -552,7 +495,7 @@ class HybridChordDetector:
         return aligned
 
 
-def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None, detected_key: Optional[str] = None) -> Tuple[Optional[str], float]:
+def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None, detected_key: Optional[str] = None, context=None) -> Tuple[Optional[str], float]:
     """
     Main entry point for hybrid chord detection.
 
@@ -560,13 +503,14 @@ def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None, detect
         audio_file_path: Path to audio file
         bpm: Known BPM (optional)
         detected_key: Known musical key (optional, improves accuracy significantly)
+        context: Optional AudioAnalysisContext holding the decoded audio
 
     Returns:
         tuple: (chords_json, beat_offset)
     """
     try:
         detector = HybridChordDetector()
-        return detector.detect_chords(audio_file_path, bpm, detected_key)
+        return detector.detect_chords(audio_file_path, bpm, detected_key, context=context)
     except Exception as e:
         print(f"[HYBRID] Analysis failed: {e}")
         import traceback
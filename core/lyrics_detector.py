@@ -5,7 +5,10 @@ Transcribes audio to text with precise timestamps for karaoke display
 
 import os
 import sys
+import time
 import logging
+import threading
+from contextlib import contextmanager
 from typing import List, Dict, Optional, Tuple
 
 # Set up CUDA library paths for faster-whisper
@@ -48,6 +51,174 @@ from faster_whisper import WhisperModel
 
 logger = logging.getLogger(__name__)
 
+ModelKey = Tuple[str, str, str]
+
+
+class WhisperModelPool:
+    """
+    Process-wide registry of loaded Whisper models.
+
+    Models are keyed by (model_size, device, compute_type), loaded once and
+    shared by every transcription. Models left unused for idle_timeout seconds
+    are unloaded, and at most max_concurrent transcriptions run at once.
+    """
+
+    def __init__(self, idle_timeout: float = 1800.0, max_concurrent: int = 1):
+        """
+        Initialize the pool
+
+        Args:
+            idle_timeout: Seconds a model may stay unused before it is unloaded (0 keeps models forever)
+            max_concurrent: Maximum number of transcriptions running at once
+        """
+        self.idle_timeout = idle_timeout
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._lock = threading.Lock()
+        self._load_locks: Dict[ModelKey, threading.Lock] = {}
+        self._models: Dict[ModelKey, WhisperModel] = {}
+        self._last_used: Dict[ModelKey, float] = {}
+        self._in_use: Dict[ModelKey, int] = {}
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._reaper: Optional[threading.Thread] = None
+
+    def get(self, model_size: str, device: str, compute_type: str) -> WhisperModel:
+        """
+        Get a loaded model, loading it on first use
+
+        Args:
+            model_size: Whisper model size/path (already normalized)
+            device: Device to use (cuda, cpu)
+            compute_type: Computation type
+
+        Returns:
+            Loaded WhisperModel
+        """
+        key = (model_size, device, compute_type)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._last_used[key] = time.monotonic()
+                return model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the pool lock so other models stay available meanwhile
+        with load_lock:
+            with self._lock:
+                model = self._models.get(key)
+            if model is None:
+                started = time.monotonic()
+                logger.info(f"[LYRICS] Loading Whisper model into pool: {model_size} on {device} ({compute_type})")
+                model = WhisperModel(model_size, device=device, compute_type=compute_type)
+                logger.info(f"[LYRICS] Whisper model loaded in {time.monotonic() - started:.1f}s")
+                with self._lock:
+                    self._models[key] = model
+
+        with self._lock:
+            self._last_used[key] = time.monotonic()
+        self._ensure_reaper()
+        return model
+
+    @contextmanager
+    def transcription_slot(self, model_size: str, device: str, compute_type: str):
+        """
+        Hold one of the concurrent transcription slots
+
+        The model is not unloaded while a slot is held for it.
+        """
+        key = (model_size, device, compute_type)
+        self._slots.acquire()
+        with self._lock:
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+                self._last_used[key] = time.monotonic()
+            self._slots.release()
+
+    def preload(self, model_size: str, device: str, compute_type: str) -> WhisperModel:
+        """Load a model ahead of the first transcription."""
+        return self.get(model_size, device, compute_type)
+
+    def loaded_models(self) -> List[ModelKey]:
+        """Get the keys of the models currently loaded."""
+        with self._lock:
+            return list(self._models)
+
+    def evict_idle(self) -> int:
+        """
+        Unload models unused for longer than idle_timeout
+
+        Returns:
+            Number of models unloaded
+        """
+        if not self.idle_timeout:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                key for key in self._models
+                if key not in self._in_use and now - self._last_used.get(key, now) > self.idle_timeout
+            ]
+            for key in idle:
+                del self._models[key]
+                self._last_used.pop(key, None)
+        for key in idle:
+            logger.info(f"[LYRICS] Unloaded idle Whisper model: {key[0]} on {key[1]} ({key[2]})")
+        return len(idle)
+
+    def clear(self):
+        """Unload every model not currently transcribing."""
+        with self._lock:
+            for key in [k for k in self._models if k not in self._in_use]:
+                del self._models[key]
+                self._last_used.pop(key, None)
+
+    def _ensure_reaper(self):
+        """Start the idle-eviction thread once a model is loaded."""
+        if not self.idle_timeout:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reaper_loop, name="whisper-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reaper_loop(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 2))
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"[LYRICS] Error evicting idle Whisper models: {e}")
+
+
+# Create a singleton instance
+_whisper_model_pool = None
+_whisper_model_pool_lock = threading.Lock()
+
+def get_whisper_model_pool() -> WhisperModelPool:
+    """Get the Whisper model pool singleton instance."""
+    global _whisper_model_pool
+    with _whisper_model_pool_lock:
+        if _whisper_model_pool is None:
+            try:
+                from .config import get_setting
+                idle_minutes = get_setting("lyrics_model_idle_minutes", 30)
+                max_concurrent = get_setting("max_concurrent_transcriptions", 1)
+            except ImportError:
+                # Module run directly as a script
+                idle_minutes, max_concurrent = 30, 1
+            _whisper_model_pool = WhisperModelPool(
+                idle_timeout=idle_minutes * 60,
+                max_concurrent=max_concurrent
+            )
+        return _whisper_model_pool
+
 
 class LyricsDetector:
     """
@@ -92,30 +263,23 @@ class LyricsDetector:
 
             log_name = self.requested_model_size or self.model_size
             logger.info(f"[LYRICS] Loading Whisper model: {log_name} -> {self.model_size} on {self.device} ({self.compute_type})")
+            pool = get_whisper_model_pool()
             try:
-                self.model = WhisperModel(
-                    self.model_size,
-                    device=self.device,
-                    compute_type=self.compute_type
-                )
-                logger.info("[LYRICS] Whisper model loaded successfully")
+                self.model = pool.get(self.model_size, self.device, self.compute_type)
             except Exception as e:
                 logger.error(f"[LYRICS] Failed to load on GPU, falling back to CPU: {e}")
                 # Fallback to CPU with int8
                 self.device = "cpu"
                 self.compute_type = "int8"
                 self.model_size, self.is_quantized = self._normalize_model_name(self.requested_model_size)
-                self.model = WhisperModel(
-                    self.model_size,
-                    device=self.device,
-                    compute_type=self.compute_type
-                )
+                self.model = pool.get(self.model_size, self.device, self.compute_type)
 
     def detect_lyrics(
         self,
         audio_path: str,
         language: Optional[str] = None,
-        word_timestamps: bool = True
+        word_timestamps: bool = True,
+        context=None
     ) -> Optional[List[Dict]]:
         """
         Detect and transcribe lyrics with timestamps
@@ -124,6 +288,7 @@ class LyricsDetector:
             audio_path: Path to audio file
             language: Language code (None for auto-detection)
             word_timestamps: Include word-level timestamps
+            context: Optional AudioAnalysisContext holding the decoded audio of audio_path
 
         Returns:
             List of lyrics segments with timestamps:
@@ -149,15 +314,12 @@ class LyricsDetector:
 
             logger.info(f"[LYRICS] Transcribing audio: {audio_path}")
 
+            # faster-whisper accepts 16 kHz mono samples directly, skipping its own decode
+            audio_input = context.mono(16000) if context is not None else audio_path
+
             # Transcribe with faster-whisper
-            # VAD disabled to capture entire song including instrumental sections
             try:
-                segments, info = self.model.transcribe(
-                    audio_path,
-                    language=language,
-                    word_timestamps=word_timestamps,
-                    vad_filter=False  # Disabled: Don't stop at silence/instrumental sections
-                )
+                lyrics_data = self._transcribe(audio_input, language, word_timestamps)
             except RuntimeError as transcribe_error:
                 if "libcublas" in str(transcribe_error) or "CUDA" in str(transcribe_error):
                     logger.warning(f"[LYRICS] GPU transcription failed ({transcribe_error}), retrying with CPU...")
@@ -168,15 +330,48 @@ class LyricsDetector:
                     self._load_model()
 
                     # Retry transcription with CPU
-                    segments, info = self.model.transcribe(
-                        audio_path,
-                        language=language,
-                        word_timestamps=word_timestamps,
-                        vad_filter=False
-                    )
+                    lyrics_data = self._transcribe(audio_input, language, word_timestamps)
                 else:
                     raise
 
+            logger.info(f"[LYRICS] Transcription complete: {len(lyrics_data)} segments")
+
+            # Log first few segments for debugging
+            if lyrics_data:
+                logger.info("[LYRICS] Sample segments:")
+                for seg in lyrics_data[:3]:
+                    logger.info(f"   {seg['start']:.1f}s - {seg['end']:.1f}s: {seg['text'][:50]}...")
+
+            return lyrics_data
+
+        except Exception as e:
+            logger.error(f"[LYRICS] Error during transcription: {e}", exc_info=True)
+            return None
+
+    def _transcribe(self, audio_input, language: Optional[str], word_timestamps: bool) -> List[Dict]:
+        """
+        Run one transcription while holding a slot of the model pool
+
+        faster-whisper decodes lazily while segments are iterated, so the
+        segments are converted inside the slot.
+
+        Args:
+            audio_input: Path to audio file or 16 kHz mono samples
+            language: Language code (None for auto-detection)
+            word_timestamps: Include word-level timestamps
+
+        Returns:
+            List of lyrics segments with timestamps
+        """
+        with get_whisper_model_pool().transcription_slot(self.model_size, self.device, self.compute_type):
+            # VAD disabled to capture entire song including instrumental sections
+            segments, info = self.model.transcribe(
+                audio_input,
+                language=language,
+                word_timestamps=word_timestamps,
+                vad_filter=False  # Disabled: Don't stop at silence/instrumental sections
+            )
+
             logger.info(f"[LYRICS] Detected language: {info.language} (probability: {info.language_probability:.2f})")
 
             # Convert segments to list of dicts
@@ -201,19 +396,7 @@ class LyricsDetector:
 
                 lyrics_data.append(segment_dict)
 
-            logger.info(f"[LYRICS] Transcription complete: {len(lyrics_data)} segments")
-
-            # Log first few segments for debugging
-            if lyrics_data:
-                logger.info("[LYRICS] Sample segments:")
-                for seg in lyrics_data[:3]:
-                    logger.info(f"   {seg['start']:.1f}s - {seg['end']:.1f}s: {seg['text'][:50]}...")
-
-            return lyrics_data
-
-        except Exception as e:
-            logger.error(f"[LYRICS] Error during transcription: {e}", exc_info=True)
-            return None
+        return lyrics_data
 
     def get_lyrics_at_time(self, lyrics_data: List[Dict], time: float) -> Optional[Dict]:
         """
@@ -236,11 +419,41 @@ class LyricsDetector:
         return None
 
 
+def _make_detector(model_size: str, use_gpu: bool) -> LyricsDetector:
+    """Build a detector with the model/device/precision used for songs."""
+    requested_model = model_size or "large-v3-int8"
+    device = "cuda" if use_gpu else "cpu"
+    compute_type = "int8_float16" if use_gpu else "int8"
+
+    # Prefer the full precision large model when a GPU is available
+    if use_gpu and requested_model.endswith("-int8"):
+        logger.info(f"[LYRICS] GPU detected – upgrading {requested_model} to large-v3 for maximum accuracy.")
+        requested_model = "large-v3"
+
+    return LyricsDetector(
+        model_size=requested_model,
+        device=device,
+        compute_type=compute_type
+    )
+
+
+def preload_lyrics_model(model_size: str = "large-v3-int8", use_gpu: bool = True):
+    """
+    Load the Whisper model detect_song_lyrics would use into the pool
+
+    Args:
+        model_size: Whisper model size/path
+        use_gpu: Use GPU if available
+    """
+    _make_detector(model_size, use_gpu)._load_model()
+
+
 def detect_song_lyrics(
     audio_path: str,
     model_size: str = "large-v3-int8",
     language: Optional[str] = None,
-    use_gpu: bool = True
+    use_gpu: bool = True,
+    context=None
 ) -> Optional[List[Dict]]:
     """
     Main function to detect lyrics from audio
@@ -250,27 +463,13 @@ def detect_song_lyrics(
         model_size: Whisper model size/path (tiny, base, small, medium, large-v3-int8)
         language: Language code (None for auto-detection)
         use_gpu: Use GPU if available
+        context: Optional AudioAnalysisContext holding the decoded audio of audio_path
 
     Returns:
         List of lyrics segments with timestamps or None
     """
-    requested_model = model_size or "large-v3-int8"
-    device = "cuda" if use_gpu else "cpu"
-    compute_type = "int8_float16" if use_gpu else "int8"
-
-    # Prefer the full precision large model when a GPU is available
-    if use_gpu and requested_model.endswith("-int8"):
-        logger = logging.getLogger(__name__)
-        logger.info(f"[LYRICS] GPU detected – upgrading {requested_model} to large-v3 for maximum accuracy.")
-        requested_model = "large-v3"
-
-    detector = LyricsDetector(
-        model_size=requested_model,
-        device=device,
-        compute_type=compute_type
-    )
-
-    return detector.detect_lyrics(audio_path, language=language)
+    detector = _make_detector(model_size, use_gpu)
+    return detector.detect_lyrics(audio_path, language=language, context=context)
 
 
 # Test if run directly
@@ -5,6 +5,7 @@ Provides Chordify/Moises-level accuracy with advanced beat tracking and extended
 
 import os
 import json
+import threading
 import numpy as np
 from typing import Tuple, List, Dict, Optional
 
@@ -28,6 +29,24 @@ except ImportError as e:
     print(f"Warning: madmom not available, using fallback chord detection: {e}")
 
 
+def _signal_input(audio_file_path: str, context=None):
+    """
+    Build the input for madmom processors.
+
+    Args:
+        audio_file_path: Path to audio file
+        context: Optional AudioAnalysisContext holding the decoded audio
+
+    Returns:
+        madmom Signal at 44.1 kHz mono if a context is given, else the path
+    """
+    if context is None:
+        return audio_file_path
+    from madmom.audio.signal import Signal
+    # madmom networks are trained on 44.1 kHz mono input
+    return Signal(context.mono(44100), sample_rate=44100, num_channels=1)
+
+
 class MadmomChordDetector:
     """
     Professional chord detection using madmom's deep learning models.
@@ -56,13 +75,14 @@ class MadmomChordDetector:
 
         print("[MADMOM] Professional chord detector initialized")
 
-    def detect_chords(self, audio_file_path: str, bpm: Optional[float] = None) -> Tuple[Optional[str], float]:
+    def detect_chords(self, audio_file_path: str, bpm: Optional[float] = None, context=None) -> Tuple[Optional[str], float]:
         """
         Detect chords in an audio file with professional-grade accuracy.
 
         Args:
             audio_file_path: Path to audio file
             bpm: Known BPM (optional, will be detected if not provided)
+            context: Optional AudioAnalysisContext holding the decoded audio
 
         Returns:
             tuple: (chords_json, beat_offset)
@@ -76,14 +96,17 @@ class MadmomChordDetector:
         print(f"[MADMOM] Processing: {os.path.basename(audio_file_path)}")
 
         try:
+            # Decode once and feed the same signal to both processors
+            audio_input = _signal_input(audio_file_path, context)
+
             # Step 1: Beat tracking for timeline alignment
             print("[MADMOM] Step 1/3: Detecting beats...")
-            beat_offset, beats = self._detect_beats(audio_file_path, bpm)
+            beat_offset, beats = self._detect_beats(audio_input, bpm)
             print(f"[MADMOM] Beat offset: {beat_offset:.3f}s, {len(beats)} beats detected")
 
             # Step 2: Extract CNN chord features
             print("[MADMOM] Step 2/3: Extracting CNN chord features...")
-            chord_features = self.chord_processor(audio_file_path)
+            chord_features = self.chord_processor(audio_input)
             print(f"[MADMOM] Features shape: {chord_features.shape}")
 
             # Step 3: Recognize chords using CRF
@@ -106,12 +129,12 @@ class MadmomChordDetector:
             traceback.print_exc()
             return None, 0.0
 
-    def _detect_beats(self, audio_file_path: str, known_bpm: Optional[float] = None) -> Tuple[float, np.ndarray]:
+    def _detect_beats(self, audio_input, known_bpm: Optional[float] = None) -> Tuple[float, np.ndarray]:
         """
         Detect beats and downbeat offset using RNN beat tracker.
 
         Args:
-            audio_file_path: Path to audio file
+            audio_input: Path to audio file or decoded madmom Signal
             known_bpm: Known BPM (optional hint for better accuracy)
 
         Returns:
@@ -120,7 +143,7 @@ class MadmomChordDetector:
                 - beat_times: Array of beat times in seconds
         """
         # Process with RNN beat detector
-        beat_activations = self.beat_processor(audio_file_path)
+        beat_activations = self.beat_processor(audio_input)
 
         # Track beats with DBN
         if known_bpm:
@@ -265,13 +288,28 @@ class MadmomChordDetector:
         return merged
 
 
-def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None) -> Tuple[Optional[str], float]:
+# Shared detector: building the CNN/CRF/RNN/DBN processors loads several networks
+_detector = None
+_detector_lock = threading.Lock()
+_detect_lock = threading.Lock()
+
+def get_detector() -> MadmomChordDetector:
+    """Get the shared madmom detector, building it on first use."""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = MadmomChordDetector()
+        return _detector
+
+
+def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None, context=None) -> Tuple[Optional[str], float]:
     """
     Main entry point for chord analysis using madmom.
 
     Args:
         audio_file_path: Path to audio file
         bpm: Known BPM (optional)
+        context: Optional AudioAnalysisContext holding the decoded audio
 
     Returns:
         tuple: (chords_json, beat_offset)
@@ -281,8 +319,10 @@ def analyze_audio_file(audio_file_path: str, bpm: Optional[float] = None) -> Tup
         return None, 0.0
 
     try:
-        detector = MadmomChordDetector()
-        return detector.detect_chords(audio_file_path, bpm)
+        detector = get_detector()
+        # madmom processors are not documented as thread-safe; analyses share one instance
+        with _detect_lock:
+            return detector.detect_chords(audio_file_path, bpm, context=context)
     except Exception as e:
         print(f"[MADMOM] Analysis failed: {e}")
         import traceback
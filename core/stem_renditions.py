@@ -0,0 +1,168 @@
+"""
+Low-bitrate stem renditions for StemTubes mixers on mobile networks.
+After an extraction, a small background pool transcodes each stem into the
+configured renditions (Opus / AAC) next to the 320 kbps MP3, and the stem
+route serves the one named by the ``quality`` parameter (the mobile clients
+choose it in static/js/stem-quality.js).
+"""
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from .config import get_setting, get_ffmpeg_path
+
+# Rendition ladder: name -> file suffix, MIME type and ffmpeg output arguments
+RENDITIONS = {
+    "opus64": {
+        "suffix": ".opus64.ogg",
+        "mimetype": "audio/ogg",
+        "args": ["-c:a", "libopus", "-b:a", "64k", "-f", "ogg"],
+    },
+    "opus96": {
+        "suffix": ".opus96.ogg",
+        "mimetype": "audio/ogg",
+        "args": ["-c:a", "libopus", "-b:a", "96k", "-f", "ogg"],
+    },
+    "aac128": {
+        "suffix": ".aac128.m4a",
+        "mimetype": "audio/mp4",
+        "args": ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", "-f", "mp4"],
+    },
+}
+
+# Original stem files as written by the extractor
+ORIGINAL = "original"
+
+# Seconds allowed for one transcode before it is abandoned
+TRANSCODE_TIMEOUT = 600
+
+
+def enabled_renditions() -> list:
+    """Get the configured rendition names, in ladder order."""
+    configured = get_setting("stem_renditions", ["opus64", "opus96", "aac128"]) or []
+    return [name for name in RENDITIONS if name in configured]
+
+
+def rendition_path(stem_path: str, name: str) -> str:
+    """Get the file path of one rendition of a stem (``vocals.mp3`` -> ``vocals.opus64.ogg``)."""
+    return os.path.splitext(stem_path)[0] + RENDITIONS[name]["suffix"]
+
+
+def find_rendition(stem_path: str, name: str) -> Optional[str]:
+    """Get the path of a rendition if it exists and is newer than the stem."""
+    if name not in RENDITIONS:
+        return None
+    path = rendition_path(stem_path, name)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(stem_path):
+            return path
+    except OSError:
+        pass
+    return None
+
+
+def choose_rendition(quality: Optional[str]) -> str:
+    """Pick the rendition a client asked for.
+
+    Args:
+        quality: ``quality`` query parameter: a rendition name or "original"
+            (the default).
+
+    Returns:
+        Rendition name or ORIGINAL.
+    """
+    quality = (quality or ORIGINAL).lower()
+    return quality if quality in RENDITIONS else ORIGINAL
+
+
+class RenditionTranscoder:
+    """Background pool that writes the renditions of extracted stems."""
+
+    def __init__(self, max_workers: int = 1):
+        """Initialize the transcoder.
+
+        Args:
+            max_workers: Number of ffmpeg processes allowed to run at once.
+        """
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="rendition-worker")
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def submit(self, stem_paths: Dict[str, str], names: Optional[Iterable[str]] = None):
+        """Queue the missing renditions of some stems. Returns immediately.
+
+        Args:
+            stem_paths: Stem name -> stem file path.
+            names: Renditions to produce (default: the configured ladder).
+        """
+        names = list(names) if names is not None else enabled_renditions()
+        for stem_path in (stem_paths or {}).values():
+            for name in names:
+                if name not in RENDITIONS or find_rendition(stem_path, name):
+                    continue
+                key = (stem_path, name)
+                with self._lock:
+                    if key in self._pending:
+                        continue
+                    self._pending.add(key)
+                try:
+                    self._executor.submit(self._transcode, stem_path, name)
+                except RuntimeError:
+                    # Pool shut down
+                    with self._lock:
+                        self._pending.discard(key)
+                    return
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting work; running transcodes finish on their own."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _transcode(self, stem_path: str, name: str):
+        """Worker: write one rendition of one stem."""
+        path = rendition_path(stem_path, name)
+        tmp_path = path + ".tmp"
+        try:
+            if not os.path.exists(stem_path):
+                return
+            command = [get_ffmpeg_path(), "-y", "-hide_banner", "-loglevel", "error",
+                       "-i", stem_path, "-vn", "-map_metadata", "-1",
+                       *RENDITIONS[name]["args"], tmp_path]
+            result = subprocess.run(command, capture_output=True, text=True, timeout=TRANSCODE_TIMEOUT)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or f"ffmpeg exited with {result.returncode}")
+            os.replace(tmp_path, path)
+            print(f"🎧 [RENDITIONS] {os.path.basename(path)} ready ({os.path.getsize(path) // 1024} KB)")
+        except Exception as e:
+            print(f"⚠️ [RENDITIONS] Could not create {name} rendition of {stem_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        finally:
+            with self._lock:
+                self._pending.discard((stem_path, name))
+
+
+# Create a singleton instance
+_rendition_transcoder = None
+_rendition_transcoder_lock = threading.Lock()
+
+def get_rendition_transcoder() -> RenditionTranscoder:
+    """Get the rendition transcoder singleton instance."""
+    global _rendition_transcoder
+    with _rendition_transcoder_lock:
+        if _rendition_transcoder is None:
+            _rendition_transcoder = RenditionTranscoder(get_setting("stem_rendition_workers", 1))
+        return _rendition_transcoder
+
+
+def shutdown_rendition_transcoder():
+    """Stop the rendition transcoder if it was started."""
+    with _rendition_transcoder_lock:
+        transcoder = _rendition_transcoder
+    if transcoder is not None:
+        transcoder.shutdown()
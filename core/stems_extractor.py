@@ -5,25 +5,165 @@ Handles extraction of audio stems using Demucs models.
 import os
 import time
 import threading
-import queue
+import platform
+import types
+from collections import OrderedDict
+from collections.abc import MutableMapping
 from typing import Dict, List, Optional, Callable, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
-import tempfile
-import subprocess
-import shutil
-import platform
-import sys
 
 import torch
-import torchaudio
+import demucs.apply
 from demucs.pretrained import get_model
 from demucs.apply import apply_model
+from demucs.audio import save_audio
 from demucs.separate import load_track
 import librosa
 import numpy as np
 
 from .config import get_setting, STEM_MODELS, MODELS_DIR, get_ffmpeg_path, ensure_valid_downloads_directory, get_compatible_models, get_fallback_model
+from .extraction_scheduler import get_extraction_scheduler
+from .waveform_peaks import write_peaks_file
+from .stem_renditions import enabled_renditions, get_rendition_transcoder
+
+
+class ExtractionCancelled(Exception):
+    """Raised from the progress hook to abort a running separation."""
+
+
+# Progress hook for the separation running on the current thread
+_progress_local = threading.local()
+
+
+def _tqdm_progress(iterable, *args, **kwargs):
+    """Stand-in for ``tqdm.tqdm`` inside demucs.apply.
+
+    Reports chunk progress to the hook registered for the current thread
+    instead of drawing a terminal progress bar. Exceptions raised by the
+    hook propagate into apply_model and stop the separation.
+    """
+    items = list(iterable)
+    hook = getattr(_progress_local, "hook", None)
+    if hook is not None:
+        hook(0, len(items))
+    for index, element in enumerate(items):
+        yield element
+        if hook is not None:
+            hook(index + 1, len(items))
+
+
+# demucs.apply only uses tqdm to wrap the chunk iterator
+demucs.apply.tqdm = types.SimpleNamespace(tqdm=_tqdm_progress)
+
+_ffmpeg_path_lock = threading.Lock()
+_ffmpeg_path_configured = False
+
+
+def _ensure_ffmpeg_on_path():
+    """Make the configured FFmpeg visible to demucs' audio loader (once per process)."""
+    global _ffmpeg_path_configured
+    with _ffmpeg_path_lock:
+        if _ffmpeg_path_configured:
+            return
+
+        ffmpeg_path = get_ffmpeg_path()
+        # Ensure we have the correct ffmpeg path with ffmpeg.exe at the end on Windows
+        if platform.system() == "Windows" and not ffmpeg_path.endswith("ffmpeg.exe"):
+            ffmpeg_path = os.path.join(ffmpeg_path, "ffmpeg.exe")
+
+        ffmpeg_dir = os.path.dirname(ffmpeg_path)
+        if ffmpeg_dir and os.path.exists(ffmpeg_dir):
+            os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
+            os.environ["FFMPEG_PATH"] = ffmpeg_path
+            print(f"Using FFmpeg at: {ffmpeg_path}")
+        else:
+            print(f"FFmpeg directory not found: {ffmpeg_dir}, relying on PATH")
+
+        _ffmpeg_path_configured = True
+
+
+class DemucsModelCache:
+    """Thread-safe LRU of loaded Demucs models shared by all extractors.
+
+    Models are keyed by (model_name, device) so switching between CPU and GPU
+    never hands back weights that live on the wrong device.
+    """
+
+    def __init__(self, max_models: int = 2):
+        """Initialize the model cache.
+
+        Args:
+            max_models: Maximum number of models kept in memory.
+        """
+        self.max_models = max(1, int(max_models))
+        self._models: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def get(self, model_name: str, device: torch.device):
+        """Get a loaded model, loading it on first use.
+
+        Args:
+            model_name: Demucs model name.
+            device: Device the model should live on.
+
+        Returns:
+            Model in eval mode on the requested device.
+        """
+        key = (model_name, str(device))
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model; others wait for it
+        with load_lock:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    self._models.move_to_end(key)
+                    return model
+
+            print(f"🧠 Loading Demucs model '{model_name}' on {device}...")
+            start_time = time.time()
+            model = get_model(model_name)
+            model.to(device)
+            model.eval()
+            print(f"✓ Model '{model_name}' loaded in {time.time() - start_time:.1f}s")
+
+            with self._lock:
+                self._models[key] = model
+                evicted = False
+                while len(self._models) > self.max_models:
+                    evicted_key, _ = self._models.popitem(last=False)
+                    print(f"Evicting Demucs model '{evicted_key[0]}' ({evicted_key[1]}) from cache")
+                    evicted = True
+
+            if evicted and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+            return model
+
+    def clear(self, device: Optional[str] = None):
+        """Drop cached models.
+
+        Args:
+            device: Only drop models on this device type (e.g. "cuda"); all if None.
+        """
+        with self._lock:
+            for key in list(self._models.keys()):
+                if device is None or key[1].startswith(device):
+                    del self._models[key]
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def loaded_models(self) -> List[Tuple[str, str]]:
+        """Get the (model_name, device) pairs currently in memory, oldest first."""
+        with self._lock:
+            return list(self._models.keys())
 
 
 class ExtractionStatus(Enum):
@@ -49,7 +189,6 @@ class ExtractionItem:
     extraction_id: str = ""
     error_message: str = ""
     output_paths: Dict[str, str] = None
-    zip_path: str = None
     video_id: str = ""  # Add video_id for deduplication and persistence
     title: str = ""     # Add title for better database records
     
@@ -62,17 +201,72 @@ class ExtractionItem:
             self.output_paths = {}
 
 
+class ExtractionView(MutableMapping):
+    """Dict-like view of one extractor's queued or running jobs in the scheduler.
+
+    Deleting a queued entry removes it from the shared queue; deleting a
+    running entry cancels it.
+    """
+
+    def __init__(self, extractor: "StemsExtractor", running: bool):
+        self._extractor = extractor
+        self._running = running
+
+    def _snapshot(self) -> Dict[str, ExtractionItem]:
+        scheduler = get_extraction_scheduler()
+        if not self._running:
+            return scheduler.queued_items(self._extractor.owner_key)
+        return {
+            extraction_id: item
+            for extraction_id, item in scheduler.running_items(self._extractor.owner_key).items()
+            if item.status == ExtractionStatus.EXTRACTING
+        }
+
+    def __getitem__(self, extraction_id: str) -> ExtractionItem:
+        return self._snapshot()[extraction_id]
+
+    def __setitem__(self, extraction_id: str, item: ExtractionItem):
+        raise TypeError("Use StemsExtractor.add_extraction() to queue extractions")
+
+    def __delitem__(self, extraction_id: str):
+        item = self._snapshot()[extraction_id]
+        if self._running:
+            item.status = ExtractionStatus.CANCELLED
+        else:
+            get_extraction_scheduler().remove_queued(self._extractor.owner_key, extraction_id)
+
+    def __iter__(self):
+        return iter(self._snapshot())
+
+    def get(self, extraction_id: str, default=None):
+        return self._snapshot().get(extraction_id, default)
+
+    def items(self):
+        return self._snapshot().items()
+
+    def values(self):
+        return self._snapshot().values()
+
+    def __len__(self) -> int:
+        return len(self._snapshot())
+
+
 class StemsExtractor:
     """Manager for handling audio stem extraction."""
     
-    def __init__(self):
-        """Initialize the stems extractor."""
-        self.extraction_queue = queue.Queue()
-        self.queued_extractions: Dict[str, ExtractionItem] = {}
-        self.active_extractions: Dict[str, ExtractionItem] = {}
+    def __init__(self, owner_key: str = "default"):
+        """Initialize the stems extractor.
+
+        Args:
+            owner_key: Key of the session owning this extractor, used for
+                fair scheduling on the shared extraction pool.
+        """
+        self.owner_key = owner_key
+        # Queued and running jobs live in the shared scheduler
+        self.queued_extractions = ExtractionView(self, running=False)
+        self.active_extractions = ExtractionView(self, running=True)
         self.completed_extractions: Dict[str, ExtractionItem] = {}
         self.failed_extractions: Dict[str, ExtractionItem] = {}
-        self.running_processes: Dict[str, subprocess.Popen] = {}  # Track running subprocesses
 
         # Check if GPU is available
         self.device = torch.device("cuda" if torch.cuda.is_available() and
@@ -85,13 +279,6 @@ class StemsExtractor:
         # Ensure we have a valid downloads directory for default outputs
         self.default_output_dir = ensure_valid_downloads_directory()
 
-        # Preloaded models
-        self.models = {}
-
-        # Start extraction worker thread
-        self.worker_thread = threading.Thread(target=self._extraction_worker, daemon=True)
-        self.worker_thread.start()
-
         # Callbacks
         self.on_extraction_progress: Optional[Callable[[str, float, str], None]] = None
         self.on_extraction_complete: Optional[Callable[[str], None]] = None
@@ -177,8 +364,8 @@ class StemsExtractor:
             print(f"Falling back to default directory: {self.default_output_dir}")
             item.output_dir = self.default_output_dir
         
-        self.queued_extractions[item.extraction_id] = item
-        self.extraction_queue.put(item)
+        item.status = ExtractionStatus.QUEUED
+        get_extraction_scheduler().submit(self.owner_key, self, item)
         return item.extraction_id
     
     def cancel_extraction(self, extraction_id: str) -> bool:
@@ -193,47 +380,20 @@ class StemsExtractor:
         # Check if the extraction is active
         if extraction_id in self.active_extractions:
             item = self.active_extractions[extraction_id]
+            # The separation checks this flag between chunks and stops itself;
+            # it also drops the item out of the active view
             item.status = ExtractionStatus.CANCELLED
             
-            # Terminate the running subprocess if it exists
-            if extraction_id in self.running_processes:
-                process = self.running_processes[extraction_id]
-                try:
-                    process.terminate()
-                    # Give it a moment to terminate gracefully
-                    try:
-                        process.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        # Force kill if it doesn't terminate gracefully
-                        process.kill()
-                        process.wait()
-                except (ProcessLookupError, OSError):
-                    # Process already terminated
-                    pass
-                finally:
-                    # Remove from running processes
-                    self.running_processes.pop(extraction_id, None)
-            
-            # Move from active to failed so retry/delete can find it
-            del self.active_extractions[extraction_id]
+            # Move to failed so retry/delete can find it
             self.failed_extractions[extraction_id] = item
             
             return True
         
         # Check if the extraction is in the queue
-        if extraction_id in self.queued_extractions:
-            item = self.queued_extractions[extraction_id]
+        item = get_extraction_scheduler().remove_queued(self.owner_key, extraction_id)
+        if item:
             item.status = ExtractionStatus.CANCELLED
-            del self.queued_extractions[extraction_id]
             self.failed_extractions[extraction_id] = item
-            # Remove from queue as well
-            temp_items = []
-            for _ in range(self.extraction_queue.qsize()):
-                queued_item = self.extraction_queue.get()
-                if queued_item.extraction_id != extraction_id:
-                    temp_items.append(queued_item)
-            for queued_item in temp_items:
-                self.extraction_queue.put(queued_item)
             return True
         
         return False
@@ -285,10 +445,10 @@ class StemsExtractor:
             Dictionary containing extraction information or None if no active extraction.
         """
         # Check if there's an active extraction
-        if self.active_extractions:
+        active = list(self.active_extractions.items())
+        if active:
             # Get the most recent active extraction
-            extraction_id = list(self.active_extractions.keys())[0]
-            item = self.active_extractions[extraction_id]
+            extraction_id, item = active[0]
             return {
                 "extraction_id": extraction_id,
                 "progress": item.progress,
@@ -300,45 +460,19 @@ class StemsExtractor:
         # No active extraction
         return None
         
-    def _extraction_worker(self):
-        """Worker thread for processing extractions."""
-        while True:
-            # Check if we can start a new extraction
-            if len(self.active_extractions) >= 1 and not self.using_gpu:
-                # Only allow one extraction at a time on CPU
-                time.sleep(1)
-                continue
-            
-            try:
-                # Get the next extraction item
-                item = self.extraction_queue.get(block=False)
-                
-                # Remove from queued extractions
-                if item.extraction_id in self.queued_extractions:
-                    del self.queued_extractions[item.extraction_id]
-                
-                # Check if the extraction was cancelled
-                if item.status == ExtractionStatus.CANCELLED:
-                    self.failed_extractions[item.extraction_id] = item
-                    self.extraction_queue.task_done()
-                    continue
-                
-                # Start the extraction
-                self._start_extraction(item)
-                
-            except queue.Empty:
-                # No extractions in the queue
-                time.sleep(1)
-    
-    def _start_extraction(self, item: ExtractionItem):
-        """Start an extraction.
+    def _run_extraction(self, item: ExtractionItem):
+        """Run an extraction on the calling scheduler worker thread.
         
         Args:
-            item: Extraction item to start.
+            item: Extraction item to run.
         """
+        # Check if the extraction was cancelled while queued
+        if item.status == ExtractionStatus.CANCELLED:
+            self.failed_extractions[item.extraction_id] = item
+            return
+        
         # Update status
         item.status = ExtractionStatus.EXTRACTING
-        self.active_extractions[item.extraction_id] = item
         
         # Notify extraction start
         if self.on_extraction_start:
@@ -347,13 +481,7 @@ class StemsExtractor:
         # Create output directory if it doesn't exist
         os.makedirs(item.output_dir, exist_ok=True)
         
-        # Start extraction in a separate thread
-        extraction_thread = threading.Thread(
-            target=self._extraction_thread,
-            args=(item,),
-            daemon=True
-        )
-        extraction_thread.start()
+        self._process_extraction(item)
     
     def _on_extraction_progress(self, extraction_id: str, progress: float, status_message: str = None):
         """Handle extraction progress update from worker thread.
@@ -363,8 +491,8 @@ class StemsExtractor:
             progress: Extraction progress.
             status_message: Optional status message.
         """
-        # Find extraction item
-        item = self.active_extractions.get(extraction_id)
+        # Find extraction item (also while it is finishing, whatever its status)
+        item = get_extraction_scheduler().running_items(self.owner_key).get(extraction_id)
         if not item:
             return
 
@@ -377,438 +505,120 @@ class StemsExtractor:
             # Pass video_id and title directly so callback doesn't need to look up the item
             self.on_extraction_progress(extraction_id, progress, status, item.video_id, item.title)
     
-    def _extraction_thread(self, item: ExtractionItem):
-        """Thread for extracting stems.
-        
+    def _get_extraction_timeout(self, model_name: str) -> float:
+        """Get the maximum wall time allowed for an extraction.
+
+        Args:
+            model_name: Name of the model used for the extraction.
+
+        Returns:
+            Timeout in seconds, adjusted for model complexity.
+        """
+        base_extraction_timeout = get_setting("extraction_timeout_minutes", 30)
+
+        if model_name == "htdemucs_6s":
+            # 6-stem model takes longer
+            return base_extraction_timeout * 1.5 * 60
+        if "ft" in model_name.lower():
+            # Fine-tuned models are bags of several models
+            return base_extraction_timeout * 1.2 * 60
+        return base_extraction_timeout * 60
+
+    def _process_extraction(self, item: ExtractionItem):
+        """Extract stems for one item.
+
+        Separation runs in-process on a model taken from the shared model cache,
+        so only the first extraction with a given model pays for loading weights.
+
         Args:
             item: Extraction item.
         """
         try:
-            # Create temporary directory for extraction outside Flask's watch directories
-            # Use system temp directory to avoid Flask auto-reload issues
-            system_temp_dir = tempfile.gettempdir()
-            temp_dir = tempfile.mkdtemp(prefix="demucs_extraction_", dir=system_temp_dir)
+            if not os.path.exists(item.audio_path):
+                raise FileNotFoundError(f"Source audio file not found: {item.audio_path}")
 
-            try:
-                # Get FFmpeg path for setting environment variables
-                ffmpeg_path = get_ffmpeg_path()
-                ffmpeg_dir = os.path.dirname(ffmpeg_path)
-                
-                # Ensure we have the correct ffmpeg path with ffmpeg.exe at the end on Windows
-                if platform.system() == "Windows" and not ffmpeg_path.endswith("ffmpeg.exe"):
-                    ffmpeg_path = os.path.join(ffmpeg_path, "ffmpeg.exe")
-                    
-                # Print FFmpeg information before setting up environment
-                print(f"FFmpeg path: {ffmpeg_path}")
-                print(f"FFmpeg exists: {os.path.exists(ffmpeg_path)}")
-
-                # Configure environment variables for FFmpeg
-                env = os.environ.copy()
-                
-                # Add FFmpeg directory to PATH and set FFMPEG_PATH
-                if os.path.exists(ffmpeg_dir):
-                    # On Windows, PATH separator is semicolon
-                    if platform.system() == "Windows":
-                        env["PATH"] = ffmpeg_dir + ";" + env.get("PATH", "")
-                    else:
-                        # On Unix-like systems, PATH separator is colon
-                        env["PATH"] = ffmpeg_dir + ":" + env.get("PATH", "")
-                    
-                    # Set explicit FFMPEG_PATH environment variable directly to the ffmpeg executable
-                    env["FFMPEG_PATH"] = ffmpeg_path
-                    print(f"Using FFmpeg at: {ffmpeg_path}")
-                    print(f"PATH environment: {env['PATH']}")
-                    
-                    # Verify FFmpeg is accessible
-                    try:
-                        result = subprocess.run(
-                            [ffmpeg_path, "-version"],
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            text=True,
-                            env=env,
-                            check=False
-                        )
-                        if result.returncode == 0:
-                            print(f"FFmpeg verification successful: {result.stdout.splitlines()[0]}")
-                        else:
-                            print(f"FFmpeg verification failed: {result.stderr}")
-                    except Exception as e:
-                        print(f"Error verifying FFmpeg: {e}")
-                else:
-                    print(f"FFmpeg directory not found: {ffmpeg_dir}")
-                
-                # Instead of running demucs directly, use our wrapper script
-                # to ensure environment variables are correctly set
-                cmd = [
-                    sys.executable,
-                    os.path.join(os.path.dirname(os.path.abspath(__file__)), "wrap_demucs.py"),
-                    ffmpeg_path,  # First arg to wrapper is FFmpeg path
-                    '--mp3',                  # Output as MP3
-                    '--mp3-bitrate', '320',   # High quality MP3
-                    '-v',                     # Verbose output for progress tracking
-                    '-n', item.model_name,    # Model name
-                    '-o', temp_dir            # Output to temp directory
-                ]
-                
-                # Add device (GPU or CPU)
-                if self.device.type == 'cuda':
-                    cmd.extend(['-d', 'cuda'])
-                else:
-                    cmd.extend(['-d', 'cpu'])
-                
-                # Add two stem mode if needed
-                if item.two_stem_mode and item.primary_stem:
-                    cmd.extend(['--two-stems', item.primary_stem])
-                
-                # Add audio file at the end (use the temporary file if available)
-                temp_audio_path = None
-                try:
-                    # Get the extension of the original file
-                    _, ext = os.path.splitext(item.audio_path)
-                    
-                    # Create a temporary file with a simple name
-                    temp_audio_path = os.path.join(temp_dir, f"input{ext}")
-                    
-                    # Verify that the source directory exists
-                    if not os.path.exists(item.audio_path):
-                        raise FileNotFoundError(f"Source audio file not found: {item.audio_path}")
-                    
-                    # Copy the audio file to the temporary file
-                    print(f"Copying audio file to temporary location: {temp_audio_path}")
-                    shutil.copy2(item.audio_path, temp_audio_path)
-                    
-                    # Use the temporary file for extraction
-                    audio_path_for_extraction = temp_audio_path
-                    print(f"Using temporary audio file: {audio_path_for_extraction}")
-                except Exception as e:
-                    print(f"Error creating temporary audio file: {e}")
-                    # In case of error, use the original file but with quotes
-                    audio_path_for_extraction = item.audio_path
-                    print(f"Falling back to original audio file: {audio_path_for_extraction}")
-                
-                # Add audio file to the command
-                if temp_audio_path and os.path.exists(temp_audio_path):
-                    cmd.append(temp_audio_path)
-                else:
-                    cmd.append(audio_path_for_extraction)
-                
-                # Print the command for debugging
-                print(f"Running command: {' '.join(cmd)}")
-                
-                # Run demucs.separate as a subprocess
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1,
-                    universal_newlines=True,
-                    env=env  # Use the environment with FFmpeg configured
-                )
-                
-                # Store the process reference for cancellation
-                self.running_processes[item.extraction_id] = process
-                
-                # Store output lines for error reporting
-                output_lines = []
-                
-                # Process output to update progress with timeout safeguards
-                import time
-                import select
-                last_progress_time = time.time()
-
-                # Get configurable timeouts with model-specific adjustments
-                base_progress_timeout = get_setting("extraction_progress_timeout_minutes", 5)
-                base_extraction_timeout = get_setting("extraction_timeout_minutes", 30)
-
-                # Adjust timeouts based on model complexity
-                if item.model_name == "htdemucs_6s":
-                    # 6-stem model takes longer
-                    progress_timeout = base_progress_timeout * 2 * 60  # Double timeout for 6-stem
-                    max_extraction_time = base_extraction_timeout * 1.5 * 60  # 50% more time
-                elif "ft" in item.model_name.lower():
-                    # Fine-tuned models may be slower
-                    progress_timeout = base_progress_timeout * 1.5 * 60  # 50% more time for progress
-                    max_extraction_time = base_extraction_timeout * 1.2 * 60  # 20% more total time
-                else:
-                    # Standard timeouts for basic models
-                    progress_timeout = base_progress_timeout * 60
-                    max_extraction_time = base_extraction_timeout * 60
-
-                print(f"🕐 Extraction timeouts for {item.model_name}: {max_extraction_time/60:.1f}min total, {progress_timeout/60:.1f}min progress")
-
-                extraction_start_time = time.time()
-                last_progress_value = 0
-                stuck_progress_count = 0
-
-                while True:
-                    # Check timeouts
-                    current_time = time.time()
-
-                    # Check total extraction timeout
-                    if current_time - extraction_start_time > max_extraction_time:
-                        print(f"❌ Extraction timeout after {max_extraction_time} seconds")
-                        process.terminate()
-                        try:
-                            process.wait(timeout=5)
-                        except subprocess.TimeoutExpired:
-                            process.kill()
-                            process.wait()
-                        raise TimeoutError(f"Extraction timed out after {max_extraction_time} seconds")
-
-                    # Check if extraction was cancelled
-                    if item.status == ExtractionStatus.CANCELLED:
-                        print(f"Extraction {item.extraction_id} was cancelled, terminating process")
-                        try:
-                            process.terminate()
-                            process.wait(timeout=2)
-                        except subprocess.TimeoutExpired:
-                            process.kill()
-                            process.wait()
-                        except (ProcessLookupError, OSError):
-                            pass
-                        break
-
-                    # Check if process has finished
-                    if process.poll() is not None:
-                        # Read any remaining output
-                        remaining_output = process.stdout.read()
-                        if remaining_output:
-                            output_lines.extend(remaining_output.split('\n'))
-                        break
-
-                    # Read output with timeout
-                    try:
-                        line = process.stdout.readline()
-                        if not line:
-                            # No more output, but process still running - check progress timeout
-                            if current_time - last_progress_time > progress_timeout:
-                                print(f"❌ No progress for {progress_timeout} seconds, terminating")
-                                process.terminate()
-                                try:
-                                    process.wait(timeout=5)
-                                except subprocess.TimeoutExpired:
-                                    process.kill()
-                                    process.wait()
-                                raise TimeoutError(f"No progress for {progress_timeout} seconds")
-                            time.sleep(0.1)  # Small delay before checking again
-                            continue
-
-                        output_line = line.strip()
-                        if output_line:
-                            print(f"Demucs output: {output_line}")
-                            output_lines.append(output_line)
-
-                        # Update progress based on output
-                        if '%' in line:
-                            try:
-                                # Try to parse progress percentage
-                                percent_str = line.split('%')[0].split('|')[-1].strip()
-                                if ':' in percent_str:
-                                    percent_str = percent_str.split(':')[-1].strip()
-
-                                # Don't cap at 90% - allow full progress
-                                progress_value = float(percent_str)
-
-                                # Check for stuck progress
-                                if abs(progress_value - last_progress_value) < 0.1:
-                                    stuck_progress_count += 1
-                                    if stuck_progress_count > 50:  # Same progress 50 times
-                                        print(f"⚠️ Progress appears stuck at {progress_value}%")
-                                        # Continue but don't timeout yet - Demucs can be slow
-                                else:
-                                    stuck_progress_count = 0
-                                    last_progress_time = current_time
-                                    last_progress_value = progress_value
-
-                                item.progress = min(progress_value, 99.0)  # Cap at 99% until completion
-
-                                # Notify progress
-                                self._on_extraction_progress(item.extraction_id, item.progress)
-                            except (ValueError, IndexError):
-                                pass
-
-                    except Exception as e:
-                        print(f"Error reading process output: {e}")
-                        break
-                
-                # Wait for process to complete
-                return_code = process.wait()
-
-                # Update progress to completion if successful
-                if return_code == 0 and item.status != ExtractionStatus.CANCELLED:
-                    item.progress = 95.0  # Set to 95% before file operations
-                    self._on_extraction_progress(item.extraction_id, item.progress)
-                
-                # Clean up process reference
-                self.running_processes.pop(item.extraction_id, None)
-                
-                # Check if extraction was cancelled
+            max_extraction_time = self._get_extraction_timeout(item.model_name)
+            print(f"🕐 Extraction timeout for {item.model_name}: {max_extraction_time/60:.1f}min total")
+            extraction_start_time = time.time()
+
+            def on_separation_progress(fraction: float):
+                # Called between Demucs chunks: abort here on cancel or timeout
                 if item.status == ExtractionStatus.CANCELLED:
-                    print(f"Extraction {item.extraction_id} was cancelled")
-                    # Move to failed extractions (only if not already moved)
-                    if item.extraction_id in self.active_extractions:
-                        del self.active_extractions[item.extraction_id]
-                        self.failed_extractions[item.extraction_id] = item
-                    # Ensure it's in failed_extractions
-                    elif item.extraction_id not in self.failed_extractions:
-                        self.failed_extractions[item.extraction_id] = item
-                    # Notify cancellation
-                    if self.on_extraction_error:
-                        self.on_extraction_error(item.extraction_id, "Extraction cancelled by user")
-                    return
-                
-                if return_code != 0:
-                    # Join the last 20 lines of output for error reporting
-                    error_output = "\n".join(output_lines[-20:]) if output_lines else "No output captured"
-                    raise Exception(f"Demucs exited with code {return_code}. Output:\n{error_output}")
-                
-                # Indicate that we are now in finalization phase
-                item.progress = 90.0
-                self._on_extraction_progress(item.extraction_id, item.progress, "Finalization in progress...")
-                
-                # Copy extracted stems from temp directory to final destination
-                model_dir = os.path.join(temp_dir, item.model_name)
-                if not os.path.exists(model_dir):
-                    raise FileNotFoundError(f"Expected output directory not found: {model_dir}")
-                
-                # Find track directory (should be only one)
-                track_dirs = [d for d in os.listdir(model_dir) if os.path.isdir(os.path.join(model_dir, d))]
-                if not track_dirs:
-                    raise FileNotFoundError(f"No track directories found in {model_dir}")
-                
-                track_dir = os.path.join(model_dir, track_dirs[0])
-                
-                # Create output directory if it doesn't exist
-                os.makedirs(item.output_dir, exist_ok=True)
-                
-                # Copy each stem file to final destination
-                stem_files = {}
-
-                # Determine expected stems based on model
-                if item.model_name == "htdemucs_6s":
-                    default_stems = ["vocals", "drums", "bass", "guitar", "piano", "other"]
-                else:
-                    default_stems = ["vocals", "drums", "bass", "other"]
-
-                stems_to_process = item.selected_stems if item.selected_stems else default_stems
-                total_stems = len(stems_to_process)
-
-                for i, stem in enumerate(stems_to_process):
-                    # Update progress during file copying (from 90% to 99%)
-                    progress = 90.0 + (i / total_stems) * 9.0
-                    item.progress = progress
-                    self._on_extraction_progress(item.extraction_id, progress, f"Copying {stem}...")
-                    
-                    # Check if the stem is selected or if all stems are selected
-                    if not item.selected_stems or stem in item.selected_stems:
-                        stem_file_mp3 = os.path.join(track_dir, f"{stem}.mp3")
-                        stem_file_wav = os.path.join(track_dir, f"{stem}.wav")
-                        
-                        if os.path.exists(stem_file_mp3):
-                            output_file = os.path.join(item.output_dir, f"{stem}.mp3")
-                            shutil.copy2(stem_file_mp3, output_file)
-
-                            # Analyze audio content to determine if it's meaningful (if feature is enabled)
-                            if get_setting("enable_silent_stem_detection", True):
-                                threshold_db = get_setting("silent_stem_threshold_db", -40.0)
-                                min_duration_ratio = get_setting("silent_stem_min_duration_ratio", 0.05)
-                                has_meaningful_content = self._analyze_audio_content(output_file, threshold_db, min_duration_ratio)
-                            else:
-                                # If analysis is disabled, include all stems
-                                has_meaningful_content = True
-
-                            if has_meaningful_content:
-                                # Only include stems with meaningful content
-                                stem_files[stem] = output_file
-                                print(f"✓ Stem '{stem}' added to mixer (has meaningful content)")
-                            else:
-                                # Keep the file on disk for debugging but don't include in mixer
-                                print(f"✗ Stem '{stem}' excluded from mixer (mostly silent/empty)")
-
-                        elif os.path.exists(stem_file_wav):
-                            output_file = os.path.join(item.output_dir, f"{stem}.wav")
-                            shutil.copy2(stem_file_wav, output_file)
-
-                            # Analyze audio content to determine if it's meaningful (if feature is enabled)
-                            if get_setting("enable_silent_stem_detection", True):
-                                threshold_db = get_setting("silent_stem_threshold_db", -40.0)
-                                min_duration_ratio = get_setting("silent_stem_min_duration_ratio", 0.05)
-                                has_meaningful_content = self._analyze_audio_content(output_file, threshold_db, min_duration_ratio)
-                            else:
-                                # If analysis is disabled, include all stems
-                                has_meaningful_content = True
-
-                            if has_meaningful_content:
-                                # Only include stems with meaningful content
-                                stem_files[stem] = output_file
-                                print(f"✓ Stem '{stem}' added to mixer (has meaningful content)")
-                            else:
-                                # Keep the file on disk for debugging but don't include in mixer
-                                print(f"✗ Stem '{stem}' excluded from mixer (mostly silent/empty)")
-                
-                # Maintain progress at 99% during finalization
-                item.progress = 99.0
-                self._on_extraction_progress(item.extraction_id, 99.0, "Finalizing...")
-
-                # Log stem analysis results
-                if get_setting("enable_silent_stem_detection", True):
-                    print(f"Stem analysis complete: {len(stem_files)}/{total_stems} stems have meaningful content")
-                else:
-                    print(f"Silent stem detection disabled - all {len(stem_files)} stems included")
-
-                # Save stem file paths
-                item.output_paths = stem_files
-                
-                # Create ZIP archive of all stems
-                zip_path = self._create_zip_archive(item, os.path.splitext(os.path.basename(item.audio_path))[0])
-                if zip_path:
-                    item.zip_path = zip_path
-                
-                # Update status
-                item.status = ExtractionStatus.COMPLETED
-                item.progress = 100.0
-                
-                # Send explicit notification that we have reached 100%
-                self._on_extraction_progress(item.extraction_id, 100.0, "Extraction completed")
-                
-                # Move from active to completed
-                del self.active_extractions[item.extraction_id]
-                self.completed_extractions[item.extraction_id] = item
-                
-                # Notify extraction complete
-                if self.on_extraction_complete:
-                    # Pass the complete item data to avoid retrieval issues
-                    self.on_extraction_complete(item.extraction_id, item.title, item.video_id, item)
-            
-            finally:
-                # Clean up temporary directory
-                try:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                except:
-                    pass
+                    raise ExtractionCancelled(item.extraction_id)
+                if time.time() - extraction_start_time > max_extraction_time:
+                    raise TimeoutError(f"Extraction timed out after {max_extraction_time} seconds")
 
-        except Exception as e:
-            # Clean up process reference
-            self.running_processes.pop(item.extraction_id, None)
+                # Separation covers 0-90%, saving stems covers 90-99%
+                item.progress = min(fraction * 90.0, 89.0)
+                self._on_extraction_progress(item.extraction_id, item.progress)
+
+            self._on_extraction_progress(item.extraction_id, 0.0, "Loading model...")
+            model = self._load_model(item.model_name)
+
+            self._on_extraction_progress(item.extraction_id, 0.0, "Loading audio...")
+            audio, sr = self._load_audio(item.audio_path, model)
+
+            stems = self._extract_stems(model, audio, sr, item, on_separation_progress)
+            del audio
+
+            if item.status == ExtractionStatus.CANCELLED:
+                raise ExtractionCancelled(item.extraction_id)
+
+            # Indicate that we are now in finalization phase
+            item.progress = 90.0
+            self._on_extraction_progress(item.extraction_id, item.progress, "Finalization in progress...")
+
+            self._save_stems(stems, sr, item)
+            del stems
+
+            # Maintain progress at 99% during finalization
+            item.progress = 99.0
+            self._on_extraction_progress(item.extraction_id, 99.0, "Finalizing...")
+
+            # No ZIP here: /api/extractions/<id>/stems.zip streams one on request
+            if not item.output_paths:
+                print("No meaningful stems found")
+
+            # Low-bitrate renditions for mobile mixers are transcoded in the background
+            if item.output_paths and enabled_renditions():
+                get_rendition_transcoder().submit(item.output_paths)
 
+            # Update status
+            item.status = ExtractionStatus.COMPLETED
+            item.progress = 100.0
+
+            # Send explicit notification that we have reached 100%
+            self._on_extraction_progress(item.extraction_id, 100.0, "Extraction completed")
+
+            # Move to completed (the status change drops it from the active view)
+            self.completed_extractions[item.extraction_id] = item
+
+            # Notify extraction complete
+            if self.on_extraction_complete:
+                # Pass the complete item data to avoid retrieval issues
+                self.on_extraction_complete(item.extraction_id, item.title, item.video_id, item)
+
+        except ExtractionCancelled:
+            print(f"Extraction {item.extraction_id} was cancelled")
+            # Move to failed extractions (cancel_extraction may already have done it)
+            self.failed_extractions[item.extraction_id] = item
+            # Notify cancellation
+            if self.on_extraction_error:
+                self.on_extraction_error(item.extraction_id, "Extraction cancelled by user")
+
+        except Exception as e:
             # Update status
             item.status = ExtractionStatus.FAILED
             item.error_message = str(e)
+            print(f"❌ Extraction {item.extraction_id} failed: {e}")
 
-            # Move from active to failed
-            del self.active_extractions[item.extraction_id]
+            # Move to failed
             self.failed_extractions[item.extraction_id] = item
 
             # Notify extraction error
             if self.on_extraction_error:
                 self.on_extraction_error(item.extraction_id, str(e))
 
-        finally:
-            # Mark the task as done
-            self.extraction_queue.task_done()
-    
     def _validate_and_get_model(self, model_name: str) -> str:
         """Validate model compatibility and return working model name.
 
@@ -844,6 +654,9 @@ class StemsExtractor:
     def _load_model(self, model_name: str):
         """Load a Demucs model with compatibility checking.
 
+        Models come from the process-wide model cache, so repeated extractions
+        reuse the weights that are already on the device.
+
         Args:
             model_name: Name of the model to load.
 
@@ -853,22 +666,12 @@ class StemsExtractor:
         # Validate and get compatible model
         validated_model = self._validate_and_get_model(model_name)
 
-        if validated_model in self.models:
-            return self.models[validated_model]
-
         # Check if model exists in STEM_MODELS
         if validated_model not in STEM_MODELS:
             raise ValueError(f"Model '{validated_model}' not found")
 
         try:
-            # Load model
-            model = get_model(validated_model)
-            model.to(self.device)
-
-            # Cache model
-            self.models[validated_model] = model
-
-            return model
+            return get_model_cache().get(validated_model, self.device)
         except Exception as e:
             if "diffq" in str(e).lower():
                 print(f"❌ Model '{validated_model}' failed due to missing diffq dependency")
@@ -877,146 +680,124 @@ class StemsExtractor:
                 if fallback_model != validated_model:
                     return self._load_model(fallback_model)
             raise e
-    
-    def _load_audio(self, audio_path: str) -> Tuple[torch.Tensor, int]:
-        """Load audio from file.
-        
+
+    def _load_audio(self, audio_path: str, model) -> Tuple[torch.Tensor, int]:
+        """Load audio from file at the model's sample rate and channel count.
+
         Args:
             audio_path: Path to audio file.
-            
+            model: Demucs model the audio will be fed to.
+
         Returns:
-            Tuple of audio tensor and sample rate.
+            Tuple of audio tensor (channels, samples) and sample rate.
         """
-        # Check file extension
-        file_ext = os.path.splitext(audio_path)[1].lower()
-        
-        # If not MP3, convert to MP3 first
-        if file_ext != '.mp3':
-            try:
-                # Get FFmpeg path
-                ffmpeg_path = get_ffmpeg_path()
-                
-                # Create a temporary MP3 file
-                temp_mp3_path = os.path.splitext(audio_path)[0] + '_temp.mp3'
-                
-                # Convert to MP3 using FFmpeg
-                import subprocess
-                cmd = [
-                    ffmpeg_path,
-                    '-i', audio_path,
-                    '-vn',  # No video
-                    '-ar', '44100',  # Sample rate
-                    '-ac', '2',  # Stereo
-                    '-b:a', '192k',  # Bitrate
-                    '-f', 'mp3',  # Format
-                    temp_mp3_path
-                ]
-                
-                # Run FFmpeg
-                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                # Use the converted file
-                audio_path = temp_mp3_path
-                
-            except Exception as e:
-                print(f"Error converting audio file: {e}")
-                # Continue with original file if conversion fails
-        
+        _ensure_ffmpeg_on_path()
+
         try:
-            # First load the audio to get the sample rate
-            waveform, sample_rate = torchaudio.load(audio_path)
-            
-            # Use demucs.separate.load_track with the sample rate
-
-            audio, sr = load_track(audio_path, sample_rate, self.device)
-
-            # Clean up temporary file if it exists
-            temp_mp3_path = os.path.splitext(audio_path)[0] + '_temp.mp3'
-            if os.path.exists(temp_mp3_path) and temp_mp3_path != audio_path:
-                try:
-                    os.remove(temp_mp3_path)
-                except:
-                    pass
-                
-            return audio, sr
-        except Exception as e:
+            # load_track decodes through FFmpeg and resamples in one pass
+            audio = load_track(audio_path, model.audio_channels, model.samplerate)
+        except (Exception, SystemExit) as e:
+            # demucs calls sys.exit() when no backend can decode the file
             raise Exception(f"Failed to load audio file: {e}")
-    
-    def _extract_stems(self, model, audio: torch.Tensor, sr: int, item: ExtractionItem) -> Dict[str, torch.Tensor]:
+
+        return audio, model.samplerate
+
+    def _extract_stems(self, model, audio: torch.Tensor, sr: int, item: ExtractionItem,
+                       progress_callback: Optional[Callable[[float], None]] = None) -> Dict[str, torch.Tensor]:
         """Extract stems from audio.
-        
+
         Args:
             model: Demucs model.
-            audio: Audio tensor.
+            audio: Audio tensor (channels, samples).
             sr: Sample rate.
             item: Extraction item.
-            
+            progress_callback: Called with the separation progress (0.0-1.0)
+                between chunks. May raise to abort the separation.
+
         Returns:
             Dictionary of stem name to audio tensor.
         """
         # Get available stems for the model
-        model_info = STEM_MODELS.get(item.model_name, {})
-        available_stems = model_info.get("stems", [])
-        
+        available_stems = list(model.sources)
+
         # Filter selected stems
-        selected_stems = [s for s in item.selected_stems if s in available_stems]
+        selected_stems = [s for s in (item.selected_stems or []) if s in available_stems]
         if not selected_stems:
             selected_stems = available_stems
-        
+
+        # Bags of models (e.g. htdemucs_ft) run one progress pass per sub-model
+        passes = max(1, len(getattr(model, "models", [model])))
+        state = {"pass": -1}
+
+        def on_chunk(done: int, total: int):
+            if progress_callback is None:
+                return
+            if done == 0:
+                state["pass"] = min(state["pass"] + 1, passes - 1)
+            fraction = (max(state["pass"], 0) + (done / total if total else 1.0)) / passes
+            progress_callback(fraction)
+
+        # Normalize like demucs.separate does
+        ref = audio.mean(0)
+        mean, std = ref.mean(), ref.std()
+        audio = (audio - mean) / (std + 1e-8)
+
         # Apply model to extract stems
-        sources = apply_model(model, audio, self.device, progress=True)
-        
-        # Create dictionary of stems
-        stems = {}
-        for i, source_name in enumerate(model.sources):
-            if source_name in selected_stems:
-                stems[source_name] = sources[:, i]
-                
-                # Update progress
-                progress = (i + 1) / len(model.sources) * 100
-                item.progress = progress
-                
-                # Notify progress
-                self._on_extraction_progress(item.extraction_id, progress)
-        
-        # Handle two-stem mode
-        if item.two_stem_mode and item.primary_stem in stems:
-            # Create a mix of all other stems
-            other_stems = torch.zeros_like(stems[item.primary_stem])
-            for name, source in stems.items():
-                if name != item.primary_stem:
-                    other_stems += source
-            
-            # Keep only primary stem and "other"
-            stems = {
-                item.primary_stem: stems[item.primary_stem],
-                "other": other_stems
+        _progress_local.hook = on_chunk
+        try:
+            with torch.no_grad():
+                sources = apply_model(model, audio[None], device=self.device, shifts=1,
+                                      split=True, overlap=0.25, progress=True)[0]
+        finally:
+            _progress_local.hook = None
+
+        sources = sources * (std + 1e-8) + mean
+
+        # Handle two-stem mode the way `demucs --two-stems` does
+        if item.two_stem_mode and item.primary_stem in available_stems:
+            primary_index = available_stems.index(item.primary_stem)
+            primary = sources[primary_index]
+            return {
+                item.primary_stem: primary,
+                f"no_{item.primary_stem}": sources.sum(0) - primary
             }
-        
-        return stems
-    
+
+        # Create dictionary of stems
+        return {
+            source_name: sources[i]
+            for i, source_name in enumerate(available_stems)
+            if source_name in selected_stems
+        }
+
     def _save_stems(self, stems: Dict[str, torch.Tensor], sr: int, item: ExtractionItem):
         """Save stems to files.
-        
+
         Args:
             stems: Dictionary of stem name to audio tensor.
             sr: Sample rate.
             item: Extraction item.
         """
-        # Get base filename without extension
-        base_name = os.path.splitext(os.path.basename(item.audio_path))[0]
-        
         # Ensure output directory exists
         os.makedirs(item.output_dir, exist_ok=True)
-        
+
         # Save each stem and analyze content
         analyzed_stems = {}
-        for stem_name, audio in stems.items():
-            # Create output path
-            output_path = os.path.join(item.output_dir, f"{base_name}_{stem_name}.wav")
-
-            # Save audio file
-            torchaudio.save(output_path, audio.cpu(), sr)
+        total_stems = len(stems)
+        for i, (stem_name, audio) in enumerate(stems.items()):
+            # Update progress during saving (from 90% to 99%)
+            progress = 90.0 + (i / total_stems) * 9.0
+            item.progress = progress
+            self._on_extraction_progress(item.extraction_id, progress, f"Saving {stem_name}...")
+
+            # Same file layout and encoding as the demucs CLI (--mp3 --mp3-bitrate 320)
+            output_path = os.path.join(item.output_dir, f"{stem_name}.mp3")
+            save_audio(audio.cpu(), output_path, samplerate=sr, bitrate=320, clip="rescale")
+
+            # Waveform peaks for the mixer, from the samples already in memory
+            try:
+                write_peaks_file(output_path, audio.cpu().numpy(), sr)
+            except Exception as e:
+                print(f"⚠️ Could not write waveform peaks for '{stem_name}': {e}")
 
             # Analyze audio content to determine if it's meaningful (if feature is enabled)
             if get_setting("enable_silent_stem_detection", True):
@@ -1037,46 +818,10 @@ class StemsExtractor:
                 print(f"✗ Stem '{stem_name}' excluded from mixer (mostly silent/empty)")
 
         if get_setting("enable_silent_stem_detection", True):
-            print(f"Stem analysis complete: {len(analyzed_stems)}/{len(stems)} stems have meaningful content")
+            print(f"Stem analysis complete: {len(analyzed_stems)}/{total_stems} stems have meaningful content")
         else:
             print(f"Silent stem detection disabled - all {len(analyzed_stems)} stems included")
-        
-        # Create ZIP archive of meaningful stems only
-        if analyzed_stems:
-            zip_path = self._create_zip_archive(item, base_name)
-            if zip_path:
-                item.zip_path = zip_path
-        else:
-            print("No meaningful stems found, skipping ZIP creation")
-    
-    def _create_zip_archive(self, item: ExtractionItem, base_name: str) -> str:
-        """Create a ZIP archive of extracted stems.
-        
-        Args:
-            item: Extraction item.
-            base_name: Base filename without extension.
-            
-        Returns:
-            Path to the created ZIP archive, or None if creation failed.
-        """
-        try:
-            import zipfile
-            
-            # Create ZIP file path
-            zip_path = os.path.join(item.output_dir, f"{base_name}_stems.zip")
-            
-            # Create ZIP file
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for stem_name, file_path in item.output_paths.items():
-                    # Add file to ZIP
-                    zipf.write(file_path, os.path.basename(file_path))
-            
-            print(f"Created ZIP archive: {zip_path}")
-            return zip_path
-        except Exception as e:
-            print(f"Error creating ZIP archive: {e}")
-            return None
-    
+
     def is_using_gpu(self) -> bool:
         """Check if GPU is being used for extraction.
         
@@ -1096,8 +841,9 @@ class StemsExtractor:
             self.using_gpu = use_gpu
             self.device = torch.device("cuda" if use_gpu else "cpu")
             
-            # Clear model cache to reload models on the new device
-            self.models.clear()
+            # Free GPU memory held by cached models when moving back to CPU
+            if not use_gpu:
+                get_model_cache().clear(device="cuda")
 
 
 # Create a singleton instance
@@ -1109,3 +855,16 @@ def get_stems_extractor() -> StemsExtractor:
     if _stems_extractor is None:
         _stems_extractor = StemsExtractor()
     return _stems_extractor
+
+
+# Shared model cache
+_model_cache = None
+_model_cache_lock = threading.Lock()
+
+def get_model_cache() -> DemucsModelCache:
+    """Get the process-wide Demucs model cache."""
+    global _model_cache
+    with _model_cache_lock:
+        if _model_cache is None:
+            _model_cache = DemucsModelCache(get_setting("max_cached_stem_models", 2))
+        return _model_cache
@@ -0,0 +1,125 @@
+"""
+Streaming ZIP archives of stem files.
+Stems are already-compressed MP3s, so they are stored (no DEFLATE) and the
+archive is generated chunk by chunk while the client downloads it: nothing
+is written to disk, CRC-32s are computed on the fly and sent in data
+descriptors after each entry, and the total size is known up front.
+"""
+import os
+import struct
+import time
+import zlib
+from typing import Iterator, List, Tuple
+
+# Bytes read from a stem file per chunk
+CHUNK_SIZE = 256 * 1024
+
+# Classic (non-Zip64) archives address at most 4 GiB
+ZIP32_LIMIT = 0xFFFFFFFF
+
+# Entry flags: bit 3 = CRC and sizes in a data descriptor, bit 11 = UTF-8 names
+_FLAGS = 0x0008 | 0x0800
+# Version 2.0 (data descriptors), made by Unix so the permissions are kept
+_VERSION_NEEDED = 20
+_VERSION_MADE_BY = (3 << 8) | 20
+_EXTERNAL_ATTR = (0o100644 << 16)
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_OF_CENTRAL_DIRECTORY = struct.Struct("<IHHHHIIH")
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    """Convert a timestamp to the MS-DOS (time, date) pair stored in ZIP headers."""
+    t = time.localtime(timestamp)
+    year = min(max(t.tm_year, 1980), 2107)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def _entries(files: List[Tuple[str, str]]) -> List[dict]:
+    """Describe the archive entries from the files on disk."""
+    entries = []
+    for arcname, path in files:
+        stat_result = os.stat(path)
+        dos_time, dos_date = _dos_datetime(stat_result.st_mtime)
+        entries.append({
+            "name": arcname.encode("utf-8"),
+            "path": path,
+            "size": stat_result.st_size,
+            "time": dos_time,
+            "date": dos_date,
+        })
+    return entries
+
+
+def _archive_size(entries: List[dict]) -> int:
+    """Size of the archive of some entries."""
+    total = _END_OF_CENTRAL_DIRECTORY.size
+    for entry in entries:
+        total += (_LOCAL_HEADER.size + _CENTRAL_HEADER.size + 2 * len(entry["name"])
+                  + entry["size"] + _DATA_DESCRIPTOR.size)
+    return total
+
+
+def stored_zip(files: List[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Tuple[int, Iterator[bytes]]:
+    """Prepare a ZIP archive of files, stored uncompressed, generated chunk by chunk.
+
+    Args:
+        files: (name in the archive, file path) pairs.
+        chunk_size: Bytes read from each file at a time.
+
+    Returns:
+        (archive size in bytes, iterator over consecutive pieces of the
+        archive). The files are only opened while the iterator runs; it
+        raises IOError if one changes size in the meantime.
+
+    Raises:
+        ValueError: If the archive would need Zip64 (over 4 GiB).
+    """
+    entries = _entries(files)
+    size = _archive_size(entries)
+    if size > ZIP32_LIMIT:
+        raise ValueError("Archive too large for a ZIP without Zip64 extensions")
+    return size, _generate(entries, chunk_size)
+
+
+def _generate(entries: List[dict], chunk_size: int) -> Iterator[bytes]:
+    """Yield the archive of some entries."""
+    offset = 0
+    central_directory = []
+    for entry in entries:
+        # CRC and sizes are unknown until the data is read: they follow in the descriptor
+        header = _LOCAL_HEADER.pack(
+            0x04034b50, _VERSION_NEEDED, _FLAGS, 0, entry["time"], entry["date"],
+            0, 0, 0, len(entry["name"]), 0
+        ) + entry["name"]
+        yield header
+
+        crc = 0
+        sent = 0
+        with open(entry["path"], "rb") as f:
+            while sent < entry["size"]:
+                chunk = f.read(min(chunk_size, entry["size"] - sent))
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                sent += len(chunk)
+                yield chunk
+        if sent != entry["size"]:
+            raise IOError(f"{entry['path']} changed while it was being archived")
+
+        yield _DATA_DESCRIPTOR.pack(0x08074b50, crc, sent, sent)
+
+        central_directory.append(_CENTRAL_HEADER.pack(
+            0x02014b50, _VERSION_MADE_BY, _VERSION_NEEDED, _FLAGS, 0, entry["time"], entry["date"],
+            crc, sent, sent, len(entry["name"]), 0, 0, 0, 0, _EXTERNAL_ATTR, offset
+        ) + entry["name"])
+        offset += len(header) + sent + _DATA_DESCRIPTOR.size
+
+    directory = b"".join(central_directory)
+    yield directory
+    yield _END_OF_CENTRAL_DIRECTORY.pack(
+        0x06054b50, 0, 0, len(entries), len(entries), len(directory), offset, 0
+    )
@@ -0,0 +1,77 @@
+"""
+Compact on-disk form of analysis timelines (chords, structure, lyrics).
+Timelines are stored as zlib-compressed compact JSON BLOBs and decoded back
+to JSON text when read, so callers keep working with JSON strings. Plain
+JSON text written by older versions (or by the maintenance scripts) is
+read unchanged.
+"""
+import json
+import zlib
+from typing import Any, Optional, Union
+
+# Header of an encoded timeline (format version 1: zlib over compact JSON)
+MAGIC = b"STL1"
+
+# zlib level: timelines are written once per analysis and read often
+COMPRESSION_LEVEL = 6
+
+
+def is_encoded(value: Any) -> bool:
+    """Check whether a stored value is an encoded timeline BLOB."""
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:len(MAGIC)]) == MAGIC
+
+
+def compact_json(value: Any) -> Optional[str]:
+    """Serialize a timeline as compact JSON text.
+
+    Args:
+        value: Python structure, or a JSON string (re-serialized compactly;
+            left as-is if it is not valid JSON).
+
+    Returns:
+        JSON text, or None for empty values.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return value
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_timeline(value: Any) -> Optional[Union[bytes, str]]:
+    """Encode a timeline for storage.
+
+    Args:
+        value: Python structure or JSON string.
+
+    Returns:
+        Compressed BLOB, the compact JSON text when compression does not
+        make it smaller, or None for empty values.
+    """
+    text = compact_json(value)
+    if text is None:
+        return None
+    raw = text.encode("utf-8")
+    blob = MAGIC + zlib.compress(raw, COMPRESSION_LEVEL)
+    return blob if len(blob) < len(raw) else text
+
+
+def decode_timeline(value: Any) -> Optional[str]:
+    """Turn a stored timeline back into JSON text.
+
+    Args:
+        value: Column value (encoded BLOB, legacy JSON text or None).
+
+    Returns:
+        JSON text (None if the BLOB is corrupt).
+    """
+    if not is_encoded(value):
+        return value
+    try:
+        return zlib.decompress(bytes(value)[len(MAGIC):]).decode("utf-8")
+    except (zlib.error, UnicodeDecodeError) as e:
+        print(f"⚠️ [DB] Unreadable timeline data: {e}")
+        return None
@@ -0,0 +1,230 @@
+"""
+Waveform peak files for the mixer.
+Stores a min/max envelope (int8) and a mean absolute value envelope (u16)
+of each stem at several zoom levels (halving the resolution at each level)
+in a small ``<stem>.peaks`` file next to the audio, so the mixer can draw
+waveforms without downloading and decoding the stems first.
+
+File layout (little-endian):
+    header  "STPK", version (u8), pad (u8), level count (u16),
+            sample rate (u32), samples per channel (u32)
+    levels  level count x (samples per peak (u32), peak count (u32))
+    data    per level, finest first: peak count x (min (i8), max (i8)),
+            then peak count x mean absolute value (u16, 65535 = full scale)
+
+The mean absolute value is taken on the first channel, like the waveform
+the mixer computes itself from decoded audio, so both draw on one scale.
+"""
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+PEAKS_MAGIC = b"STPK"
+PEAKS_VERSION = 2
+PEAKS_EXTENSION = ".peaks"
+
+# Finest level: 256 samples per peak (~170 peaks per second at 44.1 kHz)
+BASE_SAMPLES_PER_PEAK = 256
+# Coarser levels are added until a level has fewer peaks than this
+MIN_PEAKS = 512
+
+_HEADER = struct.Struct("<4sBxHII")
+_LEVEL = struct.Struct("<II")
+
+# Serializes backfills so concurrent requests decode a stem only once
+_backfill_lock = threading.Lock()
+
+
+def peaks_path(stem_path: str) -> str:
+    """Get the peak file path of a stem (``vocals.mp3`` -> ``vocals.peaks``)."""
+    return os.path.splitext(stem_path)[0] + PEAKS_EXTENSION
+
+
+def compute_peak_pyramid(samples: np.ndarray, base_samples_per_peak: int = BASE_SAMPLES_PER_PEAK,
+                         min_peaks: int = MIN_PEAKS) -> List[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """Compute the min/max and mean absolute envelopes of a signal at halving resolutions.
+
+    Args:
+        samples: Audio (channels x samples, or mono samples). Each peak covers
+            every channel.
+        base_samples_per_peak: Samples per peak of the finest level.
+        min_peaks: Stop adding coarser levels below this many peaks.
+
+    Returns:
+        List of (samples per peak, mins, maxs, means), finest first, with mins
+        and maxs quantized to int8 (full scale = 127) and the first channel's
+        mean absolute values to uint16 (full scale = 65535).
+    """
+    x = np.asarray(samples, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[None, :]
+    n_samples = x.shape[1]
+    if n_samples == 0:
+        return [(base_samples_per_peak, np.zeros(0, np.int8), np.zeros(0, np.int8), np.zeros(0, np.uint16))]
+
+    starts = np.arange(0, n_samples, base_samples_per_peak)
+    mins = np.minimum.reduceat(x, starts, axis=1).min(axis=0)
+    maxs = np.maximum.reduceat(x, starts, axis=1).max(axis=0)
+    sums = np.add.reduceat(np.abs(x[0]), starts).astype(np.float64)
+    counts = np.diff(np.append(starts, n_samples)).astype(np.float64)
+
+    # Same headroom as the stem encoder (clip="rescale"): louder stems are scaled down
+    scale = 127.0 / max(1.0, float(max(-mins.min(), maxs.max())))
+
+    levels = []
+    samples_per_peak = base_samples_per_peak
+    while True:
+        levels.append((
+            samples_per_peak,
+            np.clip(np.floor(mins * scale), -127, 127).astype(np.int8),
+            np.clip(np.ceil(maxs * scale), -127, 127).astype(np.int8),
+            np.clip(np.round(sums / counts * scale / 127.0 * 65535), 0, 65535).astype(np.uint16),
+        ))
+        if len(mins) < 2 * min_peaks:
+            return levels
+        pairs = np.arange(0, len(mins), 2)
+        mins = np.minimum.reduceat(mins, pairs)
+        maxs = np.maximum.reduceat(maxs, pairs)
+        sums = np.add.reduceat(sums, pairs)
+        counts = np.add.reduceat(counts, pairs)
+        samples_per_peak *= 2
+
+
+def encode_peaks(levels: List[Tuple[int, np.ndarray, np.ndarray, np.ndarray]], sample_rate: int, n_samples: int) -> bytes:
+    """Serialize a peak pyramid in the ``.peaks`` layout.
+
+    Args:
+        levels: Output of compute_peak_pyramid().
+        sample_rate: Sample rate of the stem.
+        n_samples: Samples per channel of the stem.
+
+    Returns:
+        File contents.
+    """
+    parts = [_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, len(levels), int(sample_rate), int(n_samples))]
+    parts.extend(_LEVEL.pack(int(spp), len(mins)) for spp, mins, _, _ in levels)
+    for _, mins, maxs, means in levels:
+        interleaved = np.empty(2 * len(mins), dtype=np.int8)
+        interleaved[0::2] = mins
+        interleaved[1::2] = maxs
+        parts.append(interleaved.tobytes())
+        parts.append(means.astype("<u2").tobytes())
+    return b"".join(parts)
+
+
+def write_peaks_file(stem_path: str, samples: np.ndarray, sample_rate: int) -> str:
+    """Write the peak file of a stem from its samples.
+
+    Args:
+        stem_path: Path of the stem audio file (the peaks go next to it).
+        samples: Stem audio (channels x samples, or mono samples).
+        sample_rate: Sample rate of the samples.
+
+    Returns:
+        Path of the written peak file.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    n_samples = samples.shape[-1]
+    data = encode_peaks(compute_peak_pyramid(samples), sample_rate, n_samples)
+
+    path = peaks_path(stem_path)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def read_peaks_header(path: str) -> Optional[Dict]:
+    """Read the stem properties stored in a peak file header.
+
+    Args:
+        path: Path of the peak file.
+
+    Returns:
+        Dict with version, sample_rate, samples and duration (seconds), or
+        None if the file is missing or not a peak file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, _, sample_rate, n_samples = _HEADER.unpack(data)
+    # The header is the same in every version
+    if magic != PEAKS_MAGIC or not 1 <= version <= PEAKS_VERSION or not sample_rate:
+        return None
+    return {
+        'version': version,
+        'sample_rate': sample_rate,
+        'samples': n_samples,
+        'duration': round(n_samples / sample_rate, 3),
+    }
+
+
+def _decode_stem(stem_path: str) -> Tuple[np.ndarray, int]:
+    """Decode a stem to float32 (channels x samples)."""
+    try:
+        # soundfile avoids the numba/DLL issues librosa has on Windows
+        import soundfile as sf
+        data, sr = sf.read(stem_path, dtype='float32', always_2d=True)
+        return data.T, int(sr)
+    except Exception as e:
+        print(f"[PEAKS] soundfile could not decode {stem_path} ({e}), using librosa")
+        import librosa
+        samples, sr = librosa.load(stem_path, sr=None, mono=False)
+        return samples, int(sr)
+
+
+def is_peaks_file_current(stem_path: str) -> bool:
+    """Check whether a stem has a peak file in the current layout, newer than the stem.
+
+    Args:
+        stem_path: Path of the stem audio file.
+
+    Returns:
+        True if the peak file can be served as is.
+    """
+    path = peaks_path(stem_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(stem_path):
+            return False
+    except OSError:
+        return False
+    header = read_peaks_header(path)
+    return header is not None and header['version'] == PEAKS_VERSION
+
+
+def ensure_peaks_file(stem_path: str) -> str:
+    """Get the peak file of a stem, computing it if it is missing or stale.
+
+    Stems extracted before peak files existed (or whose peak file has an
+    older layout) are decoded once here.
+
+    Args:
+        stem_path: Path of the stem audio file.
+
+    Returns:
+        Path of an up-to-date peak file.
+    """
+    path = peaks_path(stem_path)
+    if is_peaks_file_current(stem_path):
+        return path
+    with _backfill_lock:
+        if is_peaks_file_current(stem_path):
+            return path
+        samples, sr = _decode_stem(stem_path)
+        print(f"[PEAKS] Backfilling waveform peaks for {stem_path}")
+        return write_peaks_file(stem_path, samples, sr)
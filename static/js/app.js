@@ -130,6 +130,15 @@ function initializeSocketIO() {
         console.error('Download error:', data);
         updateDownloadError(data);
     });
+
+    // Post-download analysis results arrive stage by stage (tempo_key, chords, structure, lyrics)
+    socket.on('download_analysis_stage', (data) => {
+        console.log('Download analysis stage:', data);
+        if (data.stage === 'tempo_key' && data.status === 'completed') {
+            // BPM and key are shown in the downloads list
+            loadDownloads();
+        }
+    });
     
     // Extraction events
     socket.on('extraction_progress', (data) => {
@@ -1336,12 +1345,13 @@ function populateDownloadDropdownWithStems(downloadElement, extractionStatus) {
     // Add ZIP download handler
     stemsDownloadBtn.style.cursor = 'pointer';
     stemsDownloadBtn.addEventListener('click', () => {
-        if (extractionStatus.zip_path) {
+        if (extractionStatus.zip_url) {
+            // ZIP streamed by the server while it downloads
+            window.location.href = extractionStatus.zip_url;
+        } else if (extractionStatus.zip_path) {
             window.location.href = `/api/download-file?file_path=${encodeURIComponent(extractionStatus.zip_path)}`;
         } else if (extractionStatus.extraction_id) {
-            // Create ZIP on-the-fly
-            showToast('Creating ZIP archive...', 'info');
-            createZipForExtraction(extractionStatus.extraction_id);
+            downloadStemsZip(extractionStatus.extraction_id);
         }
     });
 
@@ -1780,16 +1790,16 @@ function createExtractionElement(item) {
             downloadZipButton.addEventListener('click', () => {
                 const filePath = downloadZipButton.dataset.filePath;
                 const extractionId = downloadZipButton.dataset.extractionId;
-                
-                if (!filePath) {
-                    // Try to create a ZIP on the fly
-                    showToast('Creating ZIP archive...', 'info');
-                    createZipForExtraction(extractionId);
+
+                if (extractionId && extractionId !== 'undefined') {
+                    downloadStemsZip(extractionId);
                     return;
                 }
-                
-                // Check if file exists by trying to download it
-                window.location.href = `/api/download-file?file_path=${encodeURIComponent(filePath)}`;
+
+                // Archive built by an older version
+                if (filePath) {
+                    window.location.href = `/api/download-file?file_path=${encodeURIComponent(filePath)}`;
+                }
             });
         }
         
@@ -2857,29 +2867,9 @@ function formatFileSize(bytes) {
     }
 }
 
-// Function to create ZIP archive for extraction on demand
-function createZipForExtraction(extractionId) {
-    fetch(`/api/extractions/${encodeURIComponent(extractionId)}/create-zip`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            'X-CSRF-Token': getCsrfToken()
-        }
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success && data.zip_path) {
-            showToast('ZIP archive created successfully', 'success');
-            // Immediately download the ZIP
-            window.location.href = `/api/download-file?file_path=${encodeURIComponent(data.zip_path)}`;
-        } else {
-            showToast(`Error creating ZIP: ${data.error || 'Unknown error'}`, 'error');
-        }
-    })
-    .catch(error => {
-        console.error('Error creating ZIP:', error);
-        showToast('Error creating ZIP archive', 'error');
-    });
+// Function to download the stems of an extraction as a ZIP (streamed by the server)
+function downloadStemsZip(extractionId) {
+    window.location.href = `/api/extractions/${encodeURIComponent(extractionId)}/stems.zip`;
 }
 
 // Helper function to get the first output path or construct one
@@ -3899,14 +3889,21 @@ if (document.readyState === 'loading') {
 
 let currentLibraryFilter = 'all';
 let currentLibrarySearch = '';
+let currentLibraryCursor = null;
+let currentLibraryTotal = 0;
 
-// Load library content
-function loadLibrary(filter = currentLibraryFilter, search = currentLibrarySearch) {
+// Load library content (cursor = next page of the current listing)
+function loadLibrary(filter = currentLibraryFilter, search = currentLibrarySearch, cursor = null) {
     const libraryContainer = document.getElementById('libraryContainer');
     if (!libraryContainer) return;
     
     // Show loading state
-    libraryContainer.innerHTML = '<div class="library-loading"><i class="fas fa-spinner fa-spin"></i> Loading library...</div>';
+    if (cursor) {
+        const loadMore = document.getElementById('libraryLoadMore');
+        if (loadMore) loadMore.disabled = true;
+    } else {
+        libraryContainer.innerHTML = '<div class="library-loading"><i class="fas fa-spinner fa-spin"></i> Loading library...</div>';
+    }
     
     // Update current filter and search
     currentLibraryFilter = filter;
@@ -3916,6 +3913,7 @@ function loadLibrary(filter = currentLibraryFilter, search = currentLibrarySearc
     const params = new URLSearchParams();
     if (filter !== 'all') params.append('filter', filter);
     if (search.trim()) params.append('search', search.trim());
+    if (cursor) params.append('cursor', cursor);
     
     fetch(`/api/library?${params.toString()}`, {
         headers: {
@@ -3925,8 +3923,11 @@ function loadLibrary(filter = currentLibraryFilter, search = currentLibrarySearc
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            displayLibraryItems(data.items);
-            updateLibraryStats(data.total_count, data.filter, data.search);
+            // The total is only counted for the first page
+            if (!cursor) currentLibraryTotal = data.total_count;
+            currentLibraryCursor = data.next_cursor;
+            displayLibraryItems(data.items, Boolean(cursor));
+            updateLibraryStats(currentLibraryTotal, data.filter, data.search);
         } else {
             libraryContainer.innerHTML = `<div class="library-loading">Error: ${data.error}</div>`;
             showToast(`Error loading library: ${data.error}`, 'error');
@@ -3939,21 +3940,33 @@ function loadLibrary(filter = currentLibraryFilter, search = currentLibrarySearc
     });
 }
 
-// Display library items
-function displayLibraryItems(items) {
+// Display library items (append = add a page below the items already shown)
+function displayLibraryItems(items, append = false) {
     const libraryContainer = document.getElementById('libraryContainer');
     
-    if (items.length === 0) {
+    const previousLoadMore = document.getElementById('libraryLoadMore');
+    if (previousLoadMore) previousLoadMore.remove();
+    
+    if (items.length === 0 && !append) {
         libraryContainer.innerHTML = '<div class="library-loading">No items found in library</div>';
         return;
     }
     
-    libraryContainer.innerHTML = '';
+    if (!append) libraryContainer.innerHTML = '';
     
     items.forEach(item => {
         const libraryItem = createLibraryItem(item);
         libraryContainer.appendChild(libraryItem);
     });
+    
+    if (currentLibraryCursor) {
+        const loadMore = document.createElement('button');
+        loadMore.id = 'libraryLoadMore';
+        loadMore.className = 'library-action-button secondary library-load-more';
+        loadMore.innerHTML = '<i class="fas fa-chevron-down"></i> Load more';
+        loadMore.addEventListener('click', () => loadLibrary(currentLibraryFilter, currentLibrarySearch, currentLibraryCursor));
+        libraryContainer.appendChild(loadMore);
+    }
 }
 
 // Create library item element
@@ -60,8 +60,9 @@ class AudioEngine {
      * Charger un stem audio
      * @param {string} name - Nom du stem
      * @param {string} url - URL du fichier audio
+     * @param {string} peaksUrl - URL du fichier de peaks de la waveform
      */
-    async loadStem(name, url) {
+    async loadStem(name, url, peaksUrl) {
         try {
             this.mixer.log(`Chargement du stem ${name} depuis ${url}`);
             
@@ -84,6 +85,9 @@ class AudioEngine {
                 waveformData: null
             };
             
+            // Draw the waveform from the peak file while the audio downloads
+            const peaksLoaded = this.mixer.waveform.loadPeaks(name, peaksUrl);
+            
             // Get le fichier audio
             const response = await fetch(url);
             
@@ -104,8 +108,10 @@ class AudioEngine {
             // Stocker le buffer audio
             this.mixer.stems[name].buffer = audioBuffer;
             
-            // Extraire les données de forme d'onde
-            await this.extractWaveformData(name);
+            // Extraire les données de forme d'onde (only if no peak file was available)
+            if (!(await peaksLoaded)) {
+                await this.extractWaveformData(name);
+            }
             
             this.mixer.log(`Stem ${name} chargé with succès`);
         } catch (error) {
@@ -297,17 +297,14 @@ class StemMixer {
     }
 
     /**
-     * Check stem existence via HEAD request
+     * Fetch the stem manifest (every stem with its size, duration and URLs)
      */
-    async checkStemExists(stemName) {
-        try {
-            const url = `/api/extracted_stems/${this.encodedExtractionId}/${stemName}`;
-            const response = await fetch(url, { method: 'HEAD' });
-            return response.ok;
-        } catch (error) {
-            this.log(`Error checking stem ${stemName}: ${error.message}`);
-            return false;
+    async fetchStemManifest() {
+        const response = await fetch(`/api/extractions/${this.encodedExtractionId}/manifest`);
+        if (!response.ok) {
+            throw new Error(`Stem manifest unavailable (HTTP ${response.status})`);
         }
+        return response.json();
     }
 
     /**
@@ -324,34 +321,23 @@ class StemMixer {
                 this.log('Using stem paths from EXTRACTION_INFO');
                 // Use provided stem paths - they are guaranteed to exist
                 for (const [stemName, stemPath] of Object.entries(window.EXTRACTION_INFO.output_paths)) {
-                    stemFiles.push({
-                        name: stemName,
-                        url: `/api/extracted_stems/${this.encodedExtractionId}/${stemName}`
-                    });
+                    const url = `/api/extracted_stems/${this.encodedExtractionId}/${stemName}`;
+                    stemFiles.push({ name: stemName, url, peaksUrl: `${url}/peaks` });
                 }
             } else {
-                // Fallback: check which standard stems actually exist
-                this.log('Fallback: checking existing standard stems...');
-                const standardStems = ['vocals', 'drums', 'bass', 'guitar', 'piano', 'other'];
+                // Fallback: one manifest request lists the stems that exist
+                this.log('Fallback: loading stem manifest...');
+                const manifest = await this.fetchStemManifest();
 
-                // Check existence of each stem in parallel
-                const existenceChecks = await Promise.allSettled(
-                    standardStems.map(stem => this.checkStemExists(stem))
-                );
-
-                // Keep only stems that exist
+                // Keep only stems that are part of the mix (silent ones are listed but not served)
                 stemFiles = [];
-                existenceChecks.forEach((result, index) => {
-                    if (result.status === 'fulfilled' && result.value) {
-                        const stemName = standardStems[index];
-                        stemFiles.push({
-                            name: stemName,
-                            url: `/api/extracted_stems/${this.encodedExtractionId}/${stemName}`
-                        });
-                        this.log(`Stem ${stemName} detected as existing`);
-                    } else {
-                        this.log(`Stem ${standardStems[index]} does not exist or is not accessible`);
+                manifest.stems.forEach(stem => {
+                    if (stem.silent) {
+                        this.log(`Stem ${stem.name} skipped (silent)`);
+                        return;
                     }
+                    stemFiles.push({ name: stem.name, url: stem.url, peaksUrl: stem.peaks_url });
+                    this.log(`Stem ${stem.name} detected as existing`);
                 });
 
                 if (stemFiles.length === 0) {
@@ -362,7 +348,7 @@ class StemMixer {
             this.log(`Attempting to load ${stemFiles.length} existing stems`);
 
             // Load all existing stems in parallel
-            const loadPromises = stemFiles.map(stem => this.audioEngine.loadStem(stem.name, stem.url));
+            const loadPromises = stemFiles.map(stem => this.audioEngine.loadStem(stem.name, stem.url, stem.peaksUrl));
             const results = await Promise.allSettled(loadPromises);
 
             // Count stems loaded successfully
@@ -42,17 +42,14 @@ class MobileAudioEngine {
      * Load a stem
      * @param {string} name - Stem name
      * @param {string} url - Audio file URL
+     * @param {string} peaksUrl - Waveform peak file URL
      */
-    async loadStem(name, url) {
+    async loadStem(name, url, peaksUrl) {
         try {
             this.mixer.log(`Loading mobile stem: ${name}`);
 
-            // Check if file exists
-            const response = await fetch(url, { method: 'HEAD' });
-            if (!response.ok) {
-                this.mixer.log(`Stem ${name} does not exist (${response.status})`);
-                return false;
-            }
+            // Stems come from EXTRACTION_INFO or the manifest, so no HEAD probe:
+            // a missing file surfaces through the audio element's error event
 
             // Create HTML5 audio element
             const audio = new Audio();
@@ -92,8 +89,9 @@ class MobileAudioEngine {
                 });
             });
 
-            // Load audio
-            audio.src = url;
+            // Load audio (low-bitrate rendition when the server has one;
+            // manifest URLs already carry the ?v= stem version)
+            audio.src = `${url}${url.includes('?') ? '&' : '?'}quality=${stemQuality()}`;
 
             // Wait for loading
             await loadPromise;
@@ -112,8 +110,11 @@ class MobileAudioEngine {
                 this.mixer.trackControls.createTrackElement(name);
             }
 
-            // Generate waveform data for mobile (simplified)
+            // Generate waveform data for mobile (simplified), replaced by the real peaks once loaded
             this.generateMobileWaveform(name, audio);
+            if (this.mixer.waveform) {
+                this.mixer.waveform.loadPeaks(name, peaksUrl);
+            }
 
             // Trigger waveform rendering
             if (this.mixer.waveform) {
@@ -126,8 +126,9 @@ class SoundTouchEngine {
      * Load a stem audio file
      * @param {string} name - Stem name
      * @param {string} url - Audio file URL
+     * @param {string} peaksUrl - Waveform peak file URL
      */
-    async loadStem(name, url) {
+    async loadStem(name, url, peaksUrl) {
         try {
             this.mixer.log(`Loading SoundTouch stem: ${name}`);
             
@@ -150,6 +151,9 @@ class SoundTouchEngine {
                 waveformData: null
             };
             
+            // Draw the waveform from the peak file while the audio downloads
+            const peaksLoaded = this.mixer.waveform.loadPeaks(name, peaksUrl);
+            
             // Fetch and decode audio
             const response = await fetch(url);
             if (!response.ok) {
@@ -170,8 +174,10 @@ class SoundTouchEngine {
             // Initialize pitch for this stem
             this.stemPitches.set(name, 0); // 0 semitones = no pitch change
             
-            // Extract waveform data
-            await this.extractWaveformData(name);
+            // Extract waveform data (only if no peak file was available)
+            if (!(await peaksLoaded)) {
+                await this.extractWaveformData(name);
+            }
             
             // Create AudioWorklet for this stem
             await this.createStemWorklet(name);
@@ -51,6 +51,88 @@ class WaveformRenderer {
         };
     }
 
+    /**
+     * Load the precomputed peak file of a stem and draw it, without waiting for the audio
+     * @param {string} name - Stem name
+     * @param {string} peaksUrl - Peak file URL (the manifest's carries ?v=<version>)
+     * @param {number} targetPoints - Number of waveform points (same as extractWaveformData)
+     * @returns {Promise<boolean>} True if the waveform was drawn from the peak file
+     */
+    async loadPeaks(name, peaksUrl, targetPoints = 2000) {
+        try {
+            if (!peaksUrl) return false;
+            const response = await fetch(peaksUrl);
+            if (!response.ok) return false;
+
+            const peaks = this.parsePeaks(await response.arrayBuffer());
+            const stem = this.mixer.stems[name];
+            if (!stem || peaks.levels.length === 0) return false;
+
+            // Coarsest level that still has enough points (levels are finest first)
+            const level = peaks.levels.slice().reverse().find(l => l.count >= targetPoints) || peaks.levels[0];
+            if (level.count === 0) return false;
+
+            // Resample to exactly targetPoints so stems line up index by index in the
+            // master waveform, whether they were drawn from peaks or from decoded audio.
+            // The file's mean absolute values are what extractWaveformData draws.
+            const points = Math.min(targetPoints, peaks.length);
+            const waveformData = new Array(points);
+            for (let i = 0; i < points; i++) {
+                const start = Math.floor(i * level.count / points);
+                const end = Math.max(start + 1, Math.floor((i + 1) * level.count / points));
+                let sum = 0;
+                for (let j = start; j < end; j++) {
+                    sum += level.mean[j];
+                }
+                waveformData[i] = sum / (end - start) / 65535;
+            }
+
+            stem.peaks = peaks;
+            stem.waveformData = waveformData;
+            this.drawWaveform(name);
+            this.mixer.log(`Waveform peaks loaded for ${name} (${points} points)`);
+            return true;
+        } catch (error) {
+            this.mixer.log(`Waveform peaks unavailable for ${name}: ${error.message}`);
+            return false;
+        }
+    }
+
+    /**
+     * Parse a peak file (see core/waveform_peaks.py for the layout)
+     * @param {ArrayBuffer} arrayBuffer - Peak file contents
+     * @returns {Object} {sampleRate, length, duration, levels: [{samplesPerPeak, count, data, mean}]}
+     */
+    parsePeaks(arrayBuffer) {
+        const view = new DataView(arrayBuffer);
+        const magic = String.fromCharCode(...new Uint8Array(arrayBuffer, 0, 4));
+        if (magic !== 'STPK' || view.getUint8(4) !== 2) {
+            throw new Error('Unsupported peak file');
+        }
+
+        const levelCount = view.getUint16(6, true);
+        const sampleRate = view.getUint32(8, true);
+        const length = view.getUint32(12, true);
+
+        // Min/max pairs then mean absolute values of each level follow the level table
+        let offset = 16 + levelCount * 8;
+        const levels = [];
+        for (let i = 0; i < levelCount; i++) {
+            const samplesPerPeak = view.getUint32(16 + i * 8, true);
+            const count = view.getUint32(20 + i * 8, true);
+            const data = new Int8Array(arrayBuffer, offset, count * 2);
+            offset += count * 2;
+            const mean = new Uint16Array(count);
+            for (let j = 0; j < count; j++) {
+                mean[j] = view.getUint16(offset + j * 2, true);
+            }
+            offset += count * 2;
+            levels.push({ samplesPerPeak, count, data, mean });
+        }
+
+        return { sampleRate, length, duration: length / sampleRate, levels };
+    }
+
     /**
      * Render waveform data to canvas
      * @param {HTMLCanvasElement} canvas - Canvas element
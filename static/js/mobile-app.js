@@ -115,6 +115,7 @@ class MobileApp {
         this.libraryPollingInterval = 6000;
         this.libraryLoading = false;
         this.pendingLibraryRefresh = false;
+        this.globalLibraryCursor = null; // next_cursor of the last global library page shown
         this.extractionStatusCache = new Map();
         this.beatsPerBar = 4;
         this.chordPxPerBeat = 40;
@@ -859,22 +860,32 @@ class MobileApp {
         }
     }
 
-    async loadGlobalLibrary() {
+    // Load the first page of the global library, or the next one (cursor = next_cursor)
+    async loadGlobalLibrary(cursor = null) {
+        const loadMore = document.getElementById('mobileGlobalLoadMore');
+        if (loadMore) loadMore.disabled = true;
         try {
-            const res = await fetch('/api/library');
+            const url = cursor ? `/api/library?cursor=${encodeURIComponent(cursor)}` : '/api/library';
+            const res = await fetch(url);
             const data = await res.json();
-            this.displayLibrary(data.items || [], 'mobileGlobalList', true);
+            this.globalLibraryCursor = data.next_cursor || null;
+            this.displayLibrary(data.items || [], 'mobileGlobalList', true, Boolean(cursor));
         } catch (error) {
             console.error('[GlobalLibrary]', error);
+            if (loadMore) loadMore.disabled = false;
         }
     }
 
-    displayLibrary(items, containerId, isGlobal) {
+    // append = add a page below the items already shown (global library only)
+    displayLibrary(items, containerId, isGlobal, append = false) {
         const container = document.getElementById(containerId);
         if (!container) return;
-        container.innerHTML = '';
+
+        const previousLoadMore = document.getElementById('mobileGlobalLoadMore');
+        if (isGlobal && previousLoadMore) previousLoadMore.remove();
+        if (!append) container.innerHTML = '';
         
-        if (!items.length) {
+        if (!items.length && !append) {
             container.innerHTML = '<p class="mobile-text-muted">No items</p>';
             return;
         }
@@ -952,6 +963,15 @@ class MobileApp {
             container.appendChild(div);
         });
 
+        if (isGlobal && this.globalLibraryCursor) {
+            const loadMore = document.createElement('button');
+            loadMore.id = 'mobileGlobalLoadMore';
+            loadMore.className = 'mobile-btn mobile-btn-secondary mobile-load-more';
+            loadMore.innerHTML = '<i class="fas fa-chevron-down"></i> Load more';
+            loadMore.addEventListener('click', () => this.loadGlobalLibrary(this.globalLibraryCursor));
+            container.appendChild(loadMore);
+        }
+
         // Batch fetch extraction statuses for items without stems (instead of individual calls)
         if (!isGlobal) {
             const videoIdsToCheck = items
@@ -1778,7 +1798,7 @@ class MobileApp {
     async loadStem(name, path) {
         console.log('[LoadStem] Starting:', name, 'path:', path);
         try {
-            const url = '/api/extracted_stems/' + this.currentExtractionId + '/' + name;
+            const url = '/api/extracted_stems/' + this.currentExtractionId + '/' + name + '?quality=' + stemQuality();
             console.log('[LoadStem] Fetching:', url);
 
             const res = await fetch(url);
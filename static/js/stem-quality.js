@@ -0,0 +1,18 @@
+/**
+ * StemTubes - Stem rendition choice
+ * Shared by the mobile app and the mobile mixer engine: picks the
+ * low-bitrate stem rendition (quality= of /api/extracted_stems) this
+ * browser can decode, smaller on slow or data-saving connections.
+ */
+
+/**
+ * Pick the stem rendition to stream: Opus where the browser plays it, AAC otherwise
+ * @returns {string} Value of the quality= parameter of the stem URL
+ */
+function stemQuality() {
+    const connection = navigator.connection || {};
+    const slow = connection.saveData || ['slow-2g', '2g', '3g'].includes(connection.effectiveType);
+    const probe = document.createElement('audio');
+    if (probe.canPlayType('audio/ogg; codecs="opus"')) return slow ? 'opus64' : 'opus96';
+    return 'aac128';
+}
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Query plan regression check for core/downloads_db.py
+
+Runs every downloads_db function against a scratch database, captures the
+SQL each one executes, and checks with EXPLAIN QUERY PLAN that no statement
+scans global_downloads or user_downloads without an index (apart from the
+admin/cleanup queries that read the whole table on purpose).
+
+Usage: python utils/testing/test_query_plans.py
+"""
+
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from core import downloads_db
+from core.db import get_connection
+
+# Functions that read whole tables by design (admin views, startup cleanup)
+FULL_SCAN_ALLOWED = {
+    "search_library",  # Unfiltered library listing reads every global download
+    "get_all_downloads_for_admin",
+    "get_storage_usage_stats",
+    "cleanup_duplicate_user_downloads",
+    "cleanup_orphaned_records",
+    "comprehensive_cleanup",
+}
+
+# A plan step reading a whole table (tables may appear under their alias)
+TABLE_SCAN = re.compile(r"^SCAN (\w+)$")
+SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)")
+
+
+def seed():
+    """Create a small library with one extracted and one plain download."""
+    # Admin queries join the users table owned by auth_db
+    with get_connection(downloads_db.DB_PATH) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT)")
+        conn.executemany("INSERT INTO users (id, username) VALUES (?, ?)", [(1, "alice"), (2, "bob")])
+    for user_id in (1, 2):
+        for video_id in ("vid_a", "vid_b"):
+            downloads_db.add_or_update(user_id, {
+                "video_id": video_id,
+                "title": f"Song {video_id}",
+                "file_path": f"/tmp/core/downloads/Song_{video_id}.mp3",
+                "quality": "best",
+            })
+    downloads_db.mark_extraction_complete("vid_a", {
+        "model_name": "htdemucs",
+        "stems_paths": {"vocals": "/tmp/core/downloads/stems/vocals.mp3"},
+    })
+    downloads_db.add_user_extraction_access(1, downloads_db.find_any_global_extraction("vid_a"))
+
+
+def calls():
+    """(function name, callable) for every query function, in a safe order."""
+    global_a = downloads_db.find_any_global_extraction("vid_a")
+    global_id = global_a["id"]
+    download_id = downloads_db.get_user_download_id_by_video_id(1, "vid_a")
+    return [
+        ("list_for", lambda: downloads_db.list_for(1)),
+        ("list_extractions_for", lambda: downloads_db.list_extractions_for(1)),
+        ("list_downloads_page", lambda: downloads_db.list_downloads_page(1, 1)),
+        ("list_downloads_page", lambda: downloads_db.list_downloads_page(1, 1, downloads_db.list_downloads_page(1, 1)[1])),
+        ("list_downloads_page", lambda: downloads_db.list_downloads_page(1, 1, exclude_video_ids=["vid_a"])),
+        ("get_download_by_id", lambda: downloads_db.get_download_by_id(1, download_id)),
+        ("get_user_download_id_by_video_id", lambda: downloads_db.get_user_download_id_by_video_id(1, "vid_a")),
+        ("resolve_extraction", lambda: downloads_db.resolve_extraction(1, "Song_vid_a_1760135361")),
+        ("search_library (full-text)", lambda: downloads_db.search_library(1, "all", "song vid")),
+        ("search_library (page)", lambda: downloads_db.search_library(1, "all", "", 1, downloads_db.search_library(1, "all", "", 1)[1])),
+        ("search_library", lambda: downloads_db.search_library(1, "extractions")),
+        ("find_global_download", lambda: downloads_db.find_global_download("vid_a", "audio", "best")),
+        ("find_global_extraction", lambda: downloads_db.find_global_extraction("vid_a", "htdemucs")),
+        ("find_any_global_extraction", lambda: downloads_db.find_any_global_extraction("vid_a")),
+        ("get_extraction_statuses", lambda: downloads_db.get_extraction_statuses(2, ["vid_a", "vid_b", "vid_x"])),
+        ("find_global_extraction_in_progress", lambda: downloads_db.find_global_extraction_in_progress("vid_b", "htdemucs")),
+        ("find_or_reserve_extraction", lambda: downloads_db.find_or_reserve_extraction("vid_b", "htdemucs")),
+        ("set_extraction_in_progress", lambda: downloads_db.set_extraction_in_progress("vid_b", "htdemucs")),
+        ("complete_extraction", lambda: downloads_db.complete_extraction("vid_b", 2, {"model_name": "htdemucs", "stems_paths": {}})),
+        ("set_user_extraction_in_progress", lambda: downloads_db.set_user_extraction_in_progress(1, "vid_b", "htdemucs")),
+        ("clear_extraction_in_progress", lambda: downloads_db.clear_extraction_in_progress("vid_b")),
+        ("update_download_analysis", lambda: downloads_db.update_download_analysis("vid_a", 120.0, "C major", 0.9, "[]", 0.0)),
+        ("update_download_analysis_fields", lambda: downloads_db.update_download_analysis_fields("vid_a", detected_bpm=121.0)),
+        ("update_download_lyrics", lambda: downloads_db.update_download_lyrics("vid_a", [{"start": 0, "end": 1, "text": "la"}])),
+        ("update_download_structure", lambda: downloads_db.update_download_structure("vid_a", [{"start": 0, "end": 1, "label": "intro"}])),
+        ("add_user_access", lambda: downloads_db.add_user_access(2, global_a)),
+        ("get_user_ids_for_video", lambda: downloads_db.get_user_ids_for_video("vid_a")),
+        ("get_all_downloads_for_admin", downloads_db.get_all_downloads_for_admin),
+        ("get_storage_usage_stats", downloads_db.get_storage_usage_stats),
+        ("cleanup_stuck_extractions", downloads_db.cleanup_stuck_extractions),
+        ("cleanup_duplicate_user_downloads", downloads_db.cleanup_duplicate_user_downloads),
+        ("cleanup_orphaned_records", downloads_db.cleanup_orphaned_records),
+        ("remove_user_extraction_access", lambda: downloads_db.remove_user_extraction_access(2, "vid_a")),
+        ("remove_user_download_access", lambda: downloads_db.remove_user_download_access(2, "vid_b")),
+        ("force_remove_all_user_access", lambda: downloads_db.force_remove_all_user_access(2, "vid_a")),
+        ("delete_from", lambda: downloads_db.delete_from(2, "vid_b")),
+        ("reset_extraction_status", lambda: downloads_db.reset_extraction_status(global_id)),
+        ("delete_download_completely", lambda: downloads_db.delete_download_completely(global_id)),
+    ]
+
+
+def capture(func):
+    """Run func and return the SQL statements it executed."""
+    statements = []
+    original_conn = downloads_db._conn
+
+    def traced_conn():
+        conn = original_conn()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    downloads_db._conn = traced_conn
+    try:
+        func()
+    finally:
+        downloads_db._conn = original_conn
+    return statements
+
+
+def query_plan(sql):
+    """EXPLAIN QUERY PLAN details of one statement."""
+    with get_connection(downloads_db.DB_PATH) as conn:
+        return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        downloads_db.DB_PATH = os.path.join(tmp, "stemtubes.db")
+        downloads_db.init_table()
+        seed()
+
+        failures = 0
+        checked = 0
+        for name, func in calls():
+            for sql in capture(func):
+                if not re.match(r"\s*(SELECT|UPDATE|DELETE|INSERT)", sql, re.IGNORECASE):
+                    continue
+                if "global_downloads" not in sql and "user_downloads" not in sql:
+                    continue
+                checked += 1
+                plan = query_plan(sql)
+                subqueries = {m.group(1) for m in map(SUBQUERY.match, plan) if m}
+                scans = [m.group(1) for m in map(TABLE_SCAN.match, plan)
+                         if m and m.group(1) not in subqueries]
+                if scans and name not in FULL_SCAN_ALLOWED:
+                    failures += 1
+                    print(f"❌ {name}: full table scan")
+                    print(f"   SQL:  {' '.join(sql.split())[:200]}")
+                    for detail in plan:
+                        print(f"   PLAN: {detail}")
+
+        print(f"\nChecked {checked} statements, {failures} unindexed")
+        return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())